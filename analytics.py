@@ -0,0 +1,81 @@
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+from lib.bot_lib.analytics import QuizAnalytics
+from lib.bot_lib.db_connector import DatabaseConnector
+
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+project_root = Path(__file__).parent
+
+METRICS = ('difficulty', 'discrimination', 'funnel')
+
+
+def print_table(report, top):
+    print(f"Sessions: {report['sessions']}, answers: {report['answers']}")
+    if 'difficulty' in report:
+        print(f"\nHardest questions (of {len(report['difficulty'])}):")
+        print(f"{'question':<18}{'attempts':>10}{'p':>8}{'latency ms':>12}")
+        for item in report['difficulty'][:top]:
+            latency = '-' if item['avg_latency_ms'] is None else f"{item['avg_latency_ms']:.0f}"
+            print(f"{item['question_id']:<18}{item['attempts']:>10}{item['p_value']:>8.3f}{latency:>12}")
+    if 'discrimination' in report:
+        print(f"\nLeast discriminating questions (of {len(report['discrimination'])}):")
+        print(f"{'question':<18}{'attempts':>10}{'D':>8}{'r_pb':>8}")
+        for item in report['discrimination'][:top]:
+            values = ['-' if item[key] is None else f"{item[key]:.3f}" for key in ('discrimination', 'point_biserial')]
+            print(f"{item['question_id']:<18}{item['attempts']:>10}{values[0]:>8}{values[1]:>8}")
+    if 'funnel' in report:
+        print("\nCompletion funnel by cohort:")
+        for row in report['funnel']:
+            stages = ' '.join(f"{key}={value}" for key, value in row.items() if key.startswith('reached_'))
+            print(f"{row['cohort_start']}  users={row['users']} started={row['started']} {stages} "
+                  f"finished={row['finished']} rate={row['completion_rate']:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline analytics over the quiz history.")
+    parser.add_argument('--config', default=str(project_root / 'config' / 'database.yml'))
+    parser.add_argument('--secrets', default=str(project_root / 'config' / 'secrets.yml'))
+    parser.add_argument('--metrics', default=','.join(METRICS), help="Comma-separated subset of: " + ', '.join(METRICS))
+    parser.add_argument('--chunk-size', type=int, default=500000)
+    parser.add_argument('--funnel-steps', default='1,5,10,20')
+    parser.add_argument('--cohort-days', type=int, default=7)
+    parser.add_argument('--format', choices=('table', 'json'), default='table')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--output', help="Write the report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    metrics = [metric.strip() for metric in args.metrics.split(',') if metric.strip()]
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        parser.error(f"Unknown metrics: {', '.join(sorted(unknown))}")
+
+    connector = DatabaseConnector(config_path=args.config, secrets_path=args.secrets)
+    try:
+        analytics = QuizAnalytics(connector, chunk_size=args.chunk_size)
+        report = analytics.report(metrics, [int(step) for step in args.funnel_steps.split(',')], args.cohort_days)
+    finally:
+        connector.shutdown()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"Report written to {args.output}")
+    elif args.format == 'json':
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_table(report, args.top)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        logger.critical(f"Analytics failed: {e}", exc_info=True)
+        sys.exit(1)
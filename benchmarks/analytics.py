@@ -0,0 +1,114 @@
+import argparse
+import logging
+import random
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from sqlalchemy import select
+
+from lib.bot_lib.analytics import QuizAnalytics, completion_funnel, discrimination_index, item_difficulty
+from lib.bot_lib.models import AnswerEvent, QuizSession
+from benchmarks.support import make_connector
+
+
+def seed(db_path, sessions, users, answers, questions, days, batch=200000):
+    rng = random.Random(11)
+    now = int(time.time())
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.executemany("INSERT INTO users (id, username) VALUES (?, ?)",
+                               ((user_id, f"user{user_id}") for user_id in range(1, users + 1)))
+
+        def session_rows(start, stop):
+            for _ in range(start, stop):
+                reached = rng.randint(0, 20)
+                status = 'finished' if reached == 20 else 'cancelled'
+                started = now - rng.randrange(days * 86400)
+                yield (rng.randint(1, users), reached, rng.randint(0, reached), status,
+                       time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(started)))
+
+        for start in range(0, sessions, batch):
+            connection.executemany(
+                "INSERT INTO quiz_sessions (user_id, current_question_index, correct_answers_count, status, start_time, version) "
+                "VALUES (?, ?, ?, ?, ?, 1)",
+                session_rows(start, min(start + batch, sessions)),
+            )
+        for start in range(0, answers, batch):
+            connection.executemany(
+                "INSERT INTO answer_events (user_id, session_id, question_id, question_index, chosen_option, is_correct, latency_ms, answered_at) "
+                "VALUES (?, ?, ?, 0, 'A', ?, ?, CURRENT_TIMESTAMP)",
+                ((rng.randint(1, users), rng.randint(1, sessions), 'q%06d' % rng.randrange(questions),
+                  rng.random() < 0.6, rng.randint(500, 20000)) for _ in range(start, min(start + batch, answers))),
+            )
+
+
+def orm_difficulty(connector, limit):
+    # The row-at-a-time baseline: ORM objects and a Python dict per question.
+    session = connector.get_session()
+    try:
+        totals = defaultdict(lambda: [0, 0])
+        for event in session.scalars(select(AnswerEvent).limit(limit)):
+            totals[event.question_id][0] += 1
+            totals[event.question_id][1] += 1 if event.is_correct else 0
+        sessions = sum(1 for _ in session.scalars(select(QuizSession).limit(limit)))
+        return len(totals), sessions
+    finally:
+        session.close()
+
+
+def timed(label, func, *args, rows=None):
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    rate = f" ({rows / elapsed / 1e6:6.2f}M rows/s)" if rows else ""
+    print(f"{label:<28} {elapsed:8.2f}s{rate}")
+    return result
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        connector = make_connector(workdir, async_workers=1)
+        started = time.perf_counter()
+        seed(str(Path(workdir) / "bench.db"), args.sessions, args.users, args.answers, args.questions, args.days)
+        print(f"seeded {args.sessions} sessions and {args.answers} answer events in {time.perf_counter() - started:.1f}s")
+
+        analytics = QuizAnalytics(connector, chunk_size=args.chunk_size)
+        sessions = timed("stream sessions", analytics.load_sessions, rows=args.sessions)
+        answers = timed("stream answer events", analytics.load_answers, rows=args.answers)
+        print(f"arrays in memory             {(sessions.nbytes + answers.nbytes) / 1e6:8.1f}MB")
+
+        timed("item difficulty", item_difficulty, answers, rows=args.answers)
+        timed("discrimination index", discrimination_index, answers, sessions, rows=args.answers)
+        timed("completion funnel", completion_funnel, sessions, rows=args.sessions)
+
+        sample = min(args.orm_sample, args.answers)
+        elapsed = time.perf_counter()
+        orm_difficulty(connector, sample)
+        elapsed = time.perf_counter() - elapsed
+        # Sessions and answers are both capped at the sample size in the baseline.
+        baseline_rows = sample + min(sample, args.sessions)
+        print(f"ORM row-by-row baseline      {elapsed:8.2f}s ({baseline_rows / elapsed / 1e6:6.2f}M rows/s on a {sample} row sample, "
+              f"~{elapsed * (args.answers + args.sessions) / baseline_rows:.0f}s extrapolated)")
+        connector.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline analytics: streamed NumPy arrays vs row-by-row ORM aggregation.")
+    parser.add_argument('--sessions', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--answers', type=int, default=10_000_000)
+    parser.add_argument('--questions', type=int, default=500)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--chunk-size', type=int, default=500000)
+    parser.add_argument('--orm-sample', type=int, default=200_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
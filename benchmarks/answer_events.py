@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import datetime
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import event, func, select
+
+from lib.bot_lib.answer_events import AnswerEventRecorder, insert_answer_events
+from lib.bot_lib.models import AnswerEvent
+from benchmarks.support import make_connector, percentile
+
+
+def count_events(session):
+    return session.execute(select(func.count()).select_from(AnswerEvent)).scalar()
+
+
+async def answer(recorder, connector, user_id, args, samples):
+    for index in range(args.questions):
+        await asyncio.sleep(args.think_time / 1000)
+        started = time.perf_counter()
+        if recorder is not None:
+            recorder.record(user_id, user_id, 'q%010d' % index, index, 'A', index % 2 == 0, 1500)
+        else:
+            # What recording costs when every answer does its own INSERT and commit.
+            row = {'user_id': user_id, 'session_id': user_id, 'question_id': 'q%010d' % index, 'question_index': index,
+                   'chosen_option': 'A', 'is_correct': index % 2 == 0, 'latency_ms': 1500, 'answered_at': datetime.datetime.now()}
+            await connector.run_in_session(insert_answer_events, [row])
+        samples.append(time.perf_counter() - started)
+
+
+async def run(args, mode):
+    with tempfile.TemporaryDirectory() as workdir:
+        connector = make_connector(workdir, async_workers=4)
+        commits = []
+        event.listen(connector.engine, "commit", lambda conn: commits.append(1))
+
+        recorder = None
+        if mode == 'batched':
+            recorder = AnswerEventRecorder(connector, batch_size=args.batch_size, flush_interval=args.flush_interval,
+                                           spill_file=str(Path(workdir) / "spill.jsonl"))
+            await recorder.start()
+
+        samples = []
+        started = time.perf_counter()
+        await asyncio.gather(*(answer(recorder, connector, user_id, args, samples) for user_id in range(1, args.users + 1)))
+        if recorder is not None:
+            await recorder.stop()
+        elapsed = time.perf_counter() - started
+        stored = await connector.run_in_session(count_events)
+        connector.shutdown()
+
+    print(f"{mode:<8} events={stored:<7} total={elapsed:6.2f}s callback_path p50={percentile(samples, 50) * 1e6:9.1f}us "
+          f"p99={percentile(samples, 99) * 1e6:9.1f}us commits={len(commits)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of recording answer events on the callback path, inline vs batched.")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--think-time', type=float, default=5.0, help="ms between answers of one user")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    for mode in ('inline', 'batched'):
+        asyncio.run(run(args, mode))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import logging
+import random
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from lib.bot_lib.message_handler import start_command, handle_answer_callback
+from benchmarks.support import (FakeBot, command_update, callback_update, fake_context, configure_quiz,
+                                make_connector, make_dependencies, monitor_loop_lag, percentile, timed)
+
+
+async def simulate_user(user_id, deps, bot, args, samples):
+    await asyncio.sleep(random.uniform(0, args.think_time / 1000))
+    await start_command(command_update(user_id), fake_context(bot), deps)
+    for _ in range(args.questions):
+        await asyncio.sleep(random.uniform(0, args.think_time / 1000))
+        await timed(samples, handle_answer_callback(callback_update(user_id, "answer:A"), fake_context(bot), deps))
+
+
+async def run_mode(workers, args):
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_quiz(workdir, questions=args.questions)
+        connector = make_connector(workdir, async_workers=workers)
+
+        commits = []
+
+        @event.listens_for(connector.engine, "commit")
+        def slow_fsync(conn):
+            commits.append(1)
+            if args.commit_delay:
+                time.sleep(args.commit_delay / 1000)
+
+        deps = make_dependencies(connector)
+        await deps.sessions.start()
+        bot = FakeBot(latency=args.send_latency / 1000)
+        samples = []
+        lag_samples = []
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(monitor_loop_lag(lag_samples, stop))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(simulate_user(user_id, deps, bot, args, samples)
+                               for user_id in range(1, args.users + 1)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+        await deps.sessions.stop()
+        connector.shutdown()
+
+    label = f"async_workers={workers}" if workers else "sync (inline)"
+    print(f"{label:<18} callbacks={len(samples):<6} total={elapsed:7.2f}s "
+          f"p50={percentile(samples, 50) * 1000:8.2f}ms p99={percentile(samples, 99) * 1000:8.2f}ms "
+          f"loop_lag_p99={percentile(lag_samples, 99) * 1000:8.2f}ms commits={len(commits)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Callback latency with hundreds of concurrent users, sync vs executor DB access.")
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 4])
+    parser.add_argument('--commit-delay', type=float, default=2.0, help="simulated fsync cost per commit, ms")
+    parser.add_argument('--send-latency', type=float, default=50.0, help="simulated Telegram round trip, ms")
+    parser.add_argument('--think-time', type=float, default=6000.0, help="max pause between a user's taps, ms")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    random.seed(0)
+    for workers in args.workers:
+        asyncio.run(run_mode(workers, args))
+
+
+if __name__ == "__main__":
+    main()
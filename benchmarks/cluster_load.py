@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import functools
+import logging
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from lib.bot_lib.db_connector import DatabaseConnector
+from lib.bot_lib.migrations import Migrator
+from lib.bot_lib.sharding import ClusterSupervisor
+from lib.quiz_lib.quiz import QuizSingleton
+from benchmarks.support import FakeRequest, configure_quiz, percentile, write_engine_config
+from benchmarks.webhook_load import SECRET, build_payloads, client
+
+
+def finished_sessions(db_path):
+    try:
+        with sqlite3.connect(db_path, timeout=30) as connection:
+            return connection.execute("SELECT COUNT(*) FROM quiz_sessions WHERE status = 'finished'").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+
+async def wait_until_finished(db_path, expected, timeout=600):
+    deadline = time.perf_counter() + timeout
+    while finished_sessions(db_path) < expected:
+        if time.perf_counter() > deadline:
+            raise RuntimeError("Timed out waiting for the workers to finish every quiz.")
+        await asyncio.sleep(0.05)
+
+
+async def run(args, workers):
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_quiz(workdir, questions=args.questions)
+        bot_config = {
+            'mode': 'cluster',
+            'concurrent_updates': args.concurrent_updates,
+            'webhook': {'listen': '127.0.0.1', 'port': 0, 'url_path': 'telegram'},
+            'cluster': {'workers': workers, 'base_port': args.base_port},
+        }
+        config_paths = write_engine_config(workdir, bot_config=bot_config,
+                                           db_config={'session_cache': {'flush_interval': 1}},
+                                           secrets={'webhook_secret_token': SECRET})
+        QuizSingleton().cache_dir = str(Path(workdir) / "cache")
+
+        # What the parent BotEngine does before it spawns workers in cluster mode.
+        connector = DatabaseConnector(config_path=config_paths['database'], secrets_path=config_paths['secrets'])
+        Migrator(connector, out=lambda message: None).upgrade()
+        connector.shutdown()
+
+        supervisor = ClusterSupervisor(config_paths, bot_config, '123456:BENCHMARK', SECRET,
+                                       request_factory=functools.partial(FakeRequest, latency=args.send_latency / 1000))
+        supervisor.start_workers()
+        try:
+            await supervisor.start_router()
+            router = supervisor.router
+
+            per_user = build_payloads(args.users, args.questions)
+            shards = [[] for _ in range(args.connections)]
+            for index, updates in enumerate(per_user):
+                shards[index % args.connections].extend(updates)
+
+            samples = []
+            started = time.perf_counter()
+            await asyncio.gather(*(client(router.port, router.url_path, shard, samples) for shard in shards))
+            ingested = time.perf_counter() - started
+            await wait_until_finished(str(Path(workdir) / "bench.db"), args.users)
+            processed = time.perf_counter() - started
+            forwarded = list(router.forwarded)
+            await router.stop()
+        finally:
+            supervisor.stop_workers()
+
+    total = len(samples)
+    print(f"workers={workers:<3} updates={total:<6} "
+          f"ingest={total / ingested:8.0f}/s (post p99={percentile(samples, 99) * 1000:6.2f}ms) "
+          f"processed={total / processed:8.0f}/s per_worker={forwarded}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the shard router in front of N worker processes and measure throughput.")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--connections', type=int, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--concurrent-updates', type=int, default=64)
+    parser.add_argument('--send-latency', type=float, default=20.0, help="simulated Bot API round trip, ms")
+    parser.add_argument('--base-port', type=int, default=29001)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    for workers in args.workers:
+        asyncio.run(run(args, workers))
+
+
+if __name__ == "__main__":
+    main()
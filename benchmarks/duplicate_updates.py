@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import tempfile
+import time
+
+from sqlalchemy import event
+from telegram import Update
+
+from lib.bot_lib.bot_engine import BotEngine
+from benchmarks.support import FakeRequest, callback_update_json, command_update_json, configure_quiz, write_engine_config
+
+
+MODES = {
+    'legacy': {'ids': False, 'dedup': False},
+    'ids': {'ids': True, 'dedup': False},
+    'ids+dedup': {'ids': True, 'dedup': True},
+}
+
+
+async def next_screen(request, chat_id, previous, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        screen = request.screens.get(chat_id)
+        if screen is not None and screen != previous:
+            return screen
+        await asyncio.sleep(0.002)
+    raise TimeoutError(f"chat {chat_id} got no reply")
+
+
+async def play(user_id, application, request, update_ids, mode, args, rng, expected):
+    queue = application.update_queue
+    await queue.put(Update.de_json(command_update_json(next(update_ids), user_id, '/start'), application.bot))
+    screen = await next_screen(request, user_id, None)
+    correct = 0
+    while screen[1] is not None:
+        button = rng.choice([row[0] for row in screen[1]['inline_keyboard']])
+        data = button['callback_data'] if mode['ids'] else ':'.join(button['callback_data'].split(':')[:2])
+        # write_question_bank lists the correct answer first: "Answer <n>-0".
+        correct += button['text'].endswith('-0')
+
+        payload = callback_update_json(next(update_ids), user_id, data, message_id=screen[0])
+        await queue.put(Update.de_json(payload, application.bot))
+        if rng.random() < args.redeliver:
+            # Telegram delivering the very same update again (same update and query id).
+            await queue.put(Update.de_json(payload, application.bot))
+        if rng.random() < args.double_tap:
+            # A second tap on the same button: a new update and query id with the same data.
+            await queue.put(Update.de_json(callback_update_json(next(update_ids), user_id, data, message_id=screen[0]),
+                                           application.bot))
+        screen = await next_screen(request, user_id, screen)
+    expected[user_id] = correct
+
+
+async def run_mode(name, args):
+    mode = MODES[name]
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_quiz(workdir, questions=args.questions)
+        config_paths = write_engine_config(workdir, bot_config={
+            'mode': 'polling',
+            'concurrent_updates': args.concurrent_updates,
+            # Unlimited send rates: this is about correctness, not throttling.
+            'send_queue': {'global_rate': 0, 'chat_rate': 0, 'coalesce_window': 0},
+            'callback_dedup': {'enabled': mode['dedup']},
+        })
+        request = FakeRequest()
+        engine = BotEngine(config_paths, request=request)
+        application = engine.application
+
+        commits = []
+        event.listen(engine.db_connector.engine, 'commit', lambda connection: commits.append(1))
+        lookups = []
+        session_get = engine.session_cache.get
+
+        async def counting_get(user_id):
+            lookups.append(user_id)
+            return await session_get(user_id)
+
+        engine.session_cache.get = counting_get
+
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+
+        expected = {}
+        update_ids = itertools.count(1)
+        started = time.perf_counter()
+        await asyncio.gather(*(play(user_id, application, request, update_ids, mode, args, rng, expected)
+                               for user_id in range(1, args.users + 1)))
+        while application.update_queue.qsize() or application.update_processor.current_concurrent_updates:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+
+        await application.stop()
+        await application.post_stop(application)
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+    answers = engine.answer_events.written
+    wrong_scores = sum(1 for user_id, correct in expected.items()
+                       if engine.stats.best_result(user_id) is None or engine.stats.best_result(user_id).correct != correct)
+    dedup = engine.handler_deps.callbacks
+    print(f"{name:<10} {elapsed:6.2f}s updates={next(update_ids) - 1:<6} answers={answers:<6} (expected {args.users * args.questions}) "
+          f"wrong_scores={wrong_scores:<4} session_lookups={len(lookups):<6} commits={len(commits):<6} "
+          f"rejected_early={dedup.duplicates if dedup is not None else 0}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay duplicated callback updates through the Application and check the scores.")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--redeliver', type=float, default=0.2, help="share of callback updates delivered twice")
+    parser.add_argument('--double-tap', type=float, default=0.2, help="share of answers tapped twice")
+    parser.add_argument('--concurrent-updates', type=int, default=32)
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    for name in args.modes:
+        asyncio.run(run_mode(name, args))
+
+
+if __name__ == "__main__":
+    main()
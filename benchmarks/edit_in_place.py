@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import logging
+import random
+import tempfile
+import time
+
+from lib.bot_lib.message_handler import start_command, handle_answer_callback
+from lib.bot_lib.send_queue import SendScheduler
+from benchmarks.support import (FakeBot, command_update, callback_update, fake_context, configure_quiz, make_connector,
+                                make_dependencies)
+
+
+class CountingRecorder:
+    def __init__(self):
+        self.recorded = 0
+
+    def record(self, *args, **kwargs):
+        self.recorded += 1
+
+
+async def next_screen(bot, chat_id, previous, timeout=5.0):
+    # With the scheduler delivery is asynchronous: wait until the chat shows something new.
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        screen = bot.last_message.get(chat_id)
+        if screen is not None and screen != previous:
+            return screen
+        await asyncio.sleep(0.001)
+    raise TimeoutError(f"chat {chat_id} did not receive the next question")
+
+
+async def simulate_user(user_id, deps, bot, args, rng):
+    await start_command(command_update(user_id), fake_context(bot), deps)
+    screen = await next_screen(bot, user_id, None)
+    while screen[1] is not None:
+        buttons = [row[0].callback_data for row in screen[1].inline_keyboard]
+        data = rng.choice(buttons)
+        if args.legacy_callbacks:
+            data = ':'.join(data.split(':')[:2])
+        taps = 2 if rng.random() < args.double_tap else 1
+        await asyncio.gather(*(handle_answer_callback(callback_update(user_id, data, message_id=screen[2]), fake_context(bot), deps)
+                               for _ in range(taps)))
+        screen = await next_screen(bot, user_id, screen)
+
+
+async def run_mode(flow, scheduled, args):
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_quiz(workdir, questions=args.questions)
+        connector = make_connector(workdir, async_workers=2)
+        deps = make_dependencies(connector)
+        deps.edit_in_place = flow == 'edit'
+        deps.answer_events = CountingRecorder()
+        await deps.sessions.start()
+        bot = FakeBot(latency=args.send_latency / 1000)
+        if scheduled:
+            # Unlimited rates: this measures call counts, not throttling.
+            deps.sender = SendScheduler(global_rate=0, chat_rate=0)
+            deps.sender.start(bot)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(simulate_user(user_id, deps, bot, args, rng) for user_id in range(1, args.users + 1)))
+        if deps.sender is not None:
+            await deps.sender.stop()
+        elapsed = time.perf_counter() - started
+        await deps.sessions.stop()
+        connector.shutdown()
+
+    answers = deps.answer_events.recorded
+    expected = args.users * args.questions
+    label = f"{flow}{' + scheduler' if scheduled else ''}"
+    print(f"{label:<18} {elapsed:6.2f}s answers={answers:<5} (expected {expected}) "
+          f"api_calls={bot.sent + bot.edited:<5} per_answer={(bot.sent + bot.edited) / max(1, answers):5.2f} "
+          f"new_messages_per_user={bot.sent / args.users:6.1f} edits={bot.edited}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API calls per answer: a new message per step vs editing the question message.")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--send-latency', type=float, default=5.0, help="simulated Telegram round trip, ms")
+    parser.add_argument('--double-tap', type=float, default=0.1, help="share of taps delivered twice")
+    parser.add_argument('--legacy-callbacks', action='store_true', help="strip the question id and layout from callback data")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    for flow, scheduled in (('send', False), ('edit', False), ('send', True), ('edit', True)):
+        asyncio.run(run_mode(flow, scheduled, args))
+
+
+if __name__ == "__main__":
+    main()
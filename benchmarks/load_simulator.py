@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import event
+from telegram import Update
+
+from lib.bot_lib.bot_engine import BotEngine
+from benchmarks.support import (FakeRequest, callback_update_json, command_update_json, configure_quiz, drain_engine,
+                                git_commit, latency_summary, write_engine_config)
+
+
+class Simulation:
+    # Drives the real Application: every step is an Update put on application.update_queue, and the reply
+    # is read back from the fake Bot API the application talks to.
+    def __init__(self, engine, request, args):
+        self.engine = engine
+        self.application = engine.application
+        self.request = request
+        self.args = args
+        self.total_questions = len(engine.handler_deps.quiz_data.collection)
+        self.update_ids = itertools.count(1)
+        self.latencies = {'start': [], 'answer': [], 'command_c': [], 'stop': []}
+        self.outcomes = {'completed': 0, 'abandoned': 0, 'jumps': 0}
+
+    async def step(self, kind, user_id, payload, previous, with_buttons, record=True):
+        started = time.perf_counter()
+        await self.application.update_queue.put(Update.de_json(payload, self.application.bot))
+        screen = await self.request.next_screen(user_id, previous, timeout=self.args.reply_timeout,
+                                                with_buttons=with_buttons)
+        if record:
+            self.latencies[kind].append(time.perf_counter() - started)
+        return screen
+
+    async def command(self, kind, user_id, text, previous, with_buttons=True, record=True):
+        payload = command_update_json(next(self.update_ids), user_id, text)
+        return await self.step(kind, user_id, payload, previous, with_buttons, record)
+
+    async def think(self, rng):
+        if self.args.think_time:
+            await asyncio.sleep(rng.uniform(0, self.args.think_time / 1000))
+
+    async def play(self, user_id, rng):
+        # A quiz with the traffic mix we see: some users jump around with /c, some give up with /stop.
+        await self.think(rng)
+        screen = await self.command('start', user_id, '/start', None)
+        position = 0
+        while True:
+            await self.think(rng)
+            roll = rng.random()
+            if roll < self.args.abandon_rate:
+                await self.command('stop', user_id, '/stop', screen, with_buttons=False)
+                self.outcomes['abandoned'] += 1
+                return
+            if roll < self.args.abandon_rate + self.args.jump_rate:
+                position = rng.randrange(self.total_questions)
+                screen = await self.command('command_c', user_id, f'/c {position + 1}', screen)
+                self.outcomes['jumps'] += 1
+                continue
+
+            buttons = [row[0] for row in screen[1]['inline_keyboard']]
+            last = position == self.total_questions - 1
+            payload = callback_update_json(next(self.update_ids), user_id, rng.choice(buttons)['callback_data'],
+                                           message_id=screen[0])
+            screen = await self.step('answer', user_id, payload, screen, with_buttons=not last)
+            if last:
+                self.outcomes['completed'] += 1
+                return
+            position += 1
+
+    async def memory_per_user(self, users, first_user_id):
+        # Traced Python allocations still alive once each extra user has an active quiz and a question on screen.
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            await asyncio.gather(*(self.command('start', user_id, '/start', None, record=False)
+                                   for user_id in range(first_user_id, first_user_id + users)))
+            await drain_engine(self.engine)
+            grown = tracemalloc.get_traced_memory()[0] - baseline
+        finally:
+            tracemalloc.stop()
+        return grown / users
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_quiz(workdir, questions=args.questions)
+        bot_config = {
+            'mode': 'polling',
+            'concurrent_updates': args.concurrent_updates,
+            'question_flow': args.question_flow,
+            'metrics': {'enabled': True, 'port': 0},
+        }
+        if args.unlimited_sends:
+            bot_config['send_queue'] = {'global_rate': 0, 'chat_rate': 0}
+        if args.record_dir:
+            # The simulated traffic as a capture for traffic_replay, e.g. to try the replayer without real traffic.
+            bot_config['traffic_recording'] = {'enabled': True, 'directory': args.record_dir}
+        config_paths = write_engine_config(workdir, bot_config=bot_config)
+        request = FakeRequest(latency=args.api_latency / 1000)
+        engine = BotEngine(config_paths, request=request)
+        application = engine.application
+
+        commits = []
+        event.listen(engine.db_connector.engine, 'commit', lambda connection: commits.append(1))
+
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+
+        simulation = Simulation(engine, request, args)
+        rng = random.Random(args.seed)
+        user_rngs = [random.Random(rng.random()) for _ in range(args.users)]
+        started = time.perf_counter()
+        await asyncio.gather(*(simulation.play(user_id, user_rngs[user_id - 1]) for user_id in range(1, args.users + 1)))
+        # Write-behind included: what the run still owes the database counts against the run.
+        await drain_engine(engine)
+        elapsed = time.perf_counter() - started
+        updates = next(simulation.update_ids) - 1
+        api_calls = dict(request.calls)
+        db_commits = len(commits)
+        if engine.traffic_recorder:
+            await engine.traffic_recorder.stop()
+
+        memory_per_user = await simulation.memory_per_user(args.memory_users, args.users + 1) if args.memory_users else None
+
+        await application.stop()
+        await application.post_stop(application)
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+    answers = engine.answer_events.recorded
+    metrics = engine.metrics
+    all_latencies = [sample for samples in simulation.latencies.values() for sample in samples]
+    outbound = api_calls.get('sendMessage', 0) + api_calls.get('editMessageText', 0)
+    return {
+        'benchmark': 'load_simulator',
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'config': vars(args),
+        'results': {
+            'updates': updates,
+            'answers': answers,
+            'elapsed_s': elapsed,
+            'updates_per_sec': updates / elapsed if elapsed else 0.0,
+            'outcomes': simulation.outcomes,
+            'reply_latency': dict({'all': latency_summary(all_latencies)},
+                                  **{kind: latency_summary(samples) for kind, samples in simulation.latencies.items()}),
+            'db_commits': db_commits,
+            'db_commits_per_answer': db_commits / answers if answers else None,
+            'api_calls': api_calls,
+            'messages_per_answer': outbound / answers if answers else None,
+            'memory_per_active_user_bytes': memory_per_user,
+            'handlers': {name: histogram.to_h() for name, histogram in metrics.handler_latency.items() if histogram.count},
+            'db_operations': {name: histogram.to_h() for name, histogram in metrics.db_latency.items()},
+        },
+    }
+
+
+def print_summary(report):
+    results = report['results']
+    latency = results['reply_latency']
+    print(f"{results['updates']} updates in {results['elapsed_s']:.2f}s = {results['updates_per_sec']:.0f} updates/s "
+          f"({results['outcomes']})", file=sys.stderr)
+    for kind, summary in latency.items():
+        if summary['count']:
+            print(f"  reply latency {kind:<10} n={summary['count']:<6} p50={summary['p50_ms']:7.2f}ms "
+                  f"p99={summary['p99_ms']:7.2f}ms max={summary['max_ms']:7.2f}ms", file=sys.stderr)
+    memory = results['memory_per_active_user_bytes']
+    print(f"  db commits/answer={results['db_commits_per_answer'] or 0:.3f} messages/answer={results['messages_per_answer'] or 0:.2f} "
+          f"memory/active user={memory / 1024 if memory is not None else 0:.1f} KiB", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated users taking quizzes through the real Application; writes a JSON report.")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--think-time', type=float, default=0.0, help="max pause between a user's steps, ms")
+    parser.add_argument('--abandon-rate', type=float, default=0.02, help="chance per step that the user sends /stop")
+    parser.add_argument('--jump-rate', type=float, default=0.02, help="chance per step that the user sends /c <n>")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="simulated Bot API round trip, ms")
+    parser.add_argument('--concurrent-updates', type=int, default=64)
+    parser.add_argument('--question-flow', choices=('send', 'edit'), default='send')
+    parser.add_argument('--unlimited-sends', action='store_true', help="lift the send scheduler's Telegram rate limits")
+    parser.add_argument('--reply-timeout', type=float, default=120.0,
+                        help="seconds a user waits for a reply; the default send limits queue replies for a while")
+    parser.add_argument('--memory-users', type=int, default=200, help="extra users started under tracemalloc; 0 skips it")
+    parser.add_argument('--record-dir', help="also record the simulated updates as a traffic capture in this directory")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    report = asyncio.run(run(args))
+    print_summary(report)
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
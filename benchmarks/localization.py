@@ -0,0 +1,89 @@
+import argparse
+import logging
+import random
+import time
+
+import yaml
+
+from lib.bot_lib.localization import Localization
+
+
+class LegacyLocalization:
+    # The lookup the handlers used before the compiled catalog: exact language key or English, then str.format.
+    def __init__(self, locales_path="config/locales.yml"):
+        with open(locales_path, 'r', encoding='utf-8') as f:
+            self.messages = yaml.safe_load(f)
+        self.default_lang = 'en'
+
+    def get_message(self, key, lang='en'):
+        lang_messages = self.messages.get(lang, self.messages.get(self.default_lang, {}))
+        return lang_messages.get(key, f"_[{key}]_")
+
+
+# The calls message_handler.py makes for one quiz turn, before and after the compiled catalog.
+MESSAGES = {
+    'answer_correct': (
+        lambda loc, lang: loc.get_message('answer_correct', lang=lang),
+        lambda loc, lang: loc.render('answer_correct', lang),
+    ),
+    'answer_incorrect': (
+        lambda loc, lang: loc.get_message('answer_incorrect', lang=lang).format(correct_answer="Answer 7-0"),
+        lambda loc, lang: loc.render('answer_incorrect', lang, correct_answer="Answer 7-0"),
+    ),
+    'quiz_finished_report': (
+        lambda loc, lang: loc.get_message('quiz_finished_report', lang=lang).format(correct=7, total=10, percentage=70.0),
+        lambda loc, lang: loc.render('quiz_finished_report', lang, correct=7, total=10, percentage=70.0),
+    ),
+    'greeting_message': (
+        lambda loc, lang: loc.get_message('greeting_message', lang=lang),
+        lambda loc, lang: loc.render('greeting_message', lang),
+    ),
+    'jump_to_q': (
+        lambda loc, lang: loc.get_message('jump_to_q', lang=lang).format(q_num=4),
+        lambda loc, lang: loc.render('jump_to_q', lang, q_num=4),
+    ),
+    'stats_leaderboard_line': (
+        lambda loc, lang: loc.get_message('stats_leaderboard_line', lang=lang).format(
+            rank=1, name="alice", correct=9, total=10, percentage=90.0),
+        lambda loc, lang: loc.render('stats_leaderboard_line', lang, rank=1, name="alice", correct=9, total=10, percentage=90.0),
+    ),
+}
+
+LANGUAGES = ['en', 'uk', 'en-US', 'uk-UA', 'en-GB', 'pt-BR', None]
+
+
+def run(loc, side, calls):
+    started = time.perf_counter()
+    for paths, lang in calls:
+        paths[side](loc, lang)
+    return (time.perf_counter() - started) * 1e9 / len(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="The handlers' message path: nested lookup + str.format vs the compiled catalog.")
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--rounds', type=int, default=7, help="interleaved rounds; the best round is reported")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    rng = random.Random(0)
+    calls = [(rng.choice(list(MESSAGES.values())), rng.choice(LANGUAGES)) for _ in range(args.messages)]
+
+    legacy = LegacyLocalization()
+    started = time.perf_counter()
+    compiled = Localization()
+    print(f"catalog build: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    negotiated = sum(1 for _, lang in calls if lang and lang not in legacy.messages and compiled.negotiate(lang) != 'en')
+    print(f"messages in the wrong language before negotiation: {negotiated} of {len(calls)}")
+
+    timings = {'legacy': [], 'compiled': []}
+    for _ in range(args.rounds):
+        timings['legacy'].append(run(legacy, 0, calls))
+        timings['compiled'].append(run(compiled, 1, calls))
+    for label, samples in timings.items():
+        print(f"{label:<10} best={min(samples):6.0f} ns/message  median={sorted(samples)[len(samples) // 2]:6.0f} ns/message")
+
+
+if __name__ == "__main__":
+    main()
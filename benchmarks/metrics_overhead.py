@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import tempfile
+import time
+
+from telegram import Update
+
+from lib.bot_lib.bot_engine import BotEngine
+from lib.bot_lib.metrics import MetricsRegistry
+from benchmarks.support import FakeRequest, callback_update_json, command_update_json, configure_quiz, write_engine_config
+
+
+async def noop_handler(update, context, deps):
+    return None
+
+
+async def dispatch(handler, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        await handler(None, None)
+    return (time.perf_counter() - started) * 1e9 / count
+
+
+async def hot_path_overhead(args):
+    # The handler wrapper BotEngine installs, with and without the metrics registry around it.
+    registry = MetricsRegistry()
+    plain = lambda update, context: noop_handler(update, context, None)
+    timed = registry.instrument('noop_handler', plain)
+    samples = {'plain': [], 'instrumented': []}
+    for _ in range(args.rounds):
+        samples['plain'].append(await dispatch(plain, args.calls))
+        samples['instrumented'].append(await dispatch(timed, args.calls))
+    plain_ns, timed_ns = min(samples['plain']), min(samples['instrumented'])
+    print(f"handler wrapper: plain={plain_ns:.0f} ns  instrumented={timed_ns:.0f} ns  overhead={timed_ns - plain_ns:.0f} ns/update")
+
+    started = time.perf_counter()
+    for _ in range(args.calls):
+        registry.observe_db('create_quiz_session', 0.0004)
+    print(f"db observation: {(time.perf_counter() - started) * 1e9 / args.calls:.0f} ns/call")
+
+
+async def scrape(port, path='/metrics'):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode('latin-1'))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response.decode('utf-8')
+
+
+async def next_screen(request, chat_id, previous, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        screen = request.screens.get(chat_id)
+        if screen is not None and screen != previous:
+            return screen
+        await asyncio.sleep(0.002)
+    raise TimeoutError(f"chat {chat_id} got no reply")
+
+
+async def play(user_id, application, request, update_ids):
+    await application.update_queue.put(Update.de_json(command_update_json(next(update_ids), user_id, '/start'), application.bot))
+    screen = await next_screen(request, user_id, None)
+    while screen[1] is not None:
+        data = screen[1]['inline_keyboard'][0][0]['callback_data']
+        await application.update_queue.put(Update.de_json(
+            callback_update_json(next(update_ids), user_id, data, message_id=screen[0]), application.bot))
+        screen = await next_screen(request, user_id, screen)
+
+
+async def run_engine(metrics_enabled, args):
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_quiz(workdir, questions=args.questions)
+        config_paths = write_engine_config(workdir, bot_config={
+            'mode': 'polling',
+            'concurrent_updates': 32,
+            'send_queue': {'global_rate': 0, 'chat_rate': 0, 'coalesce_window': 0},
+            'metrics': {'enabled': metrics_enabled, 'port': 0},
+        })
+        request = FakeRequest()
+        engine = BotEngine(config_paths, request=request)
+        application = engine.application
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+
+        update_ids = itertools.count(1)
+        # CPU time rather than wall time: the simulated users wait on replies, the process does not.
+        started = time.process_time()
+        await asyncio.gather(*(play(user_id, application, request, update_ids) for user_id in range(1, args.users + 1)))
+        while application.update_queue.qsize() or application.update_processor.current_concurrent_updates:
+            await asyncio.sleep(0.01)
+        cpu = time.process_time() - started
+        updates = next(update_ids) - 1
+
+        text = None
+        if metrics_enabled:
+            started_scrape = time.perf_counter()
+            text = await scrape(engine.metrics_server.port)
+            scrape_ms = (time.perf_counter() - started_scrape) * 1000
+
+        await application.stop()
+        await application.post_stop(application)
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+    label = "metrics on" if metrics_enabled else "metrics off"
+    print(f"{label:<12} {updates} updates, {cpu:5.2f}s CPU = {cpu * 1e6 / updates:7.1f} us CPU/update")
+    if text is not None:
+        body = text.split('\r\n\r\n', 1)[1]
+        print(f"{'':<12} scrape: {scrape_ms:.1f}ms, {len(body)} bytes, {body.count(chr(10))} lines")
+        for line in body.splitlines():
+            if line.startswith(('quiz_handler_duration_seconds_count', 'quiz_db_duration_seconds_count', 'quiz_active_sessions',
+                                'quiz_send_queue_sent_total', 'quiz_handler_errors_total')):
+                print(f"{'':<12} {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-update cost of the metrics instrumentation, and a scrape of the endpoint.")
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--questions', type=int, default=10)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    asyncio.run(hot_path_overhead(args))
+    for enabled in (False, True, False, True):
+        asyncio.run(run_engine(enabled, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from lib.quiz_lib.question_data import QuestionData
+from lib.quiz_lib.quiz import QuizSingleton
+from benchmarks.support import write_question_bank
+
+
+def timed_load(label):
+    started = time.perf_counter()
+    question_data = QuestionData()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<36} {elapsed:8.3f}s  questions={len(question_data.collection)}")
+    return question_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time of the question bank with and without the compiled cache.")
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--files', type=int, default=100)
+    parser.add_argument('--with-dumps', action='store_true', help="also time the old testing.json/testing.yml boot dumps")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        questions_dir = write_question_bank(workdir / "questions", args.questions, files=args.files)
+        config = QuizSingleton()
+        config.yaml_dir = str(questions_dir)
+        config.log_dir = str(workdir / "log")
+        config.answers_dir = str(workdir / "answers")
+        config.in_ext = 'yml'
+
+        config.cache_dir = None
+        question_data = timed_load("no cache (YAML every boot)")
+
+        if args.with_dumps:
+            started = time.perf_counter()
+            question_data.save_to_json(filename=str(workdir / "testing.json"))
+            question_data.save_to_yaml(filename=str(workdir / "testing.yml"))
+            print(f"{'boot dumps (json + yml)':<36} {time.perf_counter() - started:8.3f}s")
+
+        config.cache_dir = str(workdir / "cache")
+        timed_load("cold cache (parse + write cache)")
+        timed_load("warm cache (nothing changed)")
+
+        changed = sorted(questions_dir.glob("*.yml"))[0]
+        changed.write_text(changed.read_text(encoding='utf-8') + "\n", encoding='utf-8')
+        timed_load("warm cache, one file edited")
+
+        for path in questions_dir.glob("*.yml"):
+            path.touch()
+        timed_load("warm cache, all files touched")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from lib.quiz_lib.question_data import QuestionData
+from lib.quiz_lib.quiz import QuizSingleton
+from benchmarks.support import write_question_bank
+
+
+MODES = [
+    ('thread', False),
+    ('process', False),
+    ('thread', True),
+    ('process', True),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare question loader modes: threads, process pool and libyaml.")
+    parser.add_argument('--questions', type=int, default=20000, help="total questions, split across the files")
+    parser.add_argument('--files', type=int, nargs='+', default=[1, 10, 1000])
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    config = QuizSingleton()
+    config.in_ext = 'yml'
+    config.cache_dir = None
+
+    for files in args.files:
+        with tempfile.TemporaryDirectory() as workdir:
+            workdir = Path(workdir)
+            config.yaml_dir = str(write_question_bank(workdir / "questions", args.questions, files=files))
+            config.log_dir = str(workdir / "log")
+            config.answers_dir = str(workdir / "answers")
+
+            reference = None
+            for loader, libyaml in MODES:
+                config.loader = loader
+                config.libyaml = libyaml
+                started = time.perf_counter()
+                question_data = QuestionData()
+                elapsed = time.perf_counter() - started
+
+                bodies = [question.question_body for question in question_data.collection]
+                reference = reference or bodies
+                label = f"{loader} + {'libyaml' if libyaml else 'pure python'}"
+                print(f"files={files:<5} {label:<22} {elapsed:8.3f}s questions={len(bodies)} "
+                      f"same_order={'yes' if bodies == reference else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
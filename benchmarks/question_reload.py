@@ -0,0 +1,74 @@
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from lib.quiz_lib.question_data import QuestionData
+from lib.quiz_lib.quiz import QuizSingleton
+from lib.bot_lib.reply_markup_formatter import render_question, warm_render_cache
+from benchmarks.support import write_question_bank
+
+
+def timed(label, block):
+    started = time.perf_counter()
+    result = block()
+    elapsed = time.perf_counter() - started
+    questions = len(result.collection) if result is not None else "unchanged"
+    print(f"{label:<40} {elapsed * 1000:10.1f}ms  questions={questions}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Question bank reload: restart-style full load vs incremental snapshot reload.")
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--files', type=int, default=100)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        questions_dir = write_question_bank(workdir / "questions", args.questions, files=args.files)
+        config = QuizSingleton()
+        config.yaml_dir = str(questions_dir)
+        config.log_dir = str(workdir / "log")
+        config.answers_dir = str(workdir / "answers")
+        config.in_ext = 'yml'
+        config.cache_dir = None
+
+        current = timed("full load (what a restart does)", QuestionData)
+        started = time.perf_counter()
+        warm_render_cache(current)
+        print(f"{'  + warm render cache':<40} {(time.perf_counter() - started) * 1000:10.1f}ms")
+
+        timed("reload, nothing changed", current.reload)
+
+        files = sorted(questions_dir.glob("*.yml"))
+        edited = files[0]
+        edited.write_text(edited.read_text(encoding='utf-8').replace("Synthetic question #0?", "Edited question #0?"), encoding='utf-8')
+        snapshot = timed("reload, one file edited", current.reload)
+        reused = sum(1 for a, b in zip(current.collection, snapshot.collection) if a is b)
+        print(f"{'':<40} questions shared with the old snapshot: {reused}, render cache carried over: {len(snapshot.render_cache)}")
+        # The old snapshot is untouched: an update that started before the swap still sees the old text.
+        assert current.collection[0].question_body == "Synthetic question #0?"
+        assert snapshot.collection[0].question_body == "Edited question #0?"
+        assert render_question(current, 0)[0] != render_question(snapshot, 0)[0]
+        current = snapshot
+
+        added = questions_dir / "zz_added.yml"
+        added.write_text(files[1].read_text(encoding='utf-8').replace("Synthetic", "Added"), encoding='utf-8')
+        current = timed("reload, one file added", current.reload)
+
+        for path in files:
+            path.touch()
+        current = timed("reload, all files touched (checkout)", current.reload)
+
+        added.unlink()
+        current = timed("reload, one file removed", current.reload)
+
+        edited.write_text("- question: [unterminated\n", encoding='utf-8')
+        current = timed("reload, one file broken (kept old)", current.reload)
+
+
+if __name__ == "__main__":
+    main()
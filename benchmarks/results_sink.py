@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import datetime
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from lib.bot_lib.results_sink import ResultsSink
+from lib.quiz_lib.file_writer import FileWriter
+from lib.quiz_lib.quiz import QuizSingleton
+from lib.quiz_lib.statistics import Statistics
+from benchmarks.support import percentile
+
+
+def legacy_report(answers_dir, user_id, correct, total):
+    # What send_next_question_or_finish used to do: a new text file per finished quiz, on the event loop.
+    timestamp_str = datetime.datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
+    filepath = Path(answers_dir) / f"QUIZ_s_{timestamp_str}.txt"
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(f"Quiz Session Report\nUser ID: {user_id}\nCorrect Answers: {correct}\nTotal Questions: {total}\n")
+
+
+async def finish_quizzes(args, write, samples):
+    for user_id in range(1, args.results + 1):
+        started = time.perf_counter()
+        write(user_id)
+        samples.append(time.perf_counter() - started)
+        if user_id % 100 == 0:
+            await asyncio.sleep(0)
+
+
+async def run(args, mode):
+    with tempfile.TemporaryDirectory() as workdir:
+        config = QuizSingleton()
+        config.answers_dir = workdir
+        samples = []
+        sink = None
+        started = time.perf_counter()
+
+        if mode == 'legacy':
+            await finish_quizzes(args, lambda user_id: legacy_report(workdir, user_id, 7, 10), samples)
+        else:
+            writer = FileWriter('a', 'results.jsonl', max_bytes=args.max_bytes, compress=(mode == 'sink+gzip'))
+            sink = ResultsSink(writer)
+            sink.start()
+            details = {'username': 'bench', 'status': 'finished', 'start_time': datetime.datetime.now().isoformat()}
+            await finish_quizzes(args, lambda user_id: Statistics(sink, 7, 3).write_record(
+                10, user_id=user_id, session_id=user_id, **details), samples)
+            await sink.stop()
+
+        elapsed = time.perf_counter() - started
+        files = list(Path(workdir).iterdir())
+        size = sum(path.stat().st_size for path in files)
+
+    print(f"{mode:<10} results={args.results:<7} total={elapsed:6.2f}s ({args.results / elapsed:8.0f}/s) "
+          f"loop p50={percentile(samples, 50) * 1e6:7.1f}us p99={percentile(samples, 99) * 1e6:7.1f}us "
+          f"files={len(files):<6} bytes={size}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finished-quiz result writing: file per quiz vs the rotating JSONL sink.")
+    parser.add_argument('--results', type=int, default=50000)
+    parser.add_argument('--max-bytes', type=int, default=4 * 1024 * 1024)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    for mode in ('legacy', 'sink', 'sink+gzip'):
+        asyncio.run(run(args, mode))
+
+
+if __name__ == "__main__":
+    main()
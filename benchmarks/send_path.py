@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+from lib.bot_lib.message_handler import send_question
+from lib.bot_lib.reply_markup_formatter import format_answers_as_inline_keyboard, format_question_text, render_question
+from benchmarks.support import FakeBot, command_update, configure_quiz, fake_context, make_connector, make_dependencies
+
+
+def bench(label, func, iterations):
+    started = time.perf_counter()
+    for index in range(iterations):
+        func(index)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed / iterations * 1e6:8.2f} us/op")
+
+
+async def bench_async(label, func, iterations):
+    started = time.perf_counter()
+    for index in range(iterations):
+        await func(index)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed / iterations * 1e6:8.2f} us/op")
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_quiz(workdir, questions=args.questions)
+        deps = make_dependencies(make_connector(workdir))
+        quiz_data = deps.quiz_data
+        total = len(quiz_data.collection)
+
+        def uncached(index):
+            question = quiz_data.collection[index % total]
+            return format_question_text(question, index % total, total), format_answers_as_inline_keyboard(question)
+
+        def cached(index):
+            return render_question(quiz_data, index % total)
+
+        bench("render, rebuilt every call", uncached, args.iterations)
+        bench("render, cached", cached, args.iterations)
+
+        bot = FakeBot()
+        update = command_update(1)
+        context = fake_context(bot)
+
+        async def send_uncached(index):
+            quiz_data.render_cache = {}
+            await send_question(update, context, deps, index % total)
+
+        async def send_cached(index):
+            await send_question(update, context, deps, index % total)
+
+        await bench_async("send_question, cache cleared", send_uncached, args.iterations)
+        await bench_async("send_question, cache warm", send_cached, args.iterations)
+        deps.db.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark of the question send path with and without the render cache.")
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=50000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import logging
+import random
+import tempfile
+import time
+
+from telegram.error import RetryAfter
+
+from lib.bot_lib.message_handler import start_command, handle_answer_callback
+from lib.bot_lib.send_queue import SendScheduler, TokenBucket
+from benchmarks.support import (command_update, callback_update, fake_context, configure_quiz, make_connector,
+                                make_dependencies, percentile, timed)
+
+
+class FloodLimitedBot:
+    # Answers 429 like the Bot API does once a chat or the whole bot goes over its limit.
+    def __init__(self, latency, global_rate, chat_rate, chat_burst, retry_after=1):
+        self.latency = latency
+        self.retry_after = retry_after
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = {}
+        self.calls = 0
+        self.delivered = 0
+        self.flood_errors = 0
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        bucket = self.chat_buckets.setdefault(chat_id, TokenBucket(self.chat_rate, self.chat_burst))
+        if bucket.delay(now) or self.global_bucket.delay(now):
+            self.flood_errors += 1
+            raise RetryAfter(self.retry_after)
+        bucket.take(now)
+        self.global_bucket.take(now)
+        self.delivered += 1
+        return True
+
+
+class RetryingBot:
+    # The direct path with the obvious fix for 429s: sleep and retry inside the handler.
+    def __init__(self, bot, max_retries=3):
+        self.bot = bot
+        self.max_retries = max_retries
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.bot.send_message(chat_id, text, reply_markup=reply_markup)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+
+async def simulate_user(user_id, deps, bot, args, samples, errors):
+    try:
+        await asyncio.sleep(random.uniform(0, args.think_time / 1000))
+        await start_command(command_update(user_id), fake_context(bot), deps)
+        for _ in range(args.questions):
+            await asyncio.sleep(random.uniform(0, args.think_time / 1000))
+            await timed(samples, handle_answer_callback(callback_update(user_id, "answer:A"), fake_context(bot), deps))
+    except RetryAfter:
+        # Even the handler's error reply hit the flood limit: this user is stuck.
+        errors.append(user_id)
+
+
+async def run_mode(scheduled, args):
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_quiz(workdir, questions=args.questions)
+        connector = make_connector(workdir, async_workers=2)
+        deps = make_dependencies(connector)
+        await deps.sessions.start()
+
+        server = FloodLimitedBot(args.send_latency / 1000, args.global_rate, args.chat_rate, args.chat_burst)
+        if scheduled:
+            deps.sender = SendScheduler(global_rate=args.global_rate, chat_rate=args.chat_rate, chat_burst=args.chat_burst,
+                                        coalesce_window=args.coalesce_window / 1000)
+            deps.sender.start(server)
+            bot = server
+        else:
+            bot = RetryingBot(server)
+
+        samples = []
+        errors = []
+        started = time.perf_counter()
+        await asyncio.gather(*(simulate_user(user_id, deps, bot, args, samples, errors) for user_id in range(1, args.users + 1)))
+        handlers_done = time.perf_counter() - started
+        if deps.sender is not None:
+            await deps.sender.stop()
+        elapsed = time.perf_counter() - started
+        await deps.sessions.stop()
+        connector.shutdown()
+
+    label = "scheduler" if scheduled else "direct"
+    print(f"{label:<10} taps={len(samples):<6} handlers={handlers_done:6.1f}s drained={elapsed:6.1f}s "
+          f"handler_p50={percentile(samples, 50) * 1000:8.2f}ms p99={percentile(samples, 99) * 1000:8.2f}ms "
+          f"api_calls={server.calls:<6} delivered={server.delivered:<6} 429s={server.flood_errors:<6} stuck_users={len(errors)}")
+    if scheduled:
+        metrics = deps.sender.metrics
+        queue = metrics.queue_latency.to_h()
+        print(f"{'':<10} coalesced={metrics.coalesced} retried={metrics.retried} failed={metrics.failed} "
+              f"queue_latency avg={queue['avg'] * 1000:.1f}ms p50<={queue['p50'] * 1000:.0f}ms "
+              f"p99<={queue['p99'] * 1000:.0f}ms max={queue['max'] * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Handler latency and 429s: direct sends vs the outbound send scheduler.")
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--think-time', type=float, default=3000.0, help="max pause between a user's taps, ms")
+    parser.add_argument('--send-latency', type=float, default=40.0, help="simulated Telegram round trip, ms")
+    parser.add_argument('--global-rate', type=float, default=30)
+    parser.add_argument('--chat-rate', type=float, default=1)
+    parser.add_argument('--chat-burst', type=float, default=3)
+    parser.add_argument('--coalesce-window', type=float, default=50.0, help="ms")
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    for scheduled in (False, True):
+        asyncio.run(run_mode(scheduled, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import logging
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+from lib.bot_lib.models import QuizSession
+from lib.bot_lib.session_cache import find_active_session
+from benchmarks.support import make_connector, percentile
+
+
+def fill_history(db_path, rows, users, batch=100000):
+    # Raw sqlite3 and no indexes while loading: this is about the lookups, not the insert path.
+    statuses = ('finished', 'cancelled')
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.executemany("INSERT INTO users (id, username) VALUES (?, ?)",
+                               ((user_id, f"user{user_id}") for user_id in range(1, users + 1)))
+        for start in range(0, rows, batch):
+            connection.executemany(
+                "INSERT INTO quiz_sessions (user_id, current_question_index, correct_answers_count, status, version) "
+                "VALUES (?, 10, ?, ?, 1)",
+                ((row % users + 1, row % 11, statuses[row % 2]) for row in range(start, min(start + batch, rows))),
+            )
+        # Every other user is in the middle of a quiz.
+        connection.executemany("INSERT INTO quiz_sessions (user_id, status, version) VALUES (?, 'active', 1)",
+                               ((user_id,) for user_id in range(1, users + 1, 2)))
+
+
+def measure(connector, users, lookups):
+    rng = random.Random(7)
+    samples = []
+    found = 0
+    session = connector.get_session()
+    try:
+        for _ in range(lookups):
+            user_id = rng.randint(1, users)
+            started = time.perf_counter()
+            if find_active_session(session, user_id) is not None:
+                found += 1
+            samples.append(time.perf_counter() - started)
+            session.rollback()
+    finally:
+        session.close()
+    return samples, found
+
+
+def report(label, samples, found):
+    print(f"{label:<10} lookups={len(samples):<6} p50={percentile(samples, 50) * 1000:9.3f}ms "
+          f"p99={percentile(samples, 99) * 1000:9.3f}ms max={max(samples) * 1000:9.3f}ms active_found={found}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Active session lookup latency over a large quiz_sessions history.")
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--unindexed-lookups', type=int, default=20, help="full scans are slow, keep this small")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as workdir:
+        connector = make_connector(workdir, async_workers=0)
+        indexes = list(QuizSession.__table__.indexes)
+        with connector.engine.begin() as connection:
+            for index in indexes:
+                connection.execute(text(f"DROP INDEX {index.name}"))
+
+        started = time.perf_counter()
+        fill_history(str(Path(workdir) / "bench.db"), args.rows, args.users)
+        print(f"loaded {args.rows} historical sessions for {args.users} users in {time.perf_counter() - started:.1f}s")
+
+        report('no index', *measure(connector, args.users, args.unindexed_lookups))
+
+        started = time.perf_counter()
+        for index in indexes:
+            index.create(connector.engine)
+        with connector.engine.begin() as connection:
+            connection.execute(text("ANALYZE quiz_sessions"))
+        print(f"built {len(indexes)} indexes in {time.perf_counter() - started:.1f}s")
+
+        report('indexed', *measure(connector, args.users, args.lookups))
+        connector.shutdown()
+
+
+if __name__ == "__main__":
+    main()
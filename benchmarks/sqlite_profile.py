@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from lib.bot_lib.models import QuizSession, User
+from lib.bot_lib.session_cache import write_session_rows
+from benchmarks.support import make_connector, percentile, timed
+
+
+PROFILES = {
+    # What the connector did before: rollback journal, fsync on every commit, pool_size only.
+    'legacy': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'cache_size': -2000, 'mmap_size': 0,
+               'temp_store': 'DEFAULT', 'pool_class': 'queue'},
+    'tuned': {},
+}
+
+
+def seed_sessions(session, users):
+    session.add_all(User(id=user_id, username=f"user{user_id}") for user_id in range(1, users + 1))
+    session.flush()
+    quiz_sessions = [QuizSession(user_id=user_id, status='active') for user_id in range(1, users + 1)]
+    session.add_all(quiz_sessions)
+    session.commit()
+    return [(quiz_session.id, quiz_session.version) for quiz_session in quiz_sessions]
+
+
+async def answer_questions(connector, session_id, version, questions, samples, errors):
+    for index in range(1, questions + 1):
+        row = {'id': session_id, 'current_question_index': index, 'correct_answers_count': index,
+               'current_question_id': None, 'end_time': None, 'status': 'active', 'version': version}
+        try:
+            await timed(samples, connector.run_in_session(write_session_rows, [row]))
+            version += 1
+        except OperationalError:
+            errors.append(session_id)
+
+
+async def run(args, profile_name):
+    with tempfile.TemporaryDirectory() as workdir:
+        connector = make_connector(workdir, async_workers=args.workers, sqlite=PROFILES[profile_name])
+        sessions = await connector.run_in_session(seed_sessions, args.users)
+
+        samples = []
+        errors = []
+        started = time.perf_counter()
+        await asyncio.gather(*(answer_questions(connector, session_id, version, args.questions, samples, errors)
+                               for session_id, version in sessions))
+        elapsed = time.perf_counter() - started
+        connector.shutdown()
+
+    print(f"profile={profile_name:<7} workers={args.workers:<3} commits={len(samples):<6} "
+          f"throughput={len(samples) / elapsed:8.0f}/s p50={percentile(samples, 50) * 1000:7.2f}ms "
+          f"p99={percentile(samples, 99) * 1000:7.2f}ms locked_errors={len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quiz-answer commit throughput with concurrent writers per SQLite profile.")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    for profile_name in args.profiles:
+        asyncio.run(run(args, profile_name))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import logging
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+from lib.bot_lib.migrations import Migration, migration_files
+from lib.bot_lib.stats_engine import QuizResult, StatsEngine
+from benchmarks.support import make_connector, percentile
+
+
+SCAN_QUERIES = {
+    'question_rates': "SELECT question_id, AVG(is_correct), COUNT(*) FROM answer_events GROUP BY question_id",
+    'histogram': "SELECT (correct_answers_count * 10) / current_question_index AS bucket, COUNT(*) FROM quiz_sessions "
+                 "WHERE status = 'finished' GROUP BY bucket",
+    'top10': "SELECT user_id, MAX(100.0 * correct_answers_count / current_question_index) AS best FROM quiz_sessions "
+             "WHERE status = 'finished' GROUP BY user_id ORDER BY best DESC LIMIT 10",
+}
+
+
+def seed(db_path, sessions, users, answers, questions, batch=100000):
+    rng = random.Random(3)
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.executemany("INSERT INTO users (id, username) VALUES (?, ?)",
+                               ((user_id, f"user{user_id}") for user_id in range(1, users + 1)))
+        for start in range(0, sessions, batch):
+            connection.executemany(
+                "INSERT INTO quiz_sessions (user_id, current_question_index, correct_answers_count, status, end_time, version) "
+                "VALUES (?, 20, ?, 'finished', CURRENT_TIMESTAMP, 1)",
+                ((rng.randint(1, users), rng.randint(0, 20)) for _ in range(start, min(start + batch, sessions))),
+            )
+        for start in range(0, answers, batch):
+            connection.executemany(
+                "INSERT INTO answer_events (user_id, session_id, question_id, question_index, chosen_option, is_correct, latency_ms, answered_at) "
+                "VALUES (?, 1, ?, 0, 'A', ?, ?, CURRENT_TIMESTAMP)",
+                ((rng.randint(1, users), 'q%06d' % rng.randrange(questions), rng.random() < 0.6, rng.randint(500, 20000))
+                 for _ in range(start, min(start + batch, answers))),
+            )
+
+
+def timed_call(samples, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    samples.append(time.perf_counter() - started)
+    return result
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        connector = make_connector(workdir, async_workers=1)
+        started = time.perf_counter()
+        seed(str(Path(workdir) / "bench.db"), args.sessions, args.users, args.answers, args.questions)
+        print(f"seeded {args.sessions} finished sessions and {args.answers} answer events in {time.perf_counter() - started:.1f}s")
+
+        # The same backfill migration 006 runs on an existing database.
+        backfill = Migration(*[item for item in migration_files() if item[0] == 6][0]).module
+        started = time.perf_counter()
+        with connector.engine.begin() as connection:
+            for statement in (backfill.BACKFILL_QUESTION_STATS, backfill.BACKFILL_HISTOGRAM, backfill.BACKFILL_LEADERBOARD):
+                connection.execute(text(statement))
+        print(f"backfilled aggregates in {time.perf_counter() - started:.1f}s")
+
+        for name, query in SCAN_QUERIES.items():
+            samples = []
+            with connector.engine.connect() as connection:
+                for _ in range(args.scan_repeats):
+                    timed_call(samples, lambda: connection.execute(text(query)).fetchall())
+            print(f"scan   {name:<16} p50={percentile(samples, 50) * 1000:10.3f}ms")
+
+        engine = StatsEngine(connector)
+        started = time.perf_counter()
+        await engine.load()
+        print(f"engine load        {(time.perf_counter() - started) * 1000:10.1f}ms")
+
+        rng = random.Random(5)
+        question_ids = ['q%06d' % index for index in range(args.questions)]
+        lookups = {
+            'question_rate': lambda: engine.question_stats(rng.choice(question_ids)),
+            'histogram': engine.histogram,
+            'top10': lambda: engine.top(10),
+            'hardest3': lambda: engine.hardest_questions(3),
+            'apply_answers': lambda: engine.apply_answers([{'question_id': rng.choice(question_ids),
+                                                            'is_correct': rng.random() < 0.5, 'latency_ms': 900}]),
+            'rank': lambda: engine.rank(rng.randint(1, args.users)),
+            'apply_result': lambda: engine.apply_result(QuizResult(rng.randint(1, args.users), None, rng.randint(0, 20), 20)),
+        }
+        for name, func in lookups.items():
+            samples = []
+            for _ in range(args.lookups):
+                timed_call(samples, func)
+            print(f"engine {name:<16} p50={percentile(samples, 50) * 1e6:10.2f}us p99={percentile(samples, 99) * 1e6:8.2f}us")
+        connector.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statistics queries: scanning history vs the incremental StatsEngine.")
+    parser.add_argument('--sessions', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--answers', type=int, default=2_000_000)
+    parser.add_argument('--questions', type=int, default=500)
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--scan-repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import asyncio
+import itertools
+import json
+import subprocess
+import time
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+import yaml
+from telegram.request import BaseRequest
+
+from lib.bot_lib.db_connector import DatabaseConnector
+from lib.bot_lib.localization import Localization
+from lib.bot_lib.message_handler import HandlerDependencies
+from lib.bot_lib.migrations import Migrator
+from lib.bot_lib.session_cache import ActiveSessionCache
+from lib.quiz_lib.question_data import QuestionData
+from lib.quiz_lib.quiz import QuizSingleton
+
+
+class FakeBot:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = 0
+        self.edited = 0
+        self.last_message = {}
+        self._message_ids = itertools.count(1)
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent += 1
+        message_id = next(self._message_ids)
+        self.last_message[chat_id] = (text, reply_markup, message_id)
+        return SimpleNamespace(message_id=message_id, chat_id=chat_id, text=text)
+
+    async def edit_message_text(self, chat_id, message_id, text, reply_markup=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.edited += 1
+        self.last_message[chat_id] = (text, reply_markup, message_id)
+        return SimpleNamespace(message_id=message_id, chat_id=chat_id, text=text)
+
+
+class FakeRequest(BaseRequest):
+    BOT_USER = {'id': 100000, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+        # Latest (message_id, reply_markup, text) per chat, so a simulated user can tap the real buttons.
+        self.screens = {}
+        self._screen_changed = {}
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] += 1
+        if self.latency and endpoint != 'getMe':
+            await asyncio.sleep(self.latency)
+
+        params = request_data.json_parameters if request_data else {}
+        if endpoint == 'getMe':
+            result = self.BOT_USER
+        elif endpoint in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup'):
+            chat_id = int(params.get('chat_id', 0))
+            result = {
+                'message_id': int(params.get('message_id', 0)) or next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': self.BOT_USER,
+                'text': params.get('text', ''),
+            }
+            reply_markup = json.loads(params['reply_markup']) if params.get('reply_markup') else None
+            self.screens[chat_id] = (result['message_id'], reply_markup, result['text'])
+            changed = self._screen_changed.pop(chat_id, None)
+            if changed is not None:
+                changed.set()
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode('utf-8')
+
+    async def next_screen(self, chat_id, previous, timeout=30.0, with_buttons=False):
+        # Woken by the reply itself rather than by polling, so measured latencies are not rounded up to a poll interval.
+        deadline = time.monotonic() + timeout
+        while True:
+            screen = self.screens.get(chat_id)
+            if screen is not None and screen != previous and (screen[1] is not None or not with_buttons):
+                return screen
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"chat {chat_id} got no reply")
+            changed = self._screen_changed.setdefault(chat_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+
+class FakeCallbackQuery:
+    _ids = itertools.count(1)
+
+    def __init__(self, data, message_id=None):
+        self.id = str(next(self._ids))
+        self.data = data
+        self.message = SimpleNamespace(message_id=message_id, date=None) if message_id else None
+
+    async def answer(self, *args, **kwargs):
+        return True
+
+
+def fake_user(user_id, language_code='en'):
+    return SimpleNamespace(id=user_id, username=f"user{user_id}", language_code=language_code)
+
+
+def command_update(user_id, language_code='en'):
+    return SimpleNamespace(
+        effective_user=fake_user(user_id, language_code),
+        effective_chat=SimpleNamespace(id=user_id),
+        callback_query=None,
+    )
+
+
+def callback_update(user_id, data, language_code='en', message_id=None):
+    return SimpleNamespace(
+        effective_user=fake_user(user_id, language_code),
+        effective_chat=SimpleNamespace(id=user_id),
+        callback_query=FakeCallbackQuery(data, message_id),
+    )
+
+
+def user_json(user_id, language_code='en'):
+    return {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}",
+            'username': f"user{user_id}", 'language_code': language_code}
+
+
+def command_update_json(update_id, user_id, text, language_code='en'):
+    command = text.split()[0]
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': user_json(user_id, language_code),
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+        },
+    }
+
+
+def callback_update_json(update_id, user_id, data, message_id=None, language_code='en'):
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': user_json(user_id, language_code),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                # Each tap on its own question message unless told otherwise, as in the default send flow.
+                'message_id': message_id or update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'text': '',
+            },
+        },
+    }
+
+
+def fake_context(bot, args=None):
+    return SimpleNamespace(bot=bot, args=args or [])
+
+
+def write_question_bank(directory, count, files=1, answers=3):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    per_file = max(1, count // files)
+    number = 0
+    for file_index in range(files):
+        items = []
+        for _ in range(per_file):
+            items.append({
+                'question': f"Synthetic question #{number}?",
+                'answers': [f"Answer {number}-{a}" for a in range(answers)],
+            })
+            number += 1
+        with open(directory / f"bench_{file_index:05d}.yml", 'w', encoding='utf-8') as f:
+            yaml.safe_dump(items, f, allow_unicode=True)
+    return directory
+
+
+def configure_quiz(workdir, questions=20):
+    workdir = Path(workdir)
+    questions_dir = write_question_bank(workdir / "questions", questions)
+    config = QuizSingleton()
+    config.yaml_dir = str(questions_dir)
+    config.answers_dir = str(workdir / "quiz_answers")
+    config.log_dir = str(workdir / "log")
+    config.in_ext = 'yml'
+    Path(config.answers_dir).mkdir(parents=True, exist_ok=True)
+    return config
+
+
+def make_connector(workdir, **db_config):
+    workdir = Path(workdir)
+    config = {'adapter': 'sqlite3', 'database': str(workdir / "bench.db")}
+    config.update(db_config)
+    config_path = workdir / "database.yml"
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f)
+    connector = DatabaseConnector(config_path=str(config_path), secrets_path=str(workdir / "secrets.yml"))
+    Migrator(connector, out=lambda message: None).upgrade()
+    return connector
+
+
+def make_dependencies(connector, locales_path="config/locales.yml"):
+    return HandlerDependencies(
+        db_connector=connector,
+        question_data=QuestionData(),
+        localization=Localization(locales_path=locales_path),
+        session_cache=ActiveSessionCache.from_config(connector),
+    )
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples):
+    return {
+        'count': len(samples),
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000 if samples else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def drain_engine(engine):
+    # Until every admitted update is handled, every queued message sent and the write-behind flushed.
+    application = engine.application
+    while application.update_queue.qsize() or application.update_processor.current_concurrent_updates:
+        await asyncio.sleep(0.01)
+    if engine.sender is not None:
+        while engine.sender.pending:
+            await asyncio.sleep(0.01)
+    await engine.session_cache.flush()
+    await engine.answer_events.flush()
+
+
+async def timed(samples, coroutine):
+    started = time.perf_counter()
+    await coroutine
+    samples.append(time.perf_counter() - started)
+
+
+async def monitor_loop_lag(samples, stop, interval=0.01):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+def write_engine_config(workdir, bot_config=None, db_config=None, secrets=None):
+    workdir = Path(workdir)
+    files = {
+        'database': ({'adapter': 'sqlite3', 'database': str(workdir / "bench.db"), 'auto_migrate': True,
+                      'answer_events': {'spill_file': str(workdir / "answer_events.spill.jsonl")}}, db_config),
+        'bot': ({'mode': 'polling'}, bot_config),
+        'secrets': ({'telegram_bot_token': '123456:BENCHMARK'}, secrets),
+    }
+    config_paths = {
+        'locales': 'config/locales.yml',
+        'questions_dir': QuizSingleton().yaml_dir,
+        'log_dir': QuizSingleton().log_dir,
+        'answers_dir': QuizSingleton().answers_dir,
+    }
+    for name, (defaults, overrides) in files.items():
+        data = dict(defaults)
+        data.update(overrides or {})
+        path = workdir / f"{name}.yml"
+        with open(path, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(data, f)
+        config_paths[name] = str(path)
+    return config_paths
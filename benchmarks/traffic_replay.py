@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import yaml
+from sqlalchemy import event
+from telegram import Update
+
+from lib.bot_lib.bot_engine import BotEngine
+from lib.bot_lib.reply_markup_formatter import answer_callback_data, parse_answer_callback
+from lib.bot_lib.traffic_recorder import read_capture
+from lib.quiz_lib.quiz import QuizSingleton
+from benchmarks.support import FakeRequest, drain_engine, git_commit, latency_summary, write_engine_config
+
+
+WRITE_VERBS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# What compare looks at, and which direction is worse. Latencies are per update kind and filled in at compare time.
+COMPARED = [
+    (('updates_per_sec',), 'higher'),
+    (('db', 'commits'), 'lower'),
+    (('db', 'write_statements'), 'lower'),
+    (('db', 'rows_written'), 'lower'),
+    (('db', 'rows_written_per_update'), 'lower'),
+    (('api_calls_total',), 'lower'),
+]
+
+
+def load_yaml(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def update_kind(update):
+    if update.callback_query is not None:
+        return 'callback'
+    message = update.effective_message
+    if message is not None and message.text and message.text.startswith('/'):
+        return message.text.split()[0][1:].split('@')[0]
+    return 'other'
+
+
+def retarget_answer(update, quiz_data, quiz_session):
+    # Answer orders are seeded per session, so a recorded tap names a letter in a layout the replayed session
+    # never shows. The layout tag spells out the recorded order: the tap becomes the same answer's letter in
+    # the replayed layout. Taps that were stale when recorded stay stale (the question id is kept).
+    parsed = parse_answer_callback(update.callback_query.data)
+    if parsed is None or parsed[1] is None or quiz_session is None:
+        return None
+    char, question_id, layout = parsed
+    index = quiz_data.index_by_id.get(question_id)
+    if index is None:
+        return None
+    question = quiz_data.collection[index]
+    try:
+        chosen = ord(layout[ord(char) - ord('A')]) - ord('a')
+        permutation = question.permutation(quiz_session.answer_seed or 0)
+        data = answer_callback_data(chr(ord('A') + permutation.index(chosen)), question_id, permutation)
+    except (IndexError, ValueError):
+        return None
+    if data == update.callback_query.data:
+        return None
+    payload = update.to_dict()
+    payload['callback_query']['data'] = data
+    return Update.de_json(payload, update.get_bot())
+
+
+class DatabaseWrites:
+    def __init__(self, engine):
+        self.commits = 0
+        self.statements = defaultdict(int)
+        self.rows = 0
+        event.listen(engine, 'commit', self.on_commit)
+        event.listen(engine, 'before_cursor_execute', self.on_execute)
+
+    def on_commit(self, connection):
+        self.commits += 1
+
+    def on_execute(self, connection, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb in WRITE_VERBS:
+            self.statements[verb] += 1
+            self.rows += len(parameters) if executemany else 1
+
+
+def configure_build(workdir, args):
+    # This checkout's own bot and database settings, pointed at scratch files: the committed database,
+    # the answers directory and the question cache are never touched.
+    workdir = Path(workdir)
+    config = QuizSingleton()
+    config.yaml_dir = str(Path(args.questions_dir).resolve())
+    config.answers_dir = str(workdir / "quiz_answers")
+    config.log_dir = str(workdir / "log")
+    config.cache_dir = None
+    config.in_ext = 'yml'
+    Path(config.answers_dir).mkdir(parents=True, exist_ok=True)
+
+    bot_config = load_yaml(args.bot_config)
+    bot_config.update(
+        mode='polling',
+        metrics={'enabled': True, 'port': 0},
+        question_reload={'enabled': False},
+        traffic_recording={'enabled': False},
+        profiling={'enabled': False},
+    )
+    if args.unlimited_sends:
+        bot_config['send_queue'] = dict(bot_config.get('send_queue') or {}, global_rate=0, chat_rate=0)
+
+    db_config = load_yaml(args.database_config)
+    db_config.update(adapter='sqlite3', database=str(workdir / "replay.db"), auto_migrate=True)
+    db_config['answer_events'] = dict(db_config.get('answer_events') or {}, spill_file=str(workdir / "answer_events.spill.jsonl"))
+    return write_engine_config(workdir, bot_config=bot_config, db_config=db_config)
+
+
+async def replay(args):
+    entries = list(read_capture(args.capture))
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        raise SystemExit(f"No updates in {args.capture}")
+    span = entries[-1][0] - entries[0][0]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config_paths = configure_build(workdir, args)
+        request = FakeRequest(latency=args.api_latency / 1000)
+        engine = BotEngine(config_paths, request=request)
+        application = engine.application
+        writes = DatabaseWrites(engine.db_connector.engine)
+
+        # Handling is from dispatch to done; end to end also counts the wait behind the user's earlier updates.
+        handling = defaultdict(list)
+        end_to_end = defaultdict(list)
+        enqueued = {}
+        retargeted = 0
+        process_update = application.process_update
+
+        async def timed_process_update(update):
+            nonlocal retargeted
+            queued = enqueued.pop(id(update), None)
+            if update.callback_query is not None:
+                # Runs after the user's earlier updates, so the session is the one this tap lands on.
+                user_id = update.callback_query.from_user.id
+                replacement = retarget_answer(update, engine.handler_deps.quiz_data, await engine.session_cache.get(user_id))
+                if replacement is not None:
+                    update = replacement
+                    retargeted += 1
+            started = time.perf_counter()
+            try:
+                await process_update(update)
+            finally:
+                done = time.perf_counter()
+                kind = update_kind(update)
+                handling[kind].append(done - started)
+                if queued is not None:
+                    end_to_end[kind].append(done - queued)
+
+        application.process_update = timed_process_update
+
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+
+        first = entries[0][0]
+        slip = 0.0
+        started = time.perf_counter()
+        for offset, payload in entries:
+            if args.speed:
+                delay = (offset - first) / args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    slip = max(slip, -delay)
+            update = Update.de_json(payload, application.bot)
+            enqueued[id(update)] = time.perf_counter()
+            await application.update_queue.put(update)
+        await drain_engine(engine)
+        elapsed = time.perf_counter() - started
+        api_calls = dict(request.calls)
+        send_wait = engine.sender.metrics.queue_latency.to_h() if engine.sender else None
+
+        await application.stop()
+        await application.post_stop(application)
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+    metrics = engine.metrics
+    all_handling = [sample for samples in handling.values() for sample in samples]
+    all_end_to_end = [sample for samples in end_to_end.values() for sample in samples]
+    kinds = sorted(handling)
+    return {
+        'benchmark': 'traffic_replay',
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'config': dict(vars(args), capture_sha256=file_digest(args.capture)),
+        'results': {
+            'updates': len(entries),
+            'capture_span_s': span,
+            'elapsed_s': elapsed,
+            'updates_per_sec': len(entries) / elapsed if elapsed else 0.0,
+            'schedule_slip_max_ms': slip * 1000,
+            'handling': dict({'all': latency_summary(all_handling)},
+                             **{kind: latency_summary(handling[kind]) for kind in kinds}),
+            'end_to_end': dict({'all': latency_summary(all_end_to_end)},
+                               **{kind: latency_summary(end_to_end[kind]) for kind in kinds}),
+            'db': {
+                'commits': writes.commits,
+                'write_statements': sum(writes.statements.values()),
+                'write_statements_by_verb': dict(writes.statements),
+                'rows_written': writes.rows,
+                'rows_written_per_update': writes.rows / len(entries),
+            },
+            'answers': engine.answer_events.recorded,
+            'answers_retargeted': retargeted,
+            'api_calls': api_calls,
+            'api_calls_total': sum(count for endpoint, count in api_calls.items() if endpoint != 'getMe'),
+            'send_queue_wait': send_wait,
+            'handler_errors': {name: count for name, count in metrics.handler_errors.items() if count},
+            'log_errors': dict(metrics.log_errors),
+        },
+    }
+
+
+def print_summary(report):
+    results = report['results']
+    print(f"{results['updates']} updates ({results['capture_span_s']:.1f}s captured) replayed in {results['elapsed_s']:.2f}s "
+          f"= {results['updates_per_sec']:.0f} updates/s, max schedule slip {results['schedule_slip_max_ms']:.1f}ms",
+          file=sys.stderr)
+    for kind, summary in results['end_to_end'].items():
+        if summary['count']:
+            handled = results['handling'][kind]
+            print(f"  {kind:<10} n={summary['count']:<6} end-to-end p50={summary['p50_ms']:7.2f}ms p99={summary['p99_ms']:7.2f}ms "
+                  f"handling p50={handled['p50_ms']:7.2f}ms p99={handled['p99_ms']:7.2f}ms", file=sys.stderr)
+    db = results['db']
+    print(f"  db commits={db['commits']} write statements={db['write_statements']} rows written={db['rows_written']} "
+          f"({db['rows_written_per_update']:.3f}/update), api calls={results['api_calls_total']}", file=sys.stderr)
+    if results['handler_errors'] or results['log_errors']:
+        print(f"  handler errors={results['handler_errors']} log errors={results['log_errors']}", file=sys.stderr)
+
+
+def lookup(results, path):
+    value = results
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(base, new):
+    base_results, new_results = base['results'], new['results']
+    compared = list(COMPARED)
+    kinds = sorted(set(base_results['end_to_end']) | set(new_results['end_to_end']))
+    for kind in kinds:
+        for section in ('end_to_end', 'handling'):
+            for stat in ('p50_ms', 'p99_ms'):
+                compared.append(((section, kind, stat), 'lower'))
+
+    rows = []
+    for path, better in compared:
+        before, after = lookup(base_results, path), lookup(new_results, path)
+        if before is None or after is None:
+            continue
+        delta = after - before
+        change = delta / before * 100 if before else None
+        worse = (delta > 0) if better == 'lower' else (delta < 0)
+        rows.append({'metric': '.'.join(path), 'base': before, 'new': after, 'delta': delta, 'change_pct': change,
+                     'regression': worse and delta != 0})
+    return rows
+
+
+def run_compare(args):
+    with open(args.base, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    if base['config'].get('capture_sha256') != new['config'].get('capture_sha256'):
+        print("Warning: the two reports replayed different captures.", file=sys.stderr)
+    for key in ('speed', 'unlimited_sends', 'api_latency'):
+        if base['config'].get(key) != new['config'].get(key):
+            print(f"Warning: the reports differ in {key}: {base['config'].get(key)} vs {new['config'].get(key)}.", file=sys.stderr)
+
+    rows = compare(base, new)
+    print(f"{'metric':<32} {base.get('git_commit') or 'base':>12} {new.get('git_commit') or 'new':>12} {'delta':>12} {'change':>9}")
+    failed = []
+    for row in rows:
+        change = f"{row['change_pct']:+8.1f}%" if row['change_pct'] is not None else '        -'
+        # Small absolute latency moves are noise on a replay; the threshold is relative.
+        flagged = row['regression'] and row['change_pct'] is not None and row['change_pct'] * (1 if row['delta'] > 0 else -1) > args.threshold
+        if flagged:
+            failed.append(row['metric'])
+        print(f"{row['metric']:<32} {row['base']:>12.3f} {row['new']:>12.3f} {row['delta']:>+12.3f} {change}{'  <-' if flagged else ''}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'base': base.get('git_commit'), 'new': new.get('git_commit'), 'threshold_pct': args.threshold,
+                       'regressions': failed, 'metrics': rows}, f, indent=2)
+            f.write('\n')
+    if failed:
+        print(f"{len(failed)} metrics regressed by more than {args.threshold:.0f}%: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded traffic capture through this build, or compare two replays.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    replay_parser = commands.add_parser('replay', help="feed a capture through the handlers against a fake Bot API")
+    replay_parser.add_argument('capture', help="traffic-*.jsonl.gz written by the traffic recorder")
+    replay_parser.add_argument('--speed', type=float, default=1.0, help="1 keeps the recorded timing, 10 is ten times faster, 0 sends everything at once")
+    replay_parser.add_argument('--limit', type=int, help="replay only the first N updates")
+    replay_parser.add_argument('--questions-dir', default='config/questions', help="the question bank the capture was recorded against")
+    replay_parser.add_argument('--bot-config', default='config/bot.yml')
+    replay_parser.add_argument('--database-config', default='config/database.yml', help="settings only; replay uses a scratch SQLite file")
+    replay_parser.add_argument('--api-latency', type=float, default=0.0, help="simulated Bot API round trip, ms")
+    replay_parser.add_argument('--unlimited-sends', action='store_true', help="lift the send scheduler's Telegram rate limits")
+    replay_parser.add_argument('--output', help="write the JSON report here instead of stdout")
+
+    compare_parser = commands.add_parser('compare', help="latency and DB-write deltas between two replay reports")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help="percent change counted as a regression")
+    compare_parser.add_argument('--output', help="also write the comparison as JSON")
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        sys.exit(run_compare(args))
+
+    logging.disable(logging.WARNING)
+    report = asyncio.run(replay(args))
+    print_summary(report)
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
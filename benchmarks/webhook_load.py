@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import time
+
+from lib.bot_lib.bot_engine import BotEngine
+from benchmarks.support import (FakeRequest, callback_update_json, command_update_json, configure_quiz,
+                                percentile, write_engine_config)
+
+
+SECRET = 'bench-secret'
+
+
+async def post(reader, writer, port, path, payload, secret=SECRET):
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nContent-Type: application/json\r\n"
+        f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    while (await reader.readline()) not in (b'\r\n', b''):
+        pass
+    return int(status_line.split()[1])
+
+
+async def client(port, path, payloads, samples):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for payload in payloads:
+            started = time.perf_counter()
+            status = await post(reader, writer, port, path, payload)
+            samples.append(time.perf_counter() - started)
+            if status != 200:
+                raise RuntimeError(f"Webhook answered {status}")
+    finally:
+        writer.close()
+
+
+def build_payloads(users, questions):
+    update_ids = iter(range(1, users * (questions + 1) + 1))
+    per_user = []
+    for user_id in range(1, users + 1):
+        updates = [command_update_json(next(update_ids), user_id, '/start')]
+        updates += [callback_update_json(next(update_ids), user_id, 'answer:A') for _ in range(questions)]
+        per_user.append(updates)
+    return per_user
+
+
+async def wait_until_processed(application, request, expected, timeout=300):
+    deadline = time.perf_counter() + timeout
+    while request.calls['answerCallbackQuery'] < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    while application.update_processor.current_concurrent_updates and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def run(args, concurrent_updates):
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_quiz(workdir, questions=args.questions)
+        config_paths = write_engine_config(
+            workdir,
+            bot_config={'mode': 'webhook', 'concurrent_updates': concurrent_updates,
+                        'webhook': {'listen': '127.0.0.1', 'port': 0, 'url_path': 'telegram'}},
+            secrets={'webhook_secret_token': SECRET},
+        )
+        request = FakeRequest(latency=args.send_latency / 1000)
+        engine = BotEngine(config_paths, request=request)
+        await engine.start_webhook()
+        port = engine.webhook_server.port
+        path = engine.webhook_server.url_path
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        rejected = await post(reader, writer, port, path, command_update_json(0, 1, '/start'), secret='wrong')
+        writer.close()
+        assert rejected == 403, f"expected 403 for a bad secret token, got {rejected}"
+
+        per_user = build_payloads(args.users, args.questions)
+        shards = [[] for _ in range(args.connections)]
+        for index, updates in enumerate(per_user):
+            shards[index % args.connections].extend(updates)
+
+        samples = []
+        started = time.perf_counter()
+        await asyncio.gather(*(client(port, path, shard, samples) for shard in shards))
+        ingested = time.perf_counter() - started
+        await wait_until_processed(engine.application, request, args.users * args.questions)
+        processed = time.perf_counter() - started
+
+        await engine.stop_webhook()
+
+    total = len(samples)
+    print(f"concurrent_updates={concurrent_updates:<4} updates={total:<6} "
+          f"ingest={total / ingested:8.0f}/s (post p99={percentile(samples, 99) * 1000:6.2f}ms) "
+          f"processed={total / processed:8.0f}/s api_calls={sum(request.calls.values())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="POST synthetic Update JSON at the webhook listener and measure throughput.")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--connections', type=int, default=20)
+    parser.add_argument('--concurrent-updates', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--send-latency', type=float, default=20.0, help="simulated Bot API round trip, ms")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    for concurrent_updates in args.concurrent_updates:
+        asyncio.run(run(args, concurrent_updates))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,34 @@
-import sys
-import os
-from pathlib import Path
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, String, Table
+from sqlalchemy.sql import func
 
-project_root = Path(__file__).parent.parent.parent
-sys.path.insert(0, str(project_root / "lib"))
-sys.path.insert(0, str(project_root))
+DESCRIPTION = "Create users and quiz_sessions tables"
 
-from lib.bot_lib.db_connector import DatabaseConnector
-from lib.bot_lib.models import Base
+# The schema as it was first shipped; later columns and indexes arrive in their own migrations.
+metadata = MetaData()
 
-DATABASE_CONFIG_PATH = project_root / "config" / "database.yml"
+users = Table(
+    'users', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('username', String, unique=True, nullable=True),
+    Column('created_at', DateTime, server_default=func.now()),
+    Column('updated_at', DateTime),
+)
 
-def apply_migration():
-    print("Applying migration: Create Users table...")
-    db_connector = DatabaseConnector(config_path=str(DATABASE_CONFIG_PATH))
+quiz_sessions = Table(
+    'quiz_sessions', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('users.id')),
+    Column('current_question_index', Integer),
+    Column('correct_answers_count', Integer),
+    Column('start_time', DateTime, server_default=func.now()),
+    Column('end_time', DateTime, nullable=True),
+    Column('status', String),
+)
 
-    if db_connector.engine:
-        try:
-            Base.metadata.create_all(bind=db_connector.engine)
-            print("Migration 001_create_users applied successfully.")
-        except Exception as e:
-            print(f"Error applying migration: {e}")
-    else:
-        print("Database connection failed. Cannot apply migration.")
+def up(op):
+    op.create_table(users)
+    op.create_table(quiz_sessions)
 
-if __name__ == "__main__":
-    apply_migration()
\ No newline at end of file
+def down(op):
+    op.drop_table('quiz_sessions')
+    op.drop_table('users')
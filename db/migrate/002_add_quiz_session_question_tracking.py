@@ -0,0 +1,14 @@
+DESCRIPTION = "Add question tracking columns to quiz_sessions"
+
+NEW_COLUMNS = {
+    'current_question_id': 'VARCHAR(16)',
+    'answer_seed': 'INTEGER',
+}
+
+def up(op):
+    for name, column_type in NEW_COLUMNS.items():
+        op.add_column('quiz_sessions', name, column_type)
+
+def down(op):
+    for name in reversed(list(NEW_COLUMNS)):
+        op.drop_column('quiz_sessions', name)
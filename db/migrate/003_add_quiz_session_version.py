@@ -0,0 +1,7 @@
+DESCRIPTION = "Add optimistic lock version to quiz_sessions"
+
+def up(op):
+    op.add_column('quiz_sessions', 'version', 'INTEGER NOT NULL DEFAULT 1')
+
+def down(op):
+    op.drop_column('quiz_sessions', 'version')
@@ -0,0 +1,22 @@
+DESCRIPTION = "Add active session indexes to quiz_sessions"
+
+# Indexes are built concurrently on PostgreSQL, which is not allowed inside a transaction.
+TRANSACTIONAL = False
+
+# Older builds could leave several active sessions per user; keep the newest one, cancel the rest.
+CANCEL_DUPLICATE_ACTIVE = """
+UPDATE quiz_sessions SET status = 'cancelled', end_time = CURRENT_TIMESTAMP
+WHERE status = 'active' AND id NOT IN (
+    SELECT MAX(id) FROM quiz_sessions WHERE status = 'active' GROUP BY user_id
+)
+"""
+
+def up(op):
+    op.execute(CANCEL_DUPLICATE_ACTIVE)
+    op.create_index('ix_quiz_sessions_user_id_status', 'quiz_sessions', ['user_id', 'status'])
+    op.create_index('uq_quiz_sessions_active_user', 'quiz_sessions', ['user_id'], unique=True, where="status = 'active'")
+    op.execute("ANALYZE quiz_sessions")
+
+def down(op):
+    op.drop_index('uq_quiz_sessions_active_user')
+    op.drop_index('ix_quiz_sessions_user_id_status')
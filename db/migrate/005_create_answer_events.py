@@ -0,0 +1,26 @@
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table
+
+DESCRIPTION = "Create answer_events table"
+
+metadata = MetaData()
+
+answer_events = Table(
+    'answer_events', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, nullable=False),
+    Column('session_id', Integer, nullable=False),
+    Column('question_id', String(16), nullable=False),
+    Column('question_index', Integer, nullable=False),
+    Column('chosen_option', String(4), nullable=False),
+    Column('is_correct', Boolean, nullable=False),
+    Column('latency_ms', Integer, nullable=True),
+    Column('answered_at', DateTime, nullable=False),
+)
+
+def up(op):
+    op.create_table(answer_events)
+    op.create_index('ix_answer_events_question_id', 'answer_events', ['question_id'])
+    op.create_index('ix_answer_events_session_id', 'answer_events', ['session_id'])
+
+def down(op):
+    op.drop_table('answer_events')
@@ -0,0 +1,76 @@
+from sqlalchemy import BigInteger, Column, DateTime, Float, Integer, MetaData, String, Table
+
+DESCRIPTION = "Create question_stats, score_histogram and leaderboard tables"
+
+metadata = MetaData()
+
+question_stats = Table(
+    'question_stats', metadata,
+    Column('question_id', String(16), primary_key=True),
+    Column('answered', Integer, nullable=False, default=0),
+    Column('correct', Integer, nullable=False, default=0),
+    Column('latency_ms_sum', BigInteger, nullable=False, default=0),
+    Column('latency_count', Integer, nullable=False, default=0),
+)
+
+score_histogram = Table(
+    'score_histogram', metadata,
+    Column('bucket', Integer, primary_key=True),
+    Column('count', Integer, nullable=False, default=0),
+    Column('percentage_sum', Float, nullable=False, default=0),
+)
+
+leaderboard = Table(
+    'leaderboard', metadata,
+    Column('user_id', Integer, primary_key=True),
+    Column('username', String, nullable=True),
+    Column('correct', Integer, nullable=False),
+    Column('total', Integer, nullable=False),
+    Column('percentage', Float, nullable=False),
+    Column('achieved_at', DateTime, nullable=False),
+)
+
+# Backfill from the history that already exists. A finished session's current_question_index
+# equals the number of questions it had, and bucket 10 holds perfect scores.
+BACKFILL_QUESTION_STATS = """
+INSERT INTO question_stats (question_id, answered, correct, latency_ms_sum, latency_count)
+SELECT question_id, COUNT(*), SUM(CASE WHEN is_correct THEN 1 ELSE 0 END), COALESCE(SUM(latency_ms), 0), COUNT(latency_ms)
+FROM answer_events GROUP BY question_id
+"""
+
+FINISHED_SCORES = """
+SELECT user_id, correct_answers_count AS correct, current_question_index AS total, end_time,
+       100.0 * correct_answers_count / current_question_index AS percentage,
+       CASE WHEN correct_answers_count >= current_question_index THEN 10
+            ELSE (correct_answers_count * 10) / current_question_index END AS bucket
+FROM quiz_sessions WHERE status = 'finished' AND current_question_index > 0
+"""
+
+BACKFILL_HISTOGRAM = f"""
+INSERT INTO score_histogram (bucket, count, percentage_sum)
+SELECT bucket, COUNT(*), SUM(percentage) FROM ({FINISHED_SCORES}) scores GROUP BY bucket
+"""
+
+BACKFILL_LEADERBOARD = f"""
+INSERT INTO leaderboard (user_id, username, correct, total, percentage, achieved_at)
+SELECT ranked.user_id, users.username, ranked.correct, ranked.total, ranked.percentage, COALESCE(ranked.end_time, CURRENT_TIMESTAMP)
+FROM (
+    SELECT scores.*, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY percentage DESC, correct DESC, end_time) AS position
+    FROM ({FINISHED_SCORES}) scores
+) ranked
+LEFT JOIN users ON users.id = ranked.user_id
+WHERE ranked.position = 1
+"""
+
+def up(op):
+    op.create_table(question_stats)
+    op.create_table(score_histogram)
+    op.create_table(leaderboard)
+    op.execute(BACKFILL_QUESTION_STATS)
+    op.execute(BACKFILL_HISTOGRAM)
+    op.execute(BACKFILL_LEADERBOARD)
+
+def down(op):
+    op.drop_table('leaderboard')
+    op.drop_table('score_histogram')
+    op.drop_table('question_stats')
@@ -0,0 +1,45 @@
+import sys
+import argparse
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root / "lib"))
+sys.path.insert(0, str(project_root))
+
+from lib.bot_lib.db_connector import DatabaseConnector
+from lib.bot_lib.migrations import Migrator
+
+DATABASE_CONFIG_PATH = project_root / "config" / "database.yml"
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply or revert the versioned schema migrations in db/migrate.")
+    parser.add_argument('command', choices=['up', 'down', 'status'])
+    parser.add_argument('--to', type=int, default=None, help="target version (up: default latest, down: required)")
+    parser.add_argument('--dry-run', action='store_true', help="print the SQL instead of running it")
+    parser.add_argument('--config', default=str(DATABASE_CONFIG_PATH))
+    args = parser.parse_args()
+
+    db_connector = DatabaseConnector(config_path=args.config)
+    if not db_connector.engine:
+        print("Database connection failed. Cannot run migrations.")
+        sys.exit(1)
+
+    try:
+        migrator = Migrator(db_connector)
+        print(f"Current schema version: {migrator.current()}, latest: {migrator.head}")
+        if args.command == 'status':
+            migrator.status()
+        elif args.command == 'up':
+            migrator.upgrade(args.to, dry_run=args.dry_run)
+        else:
+            if args.to is None:
+                parser.error("down needs --to VERSION")
+            migrator.downgrade(args.to, dry_run=args.dry_run)
+    except Exception as e:
+        print(f"Error running migrations: {e}")
+        sys.exit(1)
+    finally:
+        db_connector.shutdown()
+
+if __name__ == "__main__":
+    main()
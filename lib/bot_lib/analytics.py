@@ -0,0 +1,212 @@
+import logging
+import time
+
+import numpy as np
+
+from .db_connector import DatabaseConnector
+
+
+logger = logging.getLogger(__name__)
+
+STATUS_CODES = {'cancelled': 0, 'active': 1, 'finished': 2}
+
+SESSION_DTYPE = np.dtype([('id', np.int64), ('user_id', np.int64), ('reached', np.int32), ('correct', np.int32),
+                          ('status', np.int8), ('started', np.int64)])
+ANSWER_DTYPE = np.dtype([('session_id', np.int64), ('question_id', 'S16'), ('is_correct', np.int8), ('latency_ms', np.int64)])
+
+# Raw columns only: no ORM objects and no per-row type processing, timestamps arrive as epoch seconds.
+EPOCH_SQL = {
+    'sqlite': "CAST(strftime('%s', start_time) AS INTEGER)",
+    'postgresql': "CAST(EXTRACT(EPOCH FROM start_time) AS BIGINT)",
+}
+
+SESSIONS_QUERY = """
+SELECT id, user_id, COALESCE(current_question_index, 0), COALESCE(correct_answers_count, 0),
+       CASE status WHEN 'finished' THEN 2 WHEN 'active' THEN 1 ELSE 0 END, COALESCE({epoch}, 0)
+FROM quiz_sessions
+"""
+
+ANSWERS_QUERY = """
+SELECT session_id, question_id, CASE WHEN is_correct THEN 1 ELSE 0 END, COALESCE(latency_ms, -1)
+FROM answer_events
+"""
+
+
+class QuizAnalytics:
+    def __init__(self, db_connector: DatabaseConnector, chunk_size=500000):
+        if not db_connector.engine:
+            raise ValueError("Database engine is not initialized.")
+        self.engine = db_connector.engine
+        self.chunk_size = chunk_size
+
+    def _stream(self, query, dtype):
+        chunks = []
+        started = time.perf_counter()
+        # A raw DBAPI cursor hands back plain tuples, which NumPy packs straight into a record array.
+        connection = self.engine.raw_connection()
+        try:
+            # Named cursors are server-side on PostgreSQL, so only one chunk is held client-side at a time.
+            cursor = connection.cursor(name='quiz_analytics') if self.engine.dialect.name == 'postgresql' else connection.cursor()
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                chunks.append(np.array(rows, dtype=dtype))
+            cursor.close()
+        finally:
+            connection.close()
+        data = np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+        logger.info(f"Loaded {len(data)} rows in {len(chunks)} chunks ({time.perf_counter() - started:.2f}s).")
+        return data
+
+    def load_sessions(self):
+        epoch = EPOCH_SQL.get(self.engine.dialect.name, EPOCH_SQL['sqlite'])
+        return self._stream(SESSIONS_QUERY.format(epoch=epoch), SESSION_DTYPE)
+
+    def load_answers(self):
+        return self._stream(ANSWERS_QUERY, ANSWER_DTYPE)
+
+    def report(self, metrics=('difficulty', 'discrimination', 'funnel'), funnel_steps=(1, 5, 10, 20), cohort_days=7):
+        sessions = self.load_sessions()
+        answers = self.load_answers() if {'difficulty', 'discrimination'} & set(metrics) else None
+        result = {'sessions': int(len(sessions)), 'answers': int(len(answers)) if answers is not None else None}
+        if 'difficulty' in metrics:
+            result['difficulty'] = item_difficulty(answers)
+        if 'discrimination' in metrics:
+            result['discrimination'] = discrimination_index(answers, sessions)
+        if 'funnel' in metrics:
+            result['funnel'] = completion_funnel(sessions, funnel_steps, cohort_days)
+        return result
+
+
+def _question_codes(answers):
+    # Sorting 16-byte strings dominates the run time, so the ids are folded into one uint64 first;
+    # the grouping is then checked against the strings and only a hash collision falls back to them.
+    ids = answers['question_id']
+    halves = np.ascontiguousarray(ids).view([('low', '<u8'), ('high', '<u8')])
+    keys = halves['low'] ^ (halves['high'] * np.uint64(0x9E3779B97F4A7C15))
+    unique_keys, codes = np.unique(keys, return_inverse=True)
+    codes = codes.reshape(-1)
+    # Any occurrence works as the representative; a scatter is cheaper than return_index's stable sort.
+    representative = np.empty(len(unique_keys), dtype=np.int64)
+    representative[codes] = np.arange(len(codes))
+    question_ids = ids[representative]
+    if not np.array_equal(question_ids[codes], ids):
+        question_ids, codes = np.unique(ids, return_inverse=True)
+        codes = codes.reshape(-1)
+    return [question_id.decode('ascii') for question_id in question_ids], codes
+
+
+def item_difficulty(answers):
+    # Classical p-value: the share of correct answers per question (low = hard).
+    if not len(answers):
+        return []
+    question_ids, codes = _question_codes(answers)
+    attempts = np.bincount(codes, minlength=len(question_ids))
+    correct = np.bincount(codes, weights=answers['is_correct'], minlength=len(question_ids))
+    timed = answers['latency_ms'] >= 0
+    latency_sum = np.bincount(codes[timed], weights=answers['latency_ms'][timed], minlength=len(question_ids))
+    latency_count = np.bincount(codes[timed], minlength=len(question_ids))
+    p_values = correct / attempts
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_latency = np.where(latency_count > 0, latency_sum / latency_count, np.nan)
+
+    order = np.argsort(p_values, kind='stable')
+    return [{
+        'question_id': question_ids[index],
+        'attempts': int(attempts[index]),
+        'p_value': round(float(p_values[index]), 4),
+        'avg_latency_ms': None if np.isnan(avg_latency[index]) else round(float(avg_latency[index]), 1),
+    } for index in order]
+
+
+def discrimination_index(answers, sessions, group_fraction=0.27):
+    # Upper-lower discrimination D = p(top 27% of finished sessions) - p(bottom 27%), plus the
+    # point-biserial correlation between answering correctly and the session score.
+    finished = sessions[sessions['status'] == STATUS_CODES['finished']]
+    if not len(answers) or not len(finished):
+        return []
+
+    finished = finished[np.argsort(finished['id'], kind='stable')]
+    scores = finished['correct'] / np.maximum(finished['reached'], 1)
+    position = np.searchsorted(finished['id'], answers['session_id'])
+    position = np.minimum(position, len(finished) - 1)
+    in_finished = finished['id'][position] == answers['session_id']
+    answers = answers[in_finished]
+    answer_scores = scores[position[in_finished]]
+    if not len(answers):
+        return []
+
+    low_cut, high_cut = np.quantile(scores, [group_fraction, 1 - group_fraction])
+    question_ids, codes = _question_codes(answers)
+    count = len(question_ids)
+    is_correct = answers['is_correct'].astype(np.float64)
+
+    def rate(mask):
+        attempts = np.bincount(codes[mask], minlength=count)
+        correct = np.bincount(codes[mask], weights=is_correct[mask], minlength=count)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(attempts > 0, correct / attempts, np.nan), attempts
+
+    upper, upper_n = rate(answer_scores >= high_cut)
+    lower, lower_n = rate(answer_scores <= low_cut)
+
+    attempts = np.bincount(codes, minlength=count)
+    correct_n = np.bincount(codes, weights=is_correct, minlength=count)
+    score_sum = np.bincount(codes, weights=answer_scores, minlength=count)
+    score_sq = np.bincount(codes, weights=answer_scores ** 2, minlength=count)
+    correct_score_sum = np.bincount(codes, weights=answer_scores * is_correct, minlength=count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = correct_n / attempts
+        mean = score_sum / attempts
+        std = np.sqrt(np.maximum(score_sq / attempts - mean ** 2, 0))
+        mean_correct = correct_score_sum / correct_n
+        mean_wrong = (score_sum - correct_score_sum) / (attempts - correct_n)
+        point_biserial = (mean_correct - mean_wrong) / std * np.sqrt(p * (1 - p))
+
+    def number(value):
+        return None if np.isnan(value) else round(float(value), 4)
+
+    items = [{
+        'question_id': question_ids[index],
+        'attempts': int(attempts[index]),
+        'upper_n': int(upper_n[index]),
+        'lower_n': int(lower_n[index]),
+        'discrimination': number(upper[index] - lower[index]),
+        'point_biserial': number(point_biserial[index]),
+    } for index in range(count)]
+    # Weakest items first: those are the ones to review.
+    items.sort(key=lambda item: (item['discrimination'] is None, item['discrimination'] if item['discrimination'] is not None else 0))
+    return items
+
+
+def completion_funnel(sessions, steps=(1, 5, 10, 20), cohort_days=7):
+    # Sessions grouped by start date into cohorts; each stage counts sessions that reached it.
+    if not len(sessions):
+        return []
+    cohort_seconds = cohort_days * 86400
+    cohort_keys, cohort_codes = np.unique(sessions['started'] // cohort_seconds, return_inverse=True)
+    cohort_codes = cohort_codes.reshape(-1)
+    count = len(cohort_keys)
+
+    started = np.bincount(cohort_codes, minlength=count)
+    stages = {f"reached_{step}": np.bincount(cohort_codes[sessions['reached'] >= step], minlength=count) for step in steps}
+    finished = np.bincount(cohort_codes[sessions['status'] == STATUS_CODES['finished']], minlength=count)
+    # Distinct users per cohort from unique (cohort, user) pairs packed into one int64.
+    user_span = int(sessions['user_id'].max()) + 1
+    pairs = np.unique(cohort_codes.astype(np.int64) * user_span + sessions['user_id'])
+    users = np.bincount(pairs // user_span, minlength=count)
+
+    funnel = []
+    for code, key in enumerate(cohort_keys):
+        row = {
+            'cohort_start': time.strftime('%Y-%m-%d', time.gmtime(int(key) * cohort_seconds)),
+            'users': int(users[code]),
+            'started': int(started[code]),
+        }
+        row.update({name: int(values[code]) for name, values in stages.items()})
+        row['finished'] = int(finished[code])
+        row['completion_rate'] = round(float(finished[code] / started[code]), 4) if started[code] else 0.0
+        funnel.append(row)
+    return funnel
@@ -0,0 +1,317 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .db_connector import DatabaseConnector
+from .models import AnswerEvent
+from .stats_engine import apply_question_deltas, question_deltas
+
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+
+def insert_answer_events(session: Session, rows: list[dict], commit=True) -> int:
+    # A single executemany INSERT per batch, committed together with the question_stats deltas.
+    session.execute(insert(AnswerEvent), rows)
+    apply_question_deltas(session, question_deltas(rows))
+    if commit:
+        session.commit()
+    return len(rows)
+
+
+def _encode(row):
+    return json.dumps(dict(row, answered_at=row['answered_at'].isoformat()), ensure_ascii=False)
+
+
+def _decode(line):
+    row = json.loads(line)
+    row['answered_at'] = datetime.datetime.fromisoformat(row['answered_at'])
+    return row
+
+
+def _read_rows(path):
+    rows = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                rows.append(_decode(line))
+            except ValueError:
+                # The last line of a write-ahead segment can be cut off by the crash that left it behind.
+                logger.warning(f"Skipping an unreadable answer event line in {path}.")
+    return rows
+
+
+class AnswerEventRecorder:
+    def __init__(self, db_connector: DatabaseConnector, batch_size=500, flush_interval=2, max_buffer=10000,
+                 spill_file='cache/answer_events.spill.jsonl', on_written=None):
+        self.db = db_connector
+        self.on_written = on_written
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.spill_path = PROJECT_ROOT / spill_file if spill_file else None
+        # Every recorded event is appended here first, so the buffer survives a crash. Each flush seals the
+        # file into a segment that is deleted once its events are committed or spilled.
+        self.wal_path = self.spill_path.with_suffix('.wal') if self.spill_path else None
+        self._wal = None
+        self._wal_lines = 0
+        # A segment could not be released because spilling failed; its events are replayed with the spill file.
+        self._stranded = False
+        self._buffer = []
+        # Events that did not fit into the buffer while the database was behind; they go to the spill file.
+        self._overflow = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._closing = False
+        self.recorded = 0
+        self.written = 0
+        self.spilled = 0
+
+    @classmethod
+    def from_config(cls, db_connector: DatabaseConnector, on_written=None, worker_index=None):
+        cfg = (db_connector.config or {}).get('answer_events') or {}
+        spill_file = cfg.get('spill_file', 'cache/answer_events.spill.jsonl')
+        if spill_file and worker_index is not None:
+            # Cluster workers each own their spill file and write-ahead log; a starting worker replays only its own.
+            stem, dot, suffix = spill_file.rpartition('.')
+            spill_file = f"{stem}.w{worker_index}.{suffix}" if dot else f"{spill_file}.w{worker_index}"
+        return cls(
+            db_connector,
+            batch_size=cfg.get('batch_size', 500),
+            flush_interval=cfg.get('flush_interval', 2),
+            max_buffer=cfg.get('max_buffer', 10000),
+            spill_file=spill_file,
+            on_written=on_written,
+        )
+
+    @property
+    def pending(self):
+        return len(self._buffer) + len(self._overflow)
+
+    def record(self, user_id, session_id, question_id, question_index, chosen_option, is_correct, latency_ms=None):
+        # Called from the callback path: only an append, the database is never touched here.
+        row = {
+            'user_id': user_id,
+            'session_id': session_id,
+            'question_id': question_id,
+            'question_index': question_index,
+            'chosen_option': chosen_option,
+            'is_correct': is_correct,
+            'latency_ms': latency_ms,
+            'answered_at': datetime.datetime.now(),
+        }
+        self.recorded += 1
+        if self._wal is not None:
+            # One unbuffered append into the page cache: a process crash loses nothing, the disk is not waited on.
+            try:
+                self._wal.write(_encode(row) + '\n')
+                self._wal_lines += 1
+            except OSError as e:
+                logger.error(f"Error appending to the answer event log {self.wal_path}: {e}")
+        if len(self._buffer) >= self.max_buffer:
+            self._overflow.append(row)
+        else:
+            self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size or not self.flush_interval:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            # Taken together with no await in between: the segment holds exactly the events being flushed.
+            rows, self._buffer = self._buffer, []
+            overflow, self._overflow = self._overflow, []
+            segment = self._seal_wal()
+
+            written = 0
+            # How far the flush got: rows[:done] are committed or spilled, and so is overflow once it is spilled.
+            done = 0
+            overflow_spilled = False
+            try:
+                if overflow:
+                    await self.db.run_sync(self._spill, overflow)
+                    overflow_spilled = True
+                for start in range(0, len(rows), self.batch_size):
+                    batch = rows[start:start + self.batch_size]
+                    try:
+                        written += await self.db.run_in_session(insert_answer_events, batch)
+                        done = start + len(batch)
+                        self._written(batch)
+                    except Exception as e:
+                        logger.error(f"Error writing {len(rows) - start} answer events, spilling them to disk: {e}")
+                        await self.db.run_sync(self._spill, rows[start:])
+                        done = len(rows)
+                        break
+            except Exception:
+                if segment is not None:
+                    # The segment still holds the whole flush; cut it down to what is neither committed nor
+                    # spilled, or the replay would count the rest a second time.
+                    remaining = ([] if overflow_spilled else overflow) + rows[done:]
+                    await self.db.run_sync(self._rewrite_segment, segment, remaining)
+                    self._stranded = bool(remaining)
+                raise
+            finally:
+                self.written += written
+
+            if segment is not None:
+                await self.db.run_sync(self._release_segment, segment)
+            return written
+
+    async def replay_spill(self) -> int:
+        if not self.spill_path:
+            return 0
+        async with self._flush_lock:
+            rows = await self.db.run_sync(self._replay_spill)
+            self._written(rows)
+            return len(rows)
+
+    def _open_wal(self):
+        self.wal_path.parent.mkdir(parents=True, exist_ok=True)
+        self._wal = open(self.wal_path, 'a', encoding='utf-8', buffering=1)
+        self._wal_lines = 0
+
+    def _seal_wal(self):
+        if self._wal is None or not self._wal_lines:
+            return None
+        segment = self.wal_path.with_name(f"{self.wal_path.name}.{time.time_ns()}")
+        try:
+            self._wal.close()
+            os.replace(self.wal_path, segment)
+        except OSError as e:
+            logger.error(f"Error sealing the answer event log {self.wal_path}: {e}")
+            segment = None
+        try:
+            self._open_wal()
+        except OSError as e:
+            logger.error(f"Error reopening the answer event log {self.wal_path}, recording without it: {e}")
+            self._wal = None
+        return segment
+
+    def _release_segment(self, segment):
+        segment.unlink(missing_ok=True)
+
+    def _rewrite_segment(self, segment, rows):
+        if not rows:
+            self._release_segment(segment)
+            return
+        partial = segment.with_name(segment.name + '.partial')
+        try:
+            with open(partial, 'w', encoding='utf-8') as f:
+                f.write(''.join(_encode(row) + '\n' for row in rows))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(partial, segment)
+        except OSError as e:
+            # Better replayed twice than lost: the whole segment stays.
+            logger.error(f"Error rewriting the answer event log segment {segment}, it will be replayed in full: {e}")
+
+    def _wal_segments(self):
+        segments = [path for path in self.wal_path.parent.glob(f"{self.wal_path.name}.*") if path.suffix[1:].isdigit()]
+        return sorted(segments, key=lambda path: int(path.suffix[1:]))
+
+    def _written(self, rows):
+        if self.on_written and rows:
+            try:
+                self.on_written(rows)
+            except Exception as e:
+                logger.error(f"Error in answer event listener: {e}", exc_info=True)
+
+    def _spill(self, rows):
+        if not self.spill_path:
+            logger.error(f"No spill file configured, {len(rows)} answer events were lost.")
+            return
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.spill_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(_encode(row) + '\n' for row in rows))
+            f.flush()
+            os.fsync(f.fileno())
+        self.spilled += len(rows)
+
+    def _replay_spill(self):
+        # The spill file is renamed first, so events spilled while we replay land in a fresh file. Write-ahead
+        # segments are left by a crash (or a failed spill); the live log is never among them.
+        # Everything goes in one transaction: a failure leaves all files for the next attempt and nothing committed,
+        # so nothing is counted twice. A crash between the commit and the unlink still replays them again.
+        replay_path = self.spill_path.with_suffix(self.spill_path.suffix + '.replay')
+        if not replay_path.exists() and self.spill_path.exists():
+            os.replace(self.spill_path, replay_path)
+        sources = [replay_path] if replay_path.exists() else []
+        if self.wal_path is not None:
+            sources.extend(self._wal_segments())
+        if not sources:
+            return []
+
+        rows = [row for path in sources for row in _read_rows(path)]
+        if rows:
+            session = self.db.get_session()
+            if session is None:
+                return []
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    insert_answer_events(session, rows[start:start + self.batch_size], commit=False)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Error replaying {len(rows)} answer events, keeping the files for the next attempt: {e}")
+                return []
+            finally:
+                session.close()
+
+        for path in sources:
+            path.unlink()
+        self._stranded = False
+        logger.info(f"Replayed {len(rows)} answer events from {len(sources)} spill and log files.")
+        return rows
+
+    async def start(self):
+        if self.wal_path is not None and self._wal is None:
+            # What the previous run had buffered when it stopped is in its log; seal it for the replay below.
+            if self.wal_path.exists():
+                os.replace(self.wal_path, self.wal_path.with_name(f"{self.wal_path.name}.{time.time_ns()}"))
+            self._open_wal()
+        await self.replay_spill()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        # No cancel(): a flush interrupted after taking the buffer would drop those events.
+        self._closing = True
+        self._wakeup.set()
+        if self._flush_task:
+            await self._flush_task
+            self._flush_task = None
+        written = await self.flush()
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+            if not self._wal_lines:
+                self.wal_path.unlink(missing_ok=True)
+        logger.info(f"Answer event recorder stopped, {written} buffered events written, {self.spilled} spilled in total.")
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval or None)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closing:
+                return
+            try:
+                if self._buffer or self._overflow:
+                    await self.flush()
+                if (self.spilled and self.spill_path.exists()) or self._stranded:
+                    await self.replay_spill()
+            except Exception as e:
+                logger.error(f"Error flushing answer events: {e}", exc_info=True)
@@ -1,13 +1,32 @@
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler
+from telegram import Update
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, TypeHandler
+import asyncio
 import logging
+import signal
+import ssl
 import yaml
 from pathlib import Path
 from dotenv import load_dotenv
 import os
 
-from .message_handler import start_command, stop_command, command_c, handle_answer_callback, HandlerDependencies
+from .message_handler import start_command, stop_command, command_c, stats_command, profile_command, handle_answer_callback, HandlerDependencies
 from .db_connector import DatabaseConnector
+from .migrations import Migrator, current_version, head_version
 from .localization import Localization
+from .session_cache import ActiveSessionCache
+from .answer_events import AnswerEventRecorder
+from .results_sink import ResultsSink
+from .stats_engine import StatsEngine
+from .send_queue import SendScheduler
+from .callback_dedup import CallbackDeduplicator
+from .question_reloader import QuestionReloader
+from .metrics import MetricsRegistry, MetricsServer
+from .profiling import Profiler
+from .traffic_recorder import TrafficRecorder
+from .webhook_server import WebhookServer
+from .sharding import ClusterSupervisor
+from .update_processor import UserOrderedUpdateProcessor
+from .reply_markup_formatter import warm_render_cache
 from lib.quiz_lib.question_data import QuestionData
 from lib.quiz_lib.quiz import QuizSingleton
 
@@ -16,8 +35,11 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 class BotEngine:
-    def __init__(self, config_paths):
+    def __init__(self, config_paths, request=None, worker_index=None):
         self.config_paths = config_paths
+        self.request = request
+        self.worker_index = worker_index
+        self.webhook_server = None
 
         self._load_config()
         self._setup_dependencies()
@@ -31,6 +53,7 @@ class BotEngine:
             secrets_path = project_root / self.config_paths.get('secrets', 'config/secrets.yml')
             secrets_data = self._load_secrets_from_path(secrets_path)
             self.token = secrets_data.get('telegram_bot_token')
+            self.webhook_secret = secrets_data.get('webhook_secret_token')
 
 
             if not self.token:
@@ -41,6 +64,37 @@ class BotEngine:
              logger.critical(f"Failed to load bot token: {e}", exc_info=True)
              raise
 
+        self.bot_config = self._load_bot_config(self.config_paths.get('bot', 'config/bot.yml'))
+        self.mode = self.bot_config.get('mode', 'polling')
+        self.poll_interval = self.bot_config.get('poll_interval', 3)
+        if self.bot_config.get('question_flow', 'send') not in ('send', 'edit'):
+            raise ValueError(f"Unknown question_flow '{self.bot_config['question_flow']}', expected 'send' or 'edit'.")
+        if self.mode not in ('polling', 'webhook', 'cluster'):
+            raise ValueError(f"Unknown bot mode '{self.mode}', expected 'polling', 'webhook' or 'cluster'.")
+
+        if self.worker_index is not None:
+            # A cluster worker is a private webhook listener behind the shard router.
+            cluster_cfg = self.bot_config.get('cluster') or {}
+            webhook_cfg = dict(self.bot_config.get('webhook') or {})
+            webhook_cfg.update(listen='127.0.0.1', port=cluster_cfg.get('base_port', 9001) + self.worker_index,
+                               public_url=None, cert=None, key=None)
+            self.bot_config = dict(self.bot_config, webhook=webhook_cfg)
+            self.mode = 'webhook'
+
+
+    def _load_bot_config(self, bot_config_path):
+        try:
+            project_root = Path(__file__).parent.parent.parent
+            filepath = project_root / bot_config_path
+            if not filepath.exists():
+                logger.warning(f"Bot config not found at {filepath}, using polling defaults.")
+                return {}
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return yaml.safe_load(f) or {}
+        except yaml.YAMLError as e:
+            logger.error(f"Error parsing bot config: {e}")
+            return {}
+
 
     def _load_secrets_from_path(self, secrets_path):
          try:
@@ -53,7 +107,8 @@ class BotEngine:
                   load_dotenv(dotenv_path=filepath.parent / ".env")
                   return {
                       'db_password': os.getenv("DB_PASSWORD"),
-                      'telegram_bot_token': os.getenv("TELEGRAM_BOT_TOKEN")
+                      'telegram_bot_token': os.getenv("TELEGRAM_BOT_TOKEN"),
+                      'webhook_secret_token': os.getenv("WEBHOOK_SECRET_TOKEN")
                   }
              else:
                  return {}
@@ -71,7 +126,18 @@ class BotEngine:
         secrets_config_path = self.config_paths.get('secrets', 'config/secrets.yml')
         self.db_connector = DatabaseConnector(config_path=db_config_path, secrets_path=secrets_config_path)
 
-        self.db_connector.create_tables()
+        self._check_schema()
+        metrics_cfg = self.bot_config.get('metrics') or {}
+        self.metrics = MetricsRegistry() if metrics_cfg.get('enabled', False) else None
+        self.metrics_server = None
+        self.db_connector.metrics = self.metrics
+        self.session_cache = ActiveSessionCache.from_config(self.db_connector)
+        self.stats = StatsEngine.from_config(self.db_connector, self.bot_config)
+        self.answer_events = AnswerEventRecorder.from_config(self.db_connector, on_written=self.stats.apply_answers,
+                                                         worker_index=self.worker_index)
+        self.results_sink = ResultsSink.from_config(self.bot_config, self.worker_index)
+        self.sender = SendScheduler.from_config(self.bot_config, self.worker_index)
+        self.traffic_recorder = TrafficRecorder.from_config(self.bot_config, self.worker_index)
 
         locales_config_path = self.config_paths.get('locales', 'config/locales.yml')
         self.localization = Localization(locales_path=locales_config_path)
@@ -80,7 +146,48 @@ class BotEngine:
         if not self.question_data.collection:
              logger.critical("No questions loaded. Quiz will not function.")
              raise SystemExit("No questions loaded.")
+        warm_render_cache(self.question_data)
+
+        if self.bot_config.get('dump_questions', False):
+            self._dump_questions()
+
+
+        self.handler_deps = HandlerDependencies(
+             db_connector=self.db_connector,
+             question_data=self.question_data,
+             localization=self.localization,
+             session_cache=self.session_cache,
+             answer_events=self.answer_events,
+             results_sink=self.results_sink,
+             stats=self.stats,
+             sender=self.sender,
+             edit_in_place=self.bot_config.get('question_flow', 'send') == 'edit',
+             callbacks=CallbackDeduplicator.from_config(self.bot_config),
+             metrics=self.metrics,
+             profiler=Profiler.from_config(self.bot_config)
+        )
+        self.question_reloader = QuestionReloader.from_config(self.handler_deps, self.bot_config)
+
+
+    def _check_schema(self):
+        if not self.db_connector.engine:
+            logger.critical("Database engine not initialized, cannot check the schema version.")
+            raise SystemExit("Database is not available.")
 
+        required = head_version()
+        current = current_version(self.db_connector.engine)
+        if current < required and self.db_connector.config.get('auto_migrate', False):
+            Migrator(self.db_connector, out=logger.info).upgrade()
+            current = current_version(self.db_connector.engine)
+
+        if current < required:
+            logger.critical(f"Database schema is at version {current}, this build needs {required}. Run: python db/migrate/migrate.py up")
+            raise SystemExit("Database schema is out of date.")
+        if current > required:
+            logger.warning(f"Database schema version {current} is newer than this build ({required}).")
+
+
+    def _dump_questions(self):
         quiz_singleton = QuizSingleton()
 
         log_dir_path = Path(quiz_singleton.get_project_path(quiz_singleton.log_dir))
@@ -101,31 +208,140 @@ class BotEngine:
             logger.error(f"Failed to save questions data to YAML: {e}", exc_info=True)
 
 
-        self.handler_deps = HandlerDependencies(
-             db_connector=self.db_connector,
-             question_data=self.question_data,
-             localization=self.localization
-        )
-
-
     def _setup_application(self):
        if not self.token:
             raise ValueError("Bot token is not available.")
-       self.application = Application.builder().token(self.token).build()
+       builder = Application.builder().token(self.token).post_init(self._post_init).post_stop(self._post_stop).post_shutdown(self._post_shutdown)
+       concurrent_updates = self.bot_config.get('concurrent_updates', 1)
+       if concurrent_updates > 1:
+            self.update_processor = UserOrderedUpdateProcessor(
+                concurrent_updates,
+                max_pending_updates=self.bot_config.get('max_pending_updates', 4096),
+            )
+            builder = builder.concurrent_updates(self.update_processor)
+            if self.traffic_recorder:
+                self.update_processor.on_admit = self.traffic_recorder.record
+       else:
+            self.update_processor = None
+       if self.request:
+            builder = builder.request(self.request).get_updates_request(self.request)
+       self.application = builder.build()
        logger.info("Telegram bot application built.")
 
 
+    async def _post_init(self, application):
+        await self.stats.start()
+        await self.session_cache.start()
+        await self.answer_events.start()
+        self.results_sink.start()
+        if self.traffic_recorder:
+            self.traffic_recorder.start()
+        if self.sender:
+            self.sender.start(application.bot)
+        if self.question_reloader:
+            await self.question_reloader.start()
+        if self.metrics is not None:
+            self._register_metrics()
+            self.metrics.count_log_errors()
+            self.metrics_server = MetricsServer.from_config(self.metrics, self.bot_config, self.worker_index)
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.error(f"Could not start the metrics endpoint: {e}")
+                self.metrics_server = None
+
+
+    async def _post_stop(self, application):
+        if self.handler_deps.profiler is not None:
+            await self.handler_deps.profiler.stop()
+        if self.question_reloader:
+            await self.question_reloader.stop()
+        # Before shutdown: the bot's HTTP client is still open for the queued messages.
+        if self.sender:
+            await self.sender.stop()
+
+
+    async def _post_shutdown(self, application):
+        await self.answer_events.stop()
+        await self.results_sink.stop()
+        if self.traffic_recorder:
+            await self.traffic_recorder.stop()
+        await self.stats.stop()
+        await self.session_cache.stop()
+        self.db_connector.shutdown()
+        logger.info("Database connector shut down.")
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        if self.metrics is not None:
+            self.metrics.close()
+
+
+    def _register_metrics(self):
+        # Read at scrape time from the counters the components already keep; nothing here runs per update.
+        metrics = self.metrics
+        deps = self.handler_deps
+        metrics.add_gauge('active_sessions', "Active quiz sessions held in the session cache.", lambda: len(self.session_cache))
+        metrics.add_gauge('dirty_sessions', "Cached sessions waiting for the write-behind flush.", lambda: self.session_cache.dirty_count)
+        metrics.add_gauge('questions_loaded', "Questions in the bank currently served.", lambda: len(deps.quiz_data.collection))
+        if self.question_reloader:
+            metrics.add_counter('question_reloads_total', "Question bank snapshots swapped in.", lambda: self.question_reloader.reloads)
+        if self.update_processor:
+            processor = self.update_processor
+            metrics.add_gauge('updates_waiting', "Updates admitted but waiting for their user or a worker.", lambda: processor.waiting)
+            metrics.add_gauge('updates_running', "Updates being handled.", lambda: processor.running)
+            metrics.add_counter('updates_processed_total', "Updates handled.", lambda: processor.processed)
+            metrics.add_counter('update_wait_seconds_total', "Time updates spent waiting to run.", lambda: processor.wait_total)
+        if self.sender:
+            send_metrics = self.sender.metrics
+            metrics.add_gauge('send_queue_pending', "Outbound messages queued.", lambda: self.sender.pending)
+            for name in ('enqueued', 'sent', 'coalesced', 'retried', 'failed', 'backpressure_waits'):
+                metrics.add_counter(f'send_queue_{name}_total', f"Send scheduler messages {name.replace('_', ' ')}.",
+                                    lambda name=name: getattr(send_metrics, name))
+            metrics.add_histogram('send_queue_wait_seconds', "Time outbound messages spent queued.", lambda: send_metrics.queue_latency)
+            metrics.add_histogram('send_duration_seconds', "Bot API call time for scheduled messages.", lambda: send_metrics.send_latency)
+        if deps.callbacks is not None:
+            metrics.add_counter('callback_duplicates_total', "Callback updates rejected as duplicates.", lambda: deps.callbacks.duplicates)
+        metrics.add_counter('answer_events_recorded_total', "Answers recorded.", lambda: self.answer_events.recorded)
+        metrics.add_counter('answer_events_written_total', "Answer events committed.", lambda: self.answer_events.written)
+        metrics.add_counter('answer_events_spilled_total', "Answer events spilled to disk.", lambda: self.answer_events.spilled)
+        metrics.add_gauge('answer_events_pending', "Answer events buffered.", lambda: self.answer_events.pending)
+        if self.traffic_recorder:
+            metrics.add_counter('traffic_recorded_total', "Updates captured by the traffic recorder.", lambda: self.traffic_recorder.recorded)
+        metrics.add_counter('results_written_total', "Quiz results written to the results sink.", lambda: self.results_sink.written)
+        metrics.add_counter('results_failed_total', "Quiz results the results sink could not write.", lambda: self.results_sink.failed)
+        metrics.add_counter('webhook_updates_total', "Updates accepted by the webhook listener.",
+                            lambda: self.webhook_server.received if self.webhook_server else None)
+        metrics.add_counter('webhook_rejected_total', "Webhook requests rejected.",
+                            lambda: self.webhook_server.rejected if self.webhook_server else None)
+
+
+    def _bind(self, handler):
+        # Every update gets its own view of the dependencies, fixed to the question bank it started with.
+        bound = lambda update, context: handler(update, context, self.handler_deps.for_update())
+        if self.metrics is not None:
+            return self.metrics.instrument(handler.__name__, bound)
+        return bound
+
+
     def _register_handlers(self):
         if not self.application or not self.handler_deps:
              logger.error("Cannot register handlers, application or dependencies missing.")
              return
 
-        self.application.add_handler(CommandHandler("start", lambda update, context: start_command(update, context, self.handler_deps)))
-        self.application.add_handler(CommandHandler("stop", lambda update, context: stop_command(update, context, self.handler_deps)))
-        self.application.add_handler(CommandHandler("c", lambda update, context: command_c(update, context, self.handler_deps)))
+        if self.traffic_recorder and not self.update_processor:
+            # Without the ordered processor there is no admission point; a group that runs first sees every update.
+            self.application.add_handler(TypeHandler(Update, self.traffic_recorder.on_update), group=-1)
+
+        self.application.add_handler(CommandHandler("start", self._bind(start_command)))
+        self.application.add_handler(CommandHandler("stop", self._bind(stop_command)))
+        self.application.add_handler(CommandHandler("c", self._bind(command_c)))
+        self.application.add_handler(CommandHandler("stats", self._bind(stats_command)))
+        if self.handler_deps.profiler is not None:
+            # Not registered at all unless profiling is enabled: /profile is then just an unknown command.
+            self.application.add_handler(CommandHandler("profile", self._bind(profile_command)))
 
 
-        self.application.add_handler(CallbackQueryHandler(lambda update, context: handle_answer_callback(update, context, self.handler_deps)))
+        self.application.add_handler(CallbackQueryHandler(self._bind(handle_answer_callback)))
 
         logger.info("Bot handlers registered.")
 
@@ -135,6 +351,88 @@ class BotEngine:
              logger.critical("Bot application not initialized. Cannot start polling.")
              return
 
+        if self.mode == 'cluster':
+            logger.info("Starting bot in cluster mode...")
+            # The parent only routes; workers own their Application, DB connector and session cache.
+            self.db_connector.shutdown()
+            supervisor = ClusterSupervisor(self.config_paths, self.bot_config, self.token, self.webhook_secret)
+            supervisor.run()
+            logger.info("Bot cluster stopped.")
+            return
+
+        if self.mode == 'webhook':
+            logger.info("Starting bot in webhook mode...")
+            asyncio.run(self.serve_webhook())
+            logger.info("Bot webhook mode stopped.")
+            return
+
         logger.info("Starting bot polling...")
-        self.application.run_polling(poll_interval=3)
-        logger.info("Bot polling stopped.")
\ No newline at end of file
+        self.application.run_polling(poll_interval=self.poll_interval)
+        logger.info("Bot polling stopped.")
+
+
+    async def serve_webhook(self):
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                pass
+
+        await self.start_webhook()
+        try:
+            await stop_event.wait()
+        finally:
+            await self.stop_webhook()
+
+
+    async def start_webhook(self):
+        webhook_cfg = self.bot_config.get('webhook') or {}
+
+        ssl_context = None
+        if webhook_cfg.get('cert') and webhook_cfg.get('key'):
+            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_context.load_cert_chain(webhook_cfg['cert'], webhook_cfg['key'])
+
+        if not self.webhook_secret:
+            logger.warning("No webhook_secret_token configured; webhook requests will not be authenticated.")
+
+        self.webhook_server = WebhookServer(
+            self.application,
+            listen=webhook_cfg.get('listen', '127.0.0.1'),
+            port=webhook_cfg.get('port', 8443),
+            url_path=webhook_cfg.get('url_path', 'telegram'),
+            secret_token=self.webhook_secret,
+            max_body_size=webhook_cfg.get('max_body_size', 1048576),
+            ssl_context=ssl_context,
+        )
+
+        await self.application.initialize()
+        if self.application.post_init:
+            await self.application.post_init(self.application)
+
+        public_url = webhook_cfg.get('public_url')
+        if public_url:
+            await self.application.bot.set_webhook(
+                url=public_url,
+                secret_token=self.webhook_secret,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=webhook_cfg.get('max_connections', 40),
+            )
+            logger.info(f"Webhook registered with Telegram at {public_url}")
+
+        await self.application.start()
+        await self.webhook_server.start()
+
+
+    async def stop_webhook(self):
+        if self.webhook_server:
+            await self.webhook_server.stop()
+        if self.application.running:
+            await self.application.stop()
+        if self.application.post_stop:
+            await self.application.post_stop(self.application)
+        await self.application.shutdown()
+        if self.application.post_shutdown:
+            await self.application.post_shutdown(self.application)
\ No newline at end of file
@@ -0,0 +1,61 @@
+import collections
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackDeduplicator:
+    # Recently handled callbacks, checked before any session or database access. Two keys per callback:
+    # the query id catches Telegram delivering the same update again, the (chat, message, data) key catches
+    # a second tap on the same button, which arrives as a new query.
+    def __init__(self, max_size=50000, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        # Insertion order is time order (entries are never refreshed), so expiry only looks at the front.
+        self._seen = collections.OrderedDict()
+        self.duplicates = 0
+
+    @classmethod
+    def from_config(cls, bot_config: dict):
+        cfg = bot_config.get('callback_dedup') or {}
+        if not cfg.get('enabled', True):
+            return None
+        return cls(max_size=cfg.get('max_size', 50000), ttl=cfg.get('ttl', 600))
+
+    @property
+    def size(self):
+        return len(self._seen)
+
+    def keys_for(self, query, chat_id):
+        keys = [('query', query.id)]
+        message_id = getattr(getattr(query, 'message', None), 'message_id', None)
+        if message_id is not None:
+            keys.append(('button', chat_id, message_id, query.data))
+        return keys
+
+    def check(self, keys) -> bool:
+        # True for a callback seen for the first time; it is remembered from here on.
+        now = time.monotonic()
+        self._expire(now)
+        if any(key in self._seen for key in keys):
+            self.duplicates += 1
+            return False
+        for key in keys:
+            self._seen[key] = now
+        while len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+        return True
+
+    def forget(self, keys):
+        # The callback failed before it took effect; a retry of the same tap must go through.
+        for key in keys:
+            self._seen.pop(key, None)
+
+    def _expire(self, now):
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.ttl:
+                return
+            self._seen.popitem(last=False)
@@ -1,20 +1,47 @@
 import yaml
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import QueuePool, NullPool, StaticPool
 from sqlalchemy.orm import sessionmaker, Session
-from .models import Base
 import os
 from dotenv import load_dotenv
 
 
+SQLITE_PROFILE_DEFAULTS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+    'pool_class': 'queue',
+}
+
+SQLITE_POOL_CLASSES = {
+    'queue': QueuePool,
+    'null': NullPool,
+    'static': StaticPool,
+}
+
+
+class DatabaseUnavailableError(Exception):
+    pass
+
+
 class DatabaseConnector:
     def __init__(self, config_path="config/database.yml", secrets_path="config/secrets.yml"):
         self.engine = None
         self.SessionLocal = None
+        self.executor = None
+        self.metrics = None
         self.config = self._load_config(config_path)
         self.secrets = self._load_secrets(secrets_path)
         self._setup_engine()
         self._setup_session()
+        self._setup_executor()
 
     def _load_config(self, config_path):
         try:
@@ -89,7 +116,7 @@ class DatabaseConnector:
         elif adapter == 'sqlite3':
             project_root = Path(__file__).parent.parent.parent
             abs_database_path = project_root / database_path
-            db_url = f"sqlite:///{abs_database_path}"
+            db_url = "sqlite://" if database_path == ':memory:' else f"sqlite:///{abs_database_path}"
 
 
         engine_args = {}
@@ -106,17 +133,18 @@ class DatabaseConnector:
             }
 
         elif adapter == 'sqlite3':
-            engine_args = {
-                 'pool_size': pool_size
-            }
+            engine_args = self._sqlite_engine_args(database_path, pool_size, timeout_ms)
 
-            db_directory = Path(abs_database_path).parent
-            db_directory.mkdir(parents=True, exist_ok=True)
+            if database_path != ':memory:':
+                db_directory = Path(abs_database_path).parent
+                db_directory.mkdir(parents=True, exist_ok=True)
 
 
         if db_url:
             try:
                 self.engine = create_engine(db_url, **engine_args)
+                if adapter == 'sqlite3':
+                    event.listen(self.engine, "connect", self._apply_sqlite_pragmas)
 
                 if adapter != 'sqlite3':
                      with self.engine.connect() as connection:
@@ -130,13 +158,95 @@ class DatabaseConnector:
                 print(f"Error connecting to database: {e}")
                 self.engine = None
 
+    def _sqlite_profile(self):
+        profile = dict(SQLITE_PROFILE_DEFAULTS)
+        profile.update(self.config.get('sqlite') or {})
+        profile.setdefault('busy_timeout', self.config.get('timeout', 5000))
+        return profile
+
+    def _sqlite_engine_args(self, database_path, pool_size, timeout_ms):
+        profile = self._sqlite_profile()
+        pool_name = 'static' if database_path == ':memory:' else profile['pool_class']
+        pool_class = SQLITE_POOL_CLASSES.get(pool_name)
+        if pool_class is None:
+            print(f"Warning: unknown SQLite pool_class '{pool_name}', using queue.")
+            pool_class = QueuePool
+
+        # Connections move between the executor threads, each used by one thread at a time.
+        engine_args = {
+            'poolclass': pool_class,
+            'connect_args': {'check_same_thread': False, 'timeout': profile.get('busy_timeout', timeout_ms) / 1000},
+        }
+        if pool_class is QueuePool:
+            # Every executor thread can hold a connection, the overflow covers startup and migrations.
+            engine_args['pool_size'] = max(pool_size, self.config.get('async_workers', 4) or 1)
+            engine_args['max_overflow'] = profile.get('max_overflow', 2)
+            engine_args['pool_timeout'] = timeout_ms / 1000
+        return engine_args
+
+    def _apply_sqlite_pragmas(self, dbapi_connection, connection_record):
+        profile = self._sqlite_profile()
+        cursor = dbapi_connection.cursor()
+        try:
+            # busy_timeout first, so switching the journal mode waits for other connections as well.
+            for pragma in ('busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store'):
+                value = profile.get(pragma)
+                if value is not None:
+                    cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            cursor.close()
+
     def _setup_session(self):
         if self.engine:
-            self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+            # expire_on_commit=False: handlers read attributes after commit() on the event loop,
+            # an expired instance would silently reload itself there with a blocking SELECT.
+            self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=self.engine)
         else:
             self.SessionLocal = None
             print("Cannot setup database session, engine not initialized.")
 
+    def _setup_executor(self):
+        workers = self.config.get('async_workers', 4) if self.config else 0
+        if self.engine and workers and workers > 0:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+        else:
+            self.executor = None
+
+    async def run_sync(self, func, *args, **kwargs):
+        return await self._execute(getattr(func, '__name__', 'call'), functools.partial(func, *args, **kwargs))
+
+    async def run_in_session(self, func, *args):
+        return await self._execute(func.__name__, functools.partial(self._run_in_session, func, *args))
+
+    async def _execute(self, operation, call):
+        # Timed on the event loop side: what a handler waits for, executor queueing included.
+        started = time.perf_counter()
+        failed = False
+        try:
+            if self.executor is None:
+                return call()
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe_db(operation, time.perf_counter() - started, failed)
+
+    def _run_in_session(self, func, *args):
+        # One unit of work per call: the pooled connection is returned before control goes back to
+        # the event loop, so handlers suspended on Telegram I/O never hold on to it.
+        session = self.get_session()
+        if session is None:
+            raise DatabaseUnavailableError("Database session is not available.")
+        try:
+            return func(session, *args)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
 
     def get_session(self) -> Session | None:
         if self.SessionLocal:
@@ -150,12 +260,9 @@ class DatabaseConnector:
             return None
 
 
-    def create_tables(self):
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
         if self.engine:
-            try:
-                Base.metadata.create_all(bind=self.engine)
-                print("Database tables created (if they didn't exist).")
-            except Exception as e:
-                print(f"Error creating database tables: {e}")
-        else:
-            print("Cannot create tables, database engine not initialized.")
+            self.engine.dispose()
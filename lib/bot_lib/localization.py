@@ -1,18 +1,70 @@
+import logging
+import string
 import yaml
 from pathlib import Path
 
+
+logger = logging.getLogger(__name__)
+
+# Every key the handlers send; the default language must define all of them.
+MESSAGE_KEYS = (
+    'greeting_message', 'farewell_message', 'quiz_already_active', 'no_active_quiz', 'no_active_quiz_callback',
+    'invalid_question_number', 'c_command_usage', 'invalid_number_format', 'answer_correct', 'answer_incorrect',
+    'quiz_finished_report', 'invalid_question_index_error', 'new_quiz_at_q', 'jump_to_q', 'quiz_already_finished',
+    'database_error', 'internal_error', 'unexpected_action', 'invalid_answer_option', 'send_question_error',
+    'stats_empty', 'stats_summary', 'stats_distribution', 'stats_leaderboard_title', 'stats_leaderboard_line',
+    'stats_your_rank', 'stats_hardest_title', 'stats_hardest_line', 'question_outdated',
+)
+
+
+def normalize_tag(language_code):
+    return language_code.replace('_', '-').lower() if language_code else ''
+
+
+class MessageTemplate:
+    # Parsed once when the catalog is built. Messages without fields are stored finished; templates with plain
+    # {name} fields become %-patterns, which CPython fills faster than str.format; the rest keep format_map.
+    # Either way render is a bound C method taking the keyword dict.
+    __slots__ = ('text', 'fields', 'constant', 'render')
+
+    def __init__(self, text):
+        self.text = text
+        pattern = []
+        literals = []
+        fields = set()
+        simple = True
+        for literal, name, spec, conversion in string.Formatter().parse(text):
+            literals.append(literal)
+            pattern.append(literal.replace('%', '%%'))
+            if name is None:
+                continue
+            fields.add(name.split('.')[0].split('[')[0])
+            if spec or conversion or not name.isidentifier():
+                simple = False
+            pattern.append(f"%({name})s")
+        self.fields = frozenset(fields)
+        self.constant = ''.join(literals) if not fields else None
+        self.render = ''.join(pattern).__mod__ if simple else text.format_map
+
+
 class Localization:
-    def __init__(self, locales_path="config/locales.yml"):
+    # Negotiated tags are memoized; the cap keeps arbitrary client language codes from growing the table forever.
+    MAX_NEGOTIATED = 1024
+
+    def __init__(self, locales_path="config/locales.yml", default_lang='en'):
         self.messages = {}
+        self.default_lang = default_lang
+        self._catalogs = {}
+        self._negotiated = {}
         self._load_locales(locales_path)
-        self.default_lang = 'en'
+        self._compile()
 
     def _load_locales(self, locales_path):
         try:
             project_root = Path(__file__).parent.parent.parent
             filepath = project_root / locales_path
             with open(filepath, 'r', encoding='utf-8') as f:
-                self.messages = yaml.safe_load(f)
+                self.messages = yaml.safe_load(f) or {}
         except FileNotFoundError:
             print(f"Error: Locales file not found at {filepath}")
             self.messages = {}
@@ -20,6 +72,68 @@ class Localization:
             print(f"Error parsing locales file: {e}")
             self.messages = {}
 
+    def _compile(self):
+        # One flat dict per language with the default language's templates filled in for missing keys,
+        # so a lookup at send time is two dict gets and nothing is validated per message.
+        parsed = {}
+        for lang, messages in self.messages.items():
+            templates = {}
+            for key, text in (messages or {}).items():
+                try:
+                    templates[key] = MessageTemplate(str(text))
+                except ValueError as e:
+                    logger.error(f"Locale '{lang}': message '{key}' is not a valid template ({e}), ignoring it.")
+            parsed[normalize_tag(lang)] = templates
+
+        self.default_lang = normalize_tag(self.default_lang)
+        default = parsed.setdefault(self.default_lang, {})
+        for key in MESSAGE_KEYS:
+            if key not in default:
+                logger.error(f"Locale '{self.default_lang}' has no message '{key}'.")
+                default[key] = MessageTemplate(f"_[{key}]_")
+
+        for lang, templates in parsed.items():
+            if lang == self.default_lang:
+                self._catalogs[lang] = templates
+                continue
+            missing = [key for key in default if key not in templates]
+            if missing:
+                logger.warning(f"Locale '{lang}' falls back to '{self.default_lang}' for: {', '.join(missing)}")
+            for key, template in templates.items():
+                if key in default and template.fields != default[key].fields:
+                    logger.warning(f"Locale '{lang}': message '{key}' uses {sorted(template.fields)}, "
+                                   f"'{self.default_lang}' uses {sorted(default[key].fields)}.")
+            self._catalogs[lang] = dict(default, **templates)
+
+    def negotiate(self, language_code):
+        # 'pt-BR' -> 'pt-br', then 'pt', then the default language.
+        parts = normalize_tag(language_code).split('-')
+        for length in range(len(parts), 0, -1):
+            candidate = '-'.join(parts[:length])
+            if candidate in self._catalogs:
+                return candidate
+        return self.default_lang
+
+    def catalog_for(self, language_code):
+        catalog = self._negotiated.get(language_code)
+        if catalog is None:
+            catalog = self._catalogs[self.negotiate(language_code)]
+            if len(self._negotiated) < self.MAX_NEGOTIATED:
+                self._negotiated[language_code] = catalog
+        return catalog
+
     def get_message(self, key, lang='en'):
-        lang_messages = self.messages.get(lang, self.messages.get(self.default_lang, {}))
-        return lang_messages.get(key, f"_[{key}]_")
\ No newline at end of file
+        template = self.catalog_for(lang).get(key)
+        return template.text if template is not None else f"_[{key}]_"
+
+    def render(self, key, lang='en', **kwargs):
+        # The hot path of every handler: the memoized table hit is inlined rather than going through catalog_for.
+        catalog = self._negotiated.get(lang)
+        if catalog is None:
+            catalog = self.catalog_for(lang)
+        template = catalog.get(key)
+        if template is None:
+            return f"_[{key}]_"
+        if template.constant is not None:
+            return template.constant
+        return template.render(kwargs)
@@ -1,33 +1,142 @@
 from telegram import Update
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 import logging
+import copy
 import datetime
-from pathlib import Path
-import os
+import functools
+import random
+import time
 
-from .db_connector import DatabaseConnector
+from .db_connector import DatabaseConnector, DatabaseUnavailableError
 from .models import User, QuizSession
 from lib.quiz_lib.question_data import QuestionData
-from .reply_markup_formatter import format_answers_as_inline_keyboard
+from .reply_markup_formatter import render_question, parse_answer_callback, layout_tag
 from .localization import Localization
-from lib.quiz_lib.quiz import QuizSingleton
+from .session_cache import ActiveSessionCache, CachedQuizSession, find_active_session
+from .answer_events import AnswerEventRecorder
+from .results_sink import ResultsSink
+from .stats_engine import StatsEngine, QuizResult, record_result
+from .send_queue import SendScheduler, PRIORITY_INFO, PRIORITY_QUESTION, MAX_MESSAGE_LENGTH, can_resend_edit
+from .callback_dedup import CallbackDeduplicator
+from .metrics import MetricsRegistry
+from .profiling import Profiler, KINDS as PROFILE_KINDS
+from lib.quiz_lib.statistics import Statistics
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class HandlerDependencies:
-     def __init__(self, db_connector: DatabaseConnector, question_data: QuestionData, localization: Localization):
+     def __init__(self, db_connector: DatabaseConnector, question_data: QuestionData, localization: Localization, session_cache: ActiveSessionCache,
+                  answer_events: AnswerEventRecorder | None = None, results_sink: ResultsSink | None = None,
+                  stats: StatsEngine | None = None, sender: SendScheduler | None = None, edit_in_place: bool = False,
+                  callbacks: CallbackDeduplicator | None = None, metrics: MetricsRegistry | None = None,
+                  profiler: Profiler | None = None):
          self.db = db_connector
          self.quiz_data = question_data
          self.loc = localization
+         self.sessions = session_cache
+         self.answer_events = answer_events
+         self.results = results_sink
+         self.stats = stats
+         self.sender = sender
+         self.edit_in_place = edit_in_place
+         self.callbacks = callbacks
+         self.metrics = metrics
+         self.profiler = profiler
+
+     def for_update(self):
+         # A shallow copy pinned to the current question bank snapshot; a reload swaps deps.quiz_data on the
+         # shared object, never on the copy an update is already running with.
+         return copy.copy(self)
+
+
+# Runs on the DatabaseConnector executor. Existing active sessions are looked up through deps.sessions.
+
+def create_quiz_session(session: Session, user_id: int, username: str | None, question_index: int = 0, question_id: str | None = None) -> QuizSession:
+    user = session.query(User).filter_by(id=user_id).first()
+    if not user:
+        session.add(User(id=user_id, username=username))
+        session.commit()
+
+    new_session = QuizSession(user_id=user_id, current_question_index=question_index, correct_answers_count=0, status='active',
+                              current_question_id=question_id, answer_seed=random.getrandbits(31))
+    session.add(new_session)
+    try:
+        session.commit()
+    except IntegrityError:
+        # Another worker started a quiz for this user first; the unique active index kept only theirs.
+        session.rollback()
+        existing = find_active_session(session, user_id)
+        if existing is None:
+            raise
+        return existing
+    session.refresh(new_session)
+    return new_session
+
+
+async def timed_api_call(deps: HandlerDependencies, call):
+    # Direct Bot API calls only; the send scheduler times its own.
+    if deps.metrics is None:
+        return await call
+    started = time.perf_counter()
+    try:
+        return await call
+    except Exception:
+        deps.metrics.send_errors += 1
+        raise
+    finally:
+        deps.metrics.send_latency.observe(time.perf_counter() - started)
+
+
+async def send_message(context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies, chat_id: int, text: str, reply_markup=None,
+                       priority: int = PRIORITY_INFO, on_failed=None):
+    # With a scheduler the message is only queued: rate limits, 429 retries and coalescing happen there, and a
+    # send that finally fails is reported to on_failed instead of raising here.
+    if deps.sender is not None:
+        return await deps.sender.send_message(chat_id, text, reply_markup, priority, on_failed=on_failed)
+    return await timed_api_call(deps, context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup))
+
+
+async def edit_message(context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies, chat_id: int, message_id: int, text: str,
+                       reply_markup=None, priority: int = PRIORITY_QUESTION, on_failed=None):
+    if deps.sender is not None:
+        return await deps.sender.edit_message_text(chat_id, message_id, text, reply_markup, priority, on_failed=on_failed)
+    try:
+        return await timed_api_call(deps, context.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text,
+                                                                        reply_markup=reply_markup))
+    except BadRequest as e:
+        if not can_resend_edit(e):
+            raise
+        logger.warning(f"Could not edit message {message_id} in chat {chat_id}, sending a new one: {e}")
+        return await timed_api_call(deps, context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup))
+
+
+def resume_position(deps: HandlerDependencies, quiz_session: CachedQuizSession) -> bool:
+    # Re-anchor on the stored question id in case the bank was reordered since the session last moved.
+    question_index = deps.quiz_data.resolve_index(quiz_session.current_question_index, quiz_session.current_question_id)
+    if question_index == quiz_session.current_question_index:
+        return False
+    quiz_session.current_question_index = question_index
+    return True
+
+
+def answer_latency_ms(quiz_session: CachedQuizSession, query) -> int | None:
+    if quiz_session.asked_at:
+        return int((time.time() - quiz_session.asked_at) * 1000)
+    # Asked by another worker or before a restart: fall back to the question message timestamp.
+    message_date = getattr(getattr(query, 'message', None), 'date', None)
+    if message_date:
+        return int((datetime.datetime.now(datetime.timezone.utc) - message_date).total_seconds() * 1000)
+    return None
 
-def get_db_session(deps: HandlerDependencies) -> Session | None:
-    session = deps.db.get_session()
-    if not session:
-         logger.error("Failed to get DB session.")
-    return session
+
+def move_to_question(deps: HandlerDependencies, quiz_session: CachedQuizSession, question_index: int):
+    quiz_session.current_question_index = question_index
+    quiz_session.current_question_id = deps.quiz_data.question_id_at(question_index)
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies):
@@ -35,74 +144,54 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE, deps
     username = update.effective_user.username
     chat_id = update.effective_chat.id
 
-    session = get_db_session(deps)
-    if not session:
-         await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('database_error', lang=update.effective_user.language_code))
-         return
-
     try:
-        user = session.query(User).filter_by(id=user_id).first()
-        if not user:
-            user = User(id=user_id, username=username)
-            session.add(user)
-            session.commit()
-            session.refresh(user)
-
-
-        active_session = session.query(QuizSession).filter_by(user_id=user_id, status='active').first()
+        active_session = await deps.sessions.get(user_id)
 
         if active_session:
-             msg = deps.loc.get_message('quiz_already_active', lang=update.effective_user.language_code)
-             await context.bot.send_message(chat_id=chat_id, text=msg)
-             await send_question(update, context, deps, active_session.current_question_index)
+             if resume_position(deps, active_session):
+                 await deps.sessions.save(active_session)
+             msg = deps.loc.render('quiz_already_active', update.effective_user.language_code)
+             await send_message(context, deps, chat_id, msg)
+             await send_question(update, context, deps, active_session.current_question_index, active_session.answer_seed)
+             active_session.asked_at = time.time()
         else:
-            new_session = QuizSession(user_id=user_id, current_question_index=0, correct_answers_count=0, status='active')
-            session.add(new_session)
-            session.commit()
-            session.refresh(new_session)
+            new_session = deps.sessions.put(await deps.db.run_in_session(
+                create_quiz_session, user_id, username, 0, deps.quiz_data.question_id_at(0)))
 
-            msg = deps.loc.get_message('greeting_message', lang=update.effective_user.language_code)
-            await context.bot.send_message(chat_id=chat_id, text=msg)
-            await send_question(update, context, deps, new_session.current_question_index)
+            msg = deps.loc.render('greeting_message', update.effective_user.language_code)
+            await send_message(context, deps, chat_id, msg)
+            await send_question(update, context, deps, new_session.current_question_index, new_session.answer_seed)
+            new_session.asked_at = time.time()
 
+    except DatabaseUnavailableError:
+         await send_message(context, deps, chat_id, deps.loc.render('database_error', update.effective_user.language_code))
     except Exception as e:
          logger.error(f"Error in start_command for user {user_id}: {e}", exc_info=True)
-         await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('internal_error', lang=update.effective_user.language_code))
-         session.rollback()
-    finally:
-        session.close()
+         await send_message(context, deps, chat_id, deps.loc.render('internal_error', update.effective_user.language_code))
 
 
 async def stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
 
-    session = get_db_session(deps)
-    if not session:
-         await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('database_error', lang=update.effective_user.language_code))
-         return
-
     try:
-        active_session = session.query(QuizSession).filter_by(user_id=user_id, status='active').first()
+        active_session = await deps.sessions.get(user_id)
 
         if active_session:
-            active_session.status = 'cancelled'
-            active_session.end_time = datetime.datetime.now()
-            session.commit()
+            await deps.sessions.close(active_session, 'cancelled')
 
-            msg = deps.loc.get_message('farewell_message', lang=update.effective_user.language_code)
-            await context.bot.send_message(chat_id=chat_id, text=msg)
+            msg = deps.loc.render('farewell_message', update.effective_user.language_code)
+            await send_message(context, deps, chat_id, msg)
 
         else:
-            msg = deps.loc.get_message('no_active_quiz', lang=update.effective_user.language_code)
-            await context.bot.send_message(chat_id=chat_id, text=msg)
+            msg = deps.loc.render('no_active_quiz', update.effective_user.language_code)
+            await send_message(context, deps, chat_id, msg)
 
+    except DatabaseUnavailableError:
+         await send_message(context, deps, chat_id, deps.loc.render('database_error', update.effective_user.language_code))
     except Exception as e:
          logger.error(f"Error in stop_command for user {user_id}: {e}", exc_info=True)
-         await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('internal_error', lang=update.effective_user.language_code))
-         session.rollback()
-    finally:
-        session.close()
+         await send_message(context, deps, chat_id, deps.loc.render('internal_error', update.effective_user.language_code))
 
 
 async def command_c(update: Update, context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies):
@@ -111,158 +200,260 @@ async def command_c(update: Update, context: ContextTypes.DEFAULT_TYPE, deps: Ha
     args = context.args
 
     if not args or len(args) != 1:
-        msg = deps.loc.get_message('c_command_usage', lang=update.effective_user.language_code)
-        await context.bot.send_message(chat_id=chat_id, text=msg)
+        msg = deps.loc.render('c_command_usage', update.effective_user.language_code)
+        await send_message(context, deps, chat_id, msg)
         return
 
     try:
         question_index = int(args[0]) - 1
         total_questions = len(deps.quiz_data.collection)
         if question_index < 0 or question_index >= total_questions:
-            msg_template = deps.loc.get_message('invalid_question_number', lang=update.effective_user.language_code)
-            msg = msg_template.format(count=total_questions)
-            await context.bot.send_message(chat_id=chat_id, text=msg)
+            msg = deps.loc.render('invalid_question_number', update.effective_user.language_code, count=total_questions)
+            await send_message(context, deps, chat_id, msg)
             return
 
-        session = get_db_session(deps)
-        if not session:
-             await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('database_error', lang=update.effective_user.language_code))
-             return
-
         try:
-            quiz_session = session.query(QuizSession).filter_by(user_id=user_id, status='active').first()
+            quiz_session = await deps.sessions.get(user_id)
             if not quiz_session:
-                quiz_session = QuizSession(user_id=user_id, current_question_index=question_index, correct_answers_count=0, status='active')
-                session.add(quiz_session)
-                session.commit()
-                session.refresh(quiz_session)
-                msg_template = deps.loc.get_message('new_quiz_at_q', lang=update.effective_user.language_code)
-                msg = msg_template.format(q_num=question_index + 1)
-                await context.bot.send_message(chat_id=chat_id, text=msg)
+                quiz_session = deps.sessions.put(await deps.db.run_in_session(
+                    create_quiz_session, user_id, update.effective_user.username, question_index,
+                    deps.quiz_data.question_id_at(question_index)))
+                msg = deps.loc.render('new_quiz_at_q', update.effective_user.language_code, q_num=question_index + 1)
+                await send_message(context, deps, chat_id, msg)
             else:
-                quiz_session.current_question_index = question_index
-                session.commit()
-                msg_template = deps.loc.get_message('jump_to_q', lang=update.effective_user.language_code)
-                msg = msg_template.format(q_num=question_index + 1)
-                await context.bot.send_message(chat_id=chat_id, text=msg)
+                move_to_question(deps, quiz_session, question_index)
+                await deps.sessions.save(quiz_session)
+                msg = deps.loc.render('jump_to_q', update.effective_user.language_code, q_num=question_index + 1)
+                await send_message(context, deps, chat_id, msg)
 
-            await send_question(update, context, deps, quiz_session.current_question_index)
+            await send_question(update, context, deps, quiz_session.current_question_index, quiz_session.answer_seed)
+            quiz_session.asked_at = time.time()
 
+        except DatabaseUnavailableError:
+             await send_message(context, deps, chat_id, deps.loc.render('database_error', update.effective_user.language_code))
         except Exception as e:
             logger.error(f"Error in command_c for user {user_id}: {e}", exc_info=True)
-            await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('internal_error', lang=update.effective_user.language_code))
-        finally:
-             session.close()
+            await send_message(context, deps, chat_id, deps.loc.render('internal_error', update.effective_user.language_code))
 
     except ValueError:
-        msg = deps.loc.get_message('invalid_number_format', lang=update.effective_user.language_code)
-        await context.bot.send_message(chat_id=chat_id, text=msg)
+        msg = deps.loc.render('invalid_number_format', update.effective_user.language_code)
+        await send_message(context, deps, chat_id, msg)
 
 
 async def handle_answer_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies):
     query = update.callback_query
-    await query.answer()
-
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
     user_lang = update.effective_user.language_code
 
+    dedup_keys = deps.callbacks.keys_for(query, chat_id) if deps.callbacks is not None else None
+    if dedup_keys and not deps.callbacks.check(dedup_keys):
+        logger.info(f"Ignoring duplicate callback {query.id} from user {user_id}: {query.data}")
+        try:
+            await query.answer()
+        except BadRequest:
+            # Redelivery of a query the first delivery already answered.
+            pass
+        return
+
     callback_data = query.data
 
-    if not callback_data or not callback_data.startswith('answer:'):
+    parsed = parse_answer_callback(callback_data)
+    if parsed is None:
+        await query.answer()
         logger.warning(f"Received unexpected callback data: {callback_data} from user {user_id}")
-        await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('unexpected_action', lang=user_lang))
+        await send_message(context, deps, chat_id, deps.loc.render('unexpected_action', user_lang))
         return
 
-    chosen_char = callback_data.split(':')[1]
-
-    session = get_db_session(deps)
-    if not session:
-         await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('database_error', lang=user_lang))
-         return
+    chosen_char, question_id, layout = parsed
 
     try:
-        quiz_session = session.query(QuizSession).filter_by(user_id=user_id, status='active').first()
+        quiz_session = await deps.sessions.get(user_id)
 
         if not quiz_session:
-            msg = deps.loc.get_message('no_active_quiz_callback', lang=user_lang)
-            await context.bot.send_message(chat_id=chat_id, text=msg)
+            await query.answer()
+            msg = deps.loc.render('no_active_quiz_callback', user_lang)
+            await send_message(context, deps, chat_id, msg)
             return
 
+        resume_position(deps, quiz_session)
         current_question_index = quiz_session.current_question_index
 
         if current_question_index >= len(deps.quiz_data.collection):
-             msg = deps.loc.get_message('quiz_already_finished', lang=user_lang)
-             await context.bot.send_message(chat_id=chat_id, text=msg)
+             await query.answer()
+             msg = deps.loc.render('quiz_already_finished', user_lang)
+             await send_message(context, deps, chat_id, msg)
              if quiz_session.status == 'active':
-                 quiz_session.status = 'finished'
-                 quiz_session.end_time = datetime.datetime.now()
-                 session.commit()
+                 await deps.sessions.close(quiz_session, 'finished')
              return
 
         current_question = deps.quiz_data.collection[current_question_index]
+        permutation = current_question.permutation(quiz_session.answer_seed or 0)
+        if question_id is not None and (question_id != current_question.question_id or layout != layout_tag(permutation)):
+            # A repeated tap, or a keyboard from an earlier question or session: its letters may map to other answers.
+            logger.info(f"Ignoring stale answer from user {user_id} for question {question_id}, current is {current_question.question_id}.")
+            # Answered only now, so the tap that cannot count says so instead of just stopping the spinner.
+            await query.answer(deps.loc.render('question_outdated', user_lang))
+            if quiz_session.current_question_id is not None and quiz_session.current_question_id != current_question.question_id:
+                # A reload removed the session's question and its index now points at another one the user has
+                # never seen: show that one, or every tap on the old keyboard stays stale.
+                move_to_question(deps, quiz_session, current_question_index)
+                await deps.sessions.save(quiz_session)
+                message_id = query.message.message_id if deps.edit_in_place and query.message is not None else None
+                await send_question(update, context, deps, current_question_index, quiz_session.answer_seed, message_id=message_id)
+                quiz_session.asked_at = time.time()
+            return
+        await query.answer()
+        answers, correct_char = current_question.arrange(permutation)
 
-        if chosen_char not in current_question.question_answers:
+        if chosen_char not in answers:
              logger.warning(f"User {user_id} sent invalid answer char '{chosen_char}' for question index {current_question_index}.")
-             await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('invalid_answer_option', lang=user_lang))
+             await send_message(context, deps, chat_id, deps.loc.render('invalid_answer_option', user_lang))
              return
 
 
-        is_correct = chosen_char == current_question.question_correct_answer
+        is_correct = chosen_char == correct_char
+        if deps.answer_events is not None:
+            deps.answer_events.record(user_id, quiz_session.id, current_question.question_id, current_question_index,
+                                      chosen_char, is_correct, answer_latency_ms(quiz_session, query))
 
         if is_correct:
             quiz_session.correct_answers_count += 1
-            response_msg = deps.loc.get_message('answer_correct', lang=user_lang)
-            await context.bot.send_message(chat_id=chat_id, text=response_msg)
+            response_msg = deps.loc.render('answer_correct', user_lang)
 
         else:
-            correct_answer_text = current_question.find_answer_by_char(current_question.question_correct_answer)
-            msg_template = deps.loc.get_message('answer_incorrect', lang=user_lang)
-            response_msg = msg_template.format(correct_answer=correct_answer_text)
-            await context.bot.send_message(chat_id=chat_id, text=response_msg)
+            correct_answer_text = current_question.find_answer_by_char(correct_char, answers)
+            response_msg = deps.loc.render('answer_incorrect', user_lang, correct_answer=correct_answer_text)
 
+        # Moved on before the first await, so a concurrent duplicate of this tap already sees it as stale.
+        move_to_question(deps, quiz_session, current_question_index + 1)
 
-        quiz_session.current_question_index += 1
-        session.commit()
+        # Edit mode replaces the answered question message with the verdict and the next question: one call, no new message.
+        message_id = query.message.message_id if deps.edit_in_place and query.message is not None else None
+        if message_id is None:
+            await send_message(context, deps, chat_id, response_msg)
+
+        await deps.sessions.save(quiz_session)
 
-        await send_next_question_or_finish(update, context, deps, quiz_session, session)
+        await send_next_question_or_finish(update, context, deps, quiz_session, response_msg if message_id else None, message_id)
 
+    except DatabaseUnavailableError:
+         if dedup_keys:
+             deps.callbacks.forget(dedup_keys)
+         await send_message(context, deps, chat_id, deps.loc.render('database_error', user_lang))
     except Exception as e:
          logger.error(f"Error in handle_answer_callback for user {user_id}: {e}", exc_info=True)
-         await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('internal_error', lang=user_lang))
-         session.rollback()
-    finally:
-        session.close()
+         if dedup_keys:
+             deps.callbacks.forget(dedup_keys)
+         await send_message(context, deps, chat_id, deps.loc.render('internal_error', user_lang))
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies):
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
+    user_lang = update.effective_user.language_code
+
+    if deps.stats is None or not deps.stats.finished_count:
+        await send_message(context, deps, chat_id, deps.loc.render('stats_empty', user_lang))
+        return
+
+    stats = deps.stats
+    lines = [deps.loc.render('stats_summary', user_lang,
+        finished=stats.finished_count, average=stats.average_score())]
+
+    histogram = stats.histogram()
+    buckets = [f"{bucket * 10}%+: {count}" for bucket, count in enumerate(histogram[:-1]) if count]
+    if histogram[-1]:
+        buckets.append(f"100%: {histogram[-1]}")
+    lines.append(deps.loc.render('stats_distribution', user_lang, histogram=', '.join(buckets)))
+
+    lines.append(deps.loc.render('stats_leaderboard_title', user_lang))
+    for position, result in enumerate(stats.top(), 1):
+        lines.append(deps.loc.render('stats_leaderboard_line', user_lang,
+            rank=position, name=result.username or result.user_id, correct=result.correct, total=result.total,
+            percentage=result.percentage))
+
+    best = stats.best_result(user_id)
+    if best is not None:
+        lines.append(deps.loc.render('stats_your_rank', user_lang,
+            rank=stats.rank(user_id), correct=best.correct, total=best.total, percentage=best.percentage))
+
+    hardest = stats.hardest_questions()
+    if hardest:
+        lines.append(deps.loc.render('stats_hardest_title', user_lang))
+        for position, question_stats in enumerate(hardest, 1):
+            question_index = deps.quiz_data.index_by_id.get(question_stats['question_id'])
+            question_text = deps.quiz_data.collection[question_index].question_body if question_index is not None else question_stats['question_id']
+            lines.append(deps.loc.render('stats_hardest_line', user_lang,
+                rank=position, question=question_text[:60], rate=question_stats['correct_rate'] * 100,
+                answered=question_stats['answered']))
+
+    await send_message(context, deps, chat_id, '\n'.join(lines))
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies):
+    # Admin only, and only registered when profiling is enabled. Usage: /profile cpu|mem|lag [seconds]
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
+    profiler = deps.profiler
+
+    if profiler is None or not profiler.is_admin(user_id):
+        logger.warning(f"Ignoring /profile from non-admin user {user_id}")
+        return
 
+    args = context.args or []
+    kind = args[0] if args else None
+    try:
+        seconds = float(args[1]) if len(args) > 1 else 10
+    except ValueError:
+        kind = None
+    if kind not in PROFILE_KINDS:
+        await send_message(context, deps, chat_id, f"Usage: /profile {'|'.join(PROFILE_KINDS)} [seconds, up to {profiler.max_seconds}]")
+        return
+    if profiler.busy:
+        await send_message(context, deps, chat_id, "A profile is already running.")
+        return
 
-async def send_question(update: Update, context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies, question_index: int):
+    async def report(summary):
+        await send_message(context, deps, chat_id, summary[:MAX_MESSAGE_LENGTH])
+
+    seconds = profiler.start(kind, seconds, report)
+    logger.info(f"Admin {user_id} started a {kind} profile for {seconds:.0f}s")
+    await send_message(context, deps, chat_id, f"Taking a {kind} profile for {seconds:.0f}s.")
+
+
+async def send_question(update: Update, context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies, question_index: int, answer_seed: int | None = None,
+                        prefix: str | None = None, message_id: int | None = None):
     chat_id = update.effective_chat.id
     user_lang = update.effective_user.language_code
 
     if question_index < 0 or question_index >= len(deps.quiz_data.collection):
         logger.error(f"Attempted to send invalid question index {question_index} to chat {chat_id}")
-        await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('invalid_question_index_error', lang=user_lang))
+        await send_message(context, deps, chat_id, deps.loc.render('invalid_question_index_error', user_lang))
         return
 
-    question = deps.quiz_data.collection[question_index]
-
-    question_text = f"{question_index + 1}/{len(deps.quiz_data.collection)}. {question.question_body}\n\n"
+    question_text, reply_markup = render_question(deps.quiz_data, question_index, answer_seed)
+    if prefix:
+        question_text = f"{prefix}\n\n{question_text}"
 
-    reply_markup = format_answers_as_inline_keyboard(question)
+    async def question_failed(error):
+        logger.error(f"Error sending question {question_index} to chat {chat_id}: {error}", exc_info=error)
+        await send_message(context, deps, chat_id, deps.loc.render('send_question_error', user_lang))
 
     try:
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=question_text,
-            reply_markup=reply_markup
-        )
+        # Queued sends report their failure to question_failed later; direct ones raise here.
+        if message_id is not None:
+            await edit_message(context, deps, chat_id, message_id, question_text, reply_markup, on_failed=question_failed)
+        else:
+            await send_message(context, deps, chat_id, question_text, reply_markup, priority=PRIORITY_QUESTION,
+                               on_failed=question_failed)
 
     except Exception as e:
-         logger.error(f"Error sending question {question_index} to chat {chat_id}: {e}", exc_info=True)
-         await context.bot.send_message(chat_id=chat_id, text=deps.loc.get_message('send_question_error', lang=user_lang))
+         await question_failed(e)
 
 
-async def send_next_question_or_finish(update: Update, context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies, quiz_session: QuizSession, session: Session):
+async def send_next_question_or_finish(update: Update, context: ContextTypes.DEFAULT_TYPE, deps: HandlerDependencies, quiz_session: CachedQuizSession,
+                                       prefix: str | None = None, message_id: int | None = None):
     chat_id = update.effective_chat.id
     user_id = quiz_session.user_id
     user_lang = update.effective_user.language_code
@@ -270,56 +461,43 @@ async def send_next_question_or_finish(update: Update, context: ContextTypes.DEF
     total_questions = len(deps.quiz_data.collection)
 
     if next_question_index < total_questions:
-        await send_question(update, context, deps, next_question_index)
+        await send_question(update, context, deps, next_question_index, quiz_session.answer_seed, prefix, message_id)
+        quiz_session.asked_at = time.time()
     else:
-        quiz_session.status = 'finished'
-        quiz_session.end_time = datetime.datetime.now()
-
+        result = QuizResult(user_id, update.effective_user.username, quiz_session.correct_answers_count, total_questions)
         try:
-            session.commit()
+            # The score aggregates are written in the same transaction that finishes the session.
+            extra = functools.partial(record_result, result) if deps.stats is not None else None
+            await deps.sessions.close(quiz_session, 'finished', extra)
+            if deps.stats is not None:
+                deps.stats.apply_result(result)
             logger.info(f"Quiz session {quiz_session.id} for user {user_id} marked as finished.")
         except Exception as e:
              logger.error(f"Error committing session status 'finished' for user {user_id}: {e}", exc_info=True)
-             session.rollback()
 
         correct_count = quiz_session.correct_answers_count
         percentage = (correct_count / total_questions) * 100 if total_questions > 0 else 0
 
-        msg_template = deps.loc.get_message('quiz_finished_report', lang=user_lang)
-        report_msg = msg_template.format(
+        report_msg = deps.loc.render('quiz_finished_report', user_lang,
              correct=correct_count,
              total=total_questions,
              percentage=percentage
         )
-        await context.bot.send_message(chat_id=chat_id, text=report_msg)
+        if message_id is not None:
+            await edit_message(context, deps, chat_id, message_id, f"{prefix}\n\n{report_msg}" if prefix else report_msg)
+        else:
+            await send_message(context, deps, chat_id, report_msg)
 
         logger.info(f"Quiz finished for user {user_id}. Report: {report_msg}")
 
-        try:
-            quiz_singleton_cfg = QuizSingleton()
-            answers_dir = quiz_singleton_cfg.get_project_path(quiz_singleton_cfg.answers_dir)
-            timestamp_str = datetime.datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
-            filename = f"QUIZ_s_{timestamp_str}.txt"
-            filepath = answers_dir / filename
-
-            file_content = f"""
-Quiz Session Report
--------------------
-User ID: {user_id}
-Username: {update.effective_user.username}
-Session ID: {quiz_session.id}
-Start Time: {quiz_session.start_time.strftime('%Y-%m-%d %H:%M:%S') if quiz_session.start_time else 'N/A'}
-End Time: {quiz_session.end_time.strftime('%Y-%m-%d %H:%M:%S') if quiz_session.end_time else 'N/A'}
-Correct Answers: {correct_count}
-Total Questions: {total_questions}
-Percentage: {percentage:.2f}%
-Status: {quiz_session.status}
--------------------
-"""
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(file_content.strip())
-
-            logger.info(f"Quiz results for user {user_id} saved to {filepath}")
-
-        except Exception as e:
-             logger.error(f"Error saving quiz results to file for user {user_id}: {e}", exc_info=True)
\ No newline at end of file
+        if deps.results is not None:
+            statistics = Statistics(deps.results, correct_answers=correct_count, incorrect_answers=total_questions - correct_count)
+            statistics.write_record(
+                total_questions,
+                user_id=user_id,
+                username=update.effective_user.username,
+                session_id=quiz_session.id,
+                start_time=quiz_session.start_time.isoformat() if quiz_session.start_time else None,
+                end_time=quiz_session.end_time.isoformat() if quiz_session.end_time else None,
+                status=quiz_session.status,
+            )
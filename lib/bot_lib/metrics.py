@@ -0,0 +1,248 @@
+import asyncio
+import bisect
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+}
+
+
+class LatencyHistogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation.
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for position, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.bounds[position] if position < len(self.bounds) else self.max
+        return self.max
+
+    def to_h(self):
+        return {
+            'count': self.count,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+        }
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{str(value)}"' for name, value in labels) + '}'
+
+
+def histogram_lines(name, labels, histogram):
+    # Prometheus histograms are cumulative; LatencyHistogram keeps plain per-bucket counts.
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+    lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+    return lines
+
+
+class ErrorLogCounter(logging.Handler):
+    # Handlers catch and log their own failures; counting ERROR records per logger sees all of them
+    # without an extra line in every except branch.
+    def __init__(self, registry):
+        super().__init__(level=logging.ERROR)
+        self.registry = registry
+
+    def emit(self, record):
+        errors = self.registry.log_errors
+        errors[record.name] = errors.get(record.name, 0) + 1
+
+
+class MetricsRegistry:
+    # Hot paths only bump ints and histogram buckets owned by the event loop. Gauges and the counters other
+    # components already keep are read through collectors when the endpoint is scraped.
+    def __init__(self, prefix='quiz'):
+        self.prefix = prefix
+        self.handler_latency = {}
+        self.handler_errors = {}
+        self.db_latency = {}
+        self.db_errors = {}
+        self.send_latency = LatencyHistogram()
+        self.send_errors = 0
+        self.log_errors = {}
+        self._collectors = []
+        self._log_counter = None
+
+    def instrument(self, name, handler):
+        histogram = self.handler_latency.setdefault(name, LatencyHistogram())
+        self.handler_errors.setdefault(name, 0)
+
+        async def timed(*args):
+            started = time.perf_counter()
+            try:
+                return await handler(*args)
+            except Exception:
+                self.handler_errors[name] += 1
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+
+        return timed
+
+    def observe_db(self, operation, elapsed, failed=False):
+        histogram = self.db_latency.get(operation)
+        if histogram is None:
+            histogram = self.db_latency[operation] = LatencyHistogram()
+        histogram.observe(elapsed)
+        if failed:
+            self.db_errors[operation] = self.db_errors.get(operation, 0) + 1
+
+    def add_gauge(self, name, help_text, read):
+        self._collectors.append((name, 'gauge', help_text, read))
+
+    def add_counter(self, name, help_text, read):
+        self._collectors.append((name, 'counter', help_text, read))
+
+    def add_histogram(self, name, help_text, read):
+        self._collectors.append((name, 'histogram', help_text, read))
+
+    def count_log_errors(self):
+        if self._log_counter is None:
+            self._log_counter = ErrorLogCounter(self)
+            logging.getLogger().addHandler(self._log_counter)
+
+    def close(self):
+        if self._log_counter is not None:
+            logging.getLogger().removeHandler(self._log_counter)
+            self._log_counter = None
+
+    def render(self):
+        families = [
+            ('handler_duration_seconds', 'histogram', "Time to handle one update, by handler.",
+             lambda: {(('handler', name),): histogram for name, histogram in self.handler_latency.items()}),
+            ('handler_errors_total', 'counter', "Updates whose handler raised.",
+             lambda: {(('handler', name),): count for name, count in self.handler_errors.items()}),
+            ('db_duration_seconds', 'histogram', "Database work per call, executor wait included, by operation.",
+             lambda: {(('operation', name),): histogram for name, histogram in self.db_latency.items()}),
+            ('db_errors_total', 'counter', "Database calls that raised, by operation.",
+             lambda: {(('operation', name),): count for name, count in self.db_errors.items()}),
+            ('direct_send_duration_seconds', 'histogram', "Bot API calls made without the send scheduler.",
+             lambda: self.send_latency),
+            ('direct_send_errors_total', 'counter', "Bot API calls without the send scheduler that failed.",
+             lambda: self.send_errors),
+            ('log_errors_total', 'counter', "ERROR log records, by logger.",
+             lambda: {(('logger', name),): count for name, count in list(self.log_errors.items())}),
+        ]
+        lines = []
+        for name, kind, help_text, read in families + self._collectors:
+            try:
+                samples = read()
+            except Exception as e:
+                logger.error(f"Error collecting metric {name}: {e}", exc_info=True)
+                continue
+            if samples is None:
+                continue
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if not isinstance(samples, dict):
+                samples = {(): samples}
+            for labels, value in samples.items():
+                if kind == 'histogram':
+                    lines.extend(histogram_lines(full_name, labels, value))
+                else:
+                    lines.append(f"{full_name}{format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    # A local scrape endpoint; it answers GET <path> with the Prometheus text format and nothing else.
+    def __init__(self, registry, listen='127.0.0.1', port=9464, path='/metrics'):
+        self.registry = registry
+        self.listen = listen
+        self.port = port
+        self.path = '/' + path.strip('/')
+        self.server = None
+        self.scrapes = 0
+
+    @classmethod
+    def from_config(cls, registry, bot_config: dict, worker_index=None):
+        cfg = bot_config.get('metrics') or {}
+        port = cfg.get('port', 9464)
+        if worker_index is not None and port:
+            # Each cluster worker serves its own numbers next to the others.
+            port += worker_index + 1
+        return cls(registry, listen=cfg.get('listen', '127.0.0.1'), port=port, path=cfg.get('path', '/metrics'))
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        if not self.port:
+            self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"Metrics endpoint listening on {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+            try:
+                method, path, _ = request_line.decode('latin-1').split()
+            except ValueError:
+                await self._respond(writer, 400)
+                return
+            if path.split('?', 1)[0] != self.path:
+                await self._respond(writer, 404)
+            elif method != 'GET':
+                await self._respond(writer, 405)
+            else:
+                self.scrapes += 1
+                await self._respond(writer, 200, self.registry.render().encode('utf-8'))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving metrics: {e}", exc_info=True)
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, body=b''):
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
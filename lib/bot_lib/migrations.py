@@ -0,0 +1,244 @@
+import contextlib
+import datetime
+import fcntl
+import importlib.util
+import logging
+import re
+from pathlib import Path
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateTable
+
+from .db_connector import DatabaseConnector
+
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent.parent.parent / "db" / "migrate"
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.py$")
+# pg_advisory_lock key shared by every process that migrates this database.
+MIGRATION_LOCK_KEY = 0x71756978
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+class SchemaVersionError(Exception):
+    pass
+
+
+def migration_files(directory=MIGRATIONS_DIR):
+    files = []
+    for path in Path(directory).iterdir():
+        match = MIGRATION_FILE.match(path.name)
+        if match:
+            files.append((int(match.group(1)), path))
+    return sorted(files)
+
+
+def head_version(directory=MIGRATIONS_DIR):
+    files = migration_files(directory)
+    return files[-1][0] if files else 0
+
+
+def current_version(engine):
+    # The only query on the boot path; a missing table means a database that was never migrated.
+    try:
+        with engine.connect() as connection:
+            return connection.execute(select(schema_migrations.c.version).order_by(schema_migrations.c.version.desc()).limit(1)).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        return 0
+
+
+@contextlib.contextmanager
+def migration_lock(engine):
+    # Every worker may auto-migrate at boot: one at a time, and the rest find nothing pending once they get the lock.
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as connection:
+            connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+    elif engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+        with open(f"{engine.url.database}.migrate.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        yield
+
+
+class Migration:
+    def __init__(self, version, path):
+        self.version = version
+        self.path = path
+        self.name = path.stem
+        spec = importlib.util.spec_from_file_location(f"migration_{self.name}", path)
+        self.module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.module)
+        self.description = getattr(self.module, 'DESCRIPTION', self.name)
+        # Migrations that build indexes concurrently (PostgreSQL) cannot run inside a transaction.
+        self.transactional = getattr(self.module, 'TRANSACTIONAL', True)
+
+    def up(self, op):
+        self.module.up(op)
+
+    def down(self, op):
+        self.module.down(op)
+
+
+class MigrationOperations:
+    def __init__(self, connection, dry_run=False, transactional=True, out=print):
+        self.connection = connection
+        self.dialect = connection.dialect.name
+        self.transactional = transactional
+        self.dry_run = dry_run
+        self.out = out
+
+    def execute(self, statement, **params):
+        if isinstance(statement, str):
+            statement = text(statement)
+        if self.dry_run:
+            self.out(f"    {str(statement.compile(dialect=self.connection.dialect)).strip()};")
+            return None
+        return self.connection.execute(statement, params)
+
+    def has_table(self, table_name):
+        return inspect(self.connection).has_table(table_name)
+
+    def columns(self, table_name):
+        if not self.has_table(table_name):
+            return set()
+        return {column['name'] for column in inspect(self.connection).get_columns(table_name)}
+
+    def indexes(self, table_name):
+        if not self.has_table(table_name):
+            return set()
+        return {index['name'] for index in inspect(self.connection).get_indexes(table_name)}
+
+    def create_table(self, table: Table):
+        if not self.has_table(table.name):
+            self.execute(CreateTable(table))
+
+    def drop_table(self, table_name):
+        self.execute(f"DROP TABLE IF EXISTS {table_name}")
+
+    def add_column(self, table_name, column_name, column_sql):
+        if column_name not in self.columns(table_name):
+            self.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_sql}")
+
+    def drop_column(self, table_name, column_name):
+        if column_name in self.columns(table_name):
+            self.execute(f"ALTER TABLE {table_name} DROP COLUMN {column_name}")
+
+    def create_index(self, index_name, table_name, columns, unique=False, where=None):
+        if index_name in self.indexes(table_name):
+            return
+        # CONCURRENTLY keeps PostgreSQL tables writable while the index builds; SQLite has no
+        # equivalent, there the build holds the write lock, so keep such migrations short.
+        concurrently = self._concurrently()
+        statement = f"CREATE{' UNIQUE' if unique else ''} INDEX{concurrently} IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)})"
+        if where:
+            statement += f" WHERE {where}"
+        self.execute(statement)
+
+    def drop_index(self, index_name):
+        self.execute(f"DROP INDEX{self._concurrently()} IF EXISTS {index_name}")
+
+    def _concurrently(self):
+        # Only possible outside a transaction, i.e. in migrations marked TRANSACTIONAL = False.
+        return ' CONCURRENTLY' if self.dialect == 'postgresql' and not self.transactional else ''
+
+
+class Migrator:
+    def __init__(self, db_connector: DatabaseConnector, directory=MIGRATIONS_DIR, out=print):
+        if not db_connector.engine:
+            raise SchemaVersionError("Database engine is not initialized.")
+        self.engine = db_connector.engine
+        self.directory = directory
+        self.out = out
+        self.migrations = [Migration(version, path) for version, path in migration_files(directory)]
+
+    @property
+    def head(self):
+        return self.migrations[-1].version if self.migrations else 0
+
+    def current(self):
+        return current_version(self.engine)
+
+    def applied(self):
+        try:
+            with self.engine.connect() as connection:
+                return {row.version: row for row in connection.execute(select(schema_migrations))}
+        except (OperationalError, ProgrammingError):
+            return {}
+
+    def pending(self, target=None):
+        target = self.head if target is None else target
+        current = self.current()
+        return [m for m in self.migrations if current < m.version <= target]
+
+    def upgrade(self, target=None, dry_run=False):
+        with migration_lock(self.engine):
+            # Read under the lock: another process may have just applied what looked pending.
+            pending = self.pending(target)
+            if not pending:
+                self.out(f"Schema is up to date at version {self.current()}.")
+                return []
+            for migration in pending:
+                self._run(migration, 'up', dry_run)
+            return pending
+
+    def downgrade(self, target, dry_run=False):
+        with migration_lock(self.engine):
+            current = self.current()
+            to_revert = [m for m in reversed(self.migrations) if target < m.version <= current]
+            if not to_revert:
+                self.out(f"Nothing to revert, schema is at version {current}.")
+                return []
+            for migration in to_revert:
+                self._run(migration, 'down', dry_run)
+            return to_revert
+
+    def status(self):
+        applied = self.applied()
+        for migration in self.migrations:
+            row = applied.get(migration.version)
+            state = f"applied {row.applied_at:%Y-%m-%d %H:%M:%S}" if row else "pending"
+            self.out(f"{migration.version:03d} {migration.description:<55} {state}")
+
+    def _run(self, migration, direction, dry_run):
+        verb = 'Applying' if direction == 'up' else 'Reverting'
+        self.out(f"{'[dry-run] ' if dry_run else ''}{verb} {migration.name}: {migration.description}")
+
+        if migration.transactional:
+            with self.engine.begin() as connection:
+                self._run_on(connection, migration, direction, dry_run)
+        else:
+            with self.engine.connect() as connection:
+                connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+                self._run_on(connection, migration, direction, dry_run)
+
+    def _run_on(self, connection, migration, direction, dry_run):
+        op = MigrationOperations(connection, dry_run=dry_run, transactional=migration.transactional, out=self.out)
+        getattr(migration, direction)(op)
+        if dry_run:
+            return
+        # Recorded on the same connection, so transactional migrations and their version commit together.
+        schema_migrations.create(connection, checkfirst=True)
+        if direction == 'up':
+            connection.execute(schema_migrations.insert().values(
+                version=migration.version, name=migration.name, applied_at=datetime.datetime.now()))
+        else:
+            connection.execute(schema_migrations.delete().where(schema_migrations.c.version == migration.version))
+        logger.info(f"Migration {migration.name} {'applied' if direction == 'up' else 'reverted'}.")
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, BigInteger, Float, String, DateTime, ForeignKey, Index, Boolean, text
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from sqlalchemy.sql import func
 import datetime
@@ -22,8 +22,64 @@ class QuizSession(Base):
     user_id = Column(Integer, ForeignKey('users.id'))
     current_question_index = Column(Integer, default=0)
     correct_answers_count = Column(Integer, default=0)
+    current_question_id = Column(String(16), nullable=True)
+    answer_seed = Column(Integer, nullable=True)
     start_time = Column(DateTime, server_default=func.now())
     end_time = Column(DateTime, nullable=True)
     status = Column(String, default='active')
+    version = Column(Integer, nullable=False, default=1, server_default='1')
 
-    user = relationship("User", back_populates="sessions")
\ No newline at end of file
+    user = relationship("User", back_populates="sessions")
+
+    __mapper_args__ = {"version_id_col": version}
+
+    __table_args__ = (
+        Index('ix_quiz_sessions_user_id_status', 'user_id', 'status'),
+        # At most one active session per user; it also serves the per-update active session lookup.
+        Index('uq_quiz_sessions_active_user', 'user_id', unique=True,
+              sqlite_where=text("status = 'active'"), postgresql_where=text("status = 'active'")),
+    )
+
+class AnswerEvent(Base):
+    __tablename__ = 'answer_events'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    session_id = Column(Integer, nullable=False)
+    question_id = Column(String(16), nullable=False)
+    question_index = Column(Integer, nullable=False)
+    chosen_option = Column(String(4), nullable=False)
+    is_correct = Column(Boolean, nullable=False)
+    latency_ms = Column(Integer, nullable=True)
+    answered_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_answer_events_question_id', 'question_id'),
+        Index('ix_answer_events_session_id', 'session_id'),
+    )
+
+class QuestionStat(Base):
+    __tablename__ = 'question_stats'
+
+    question_id = Column(String(16), primary_key=True)
+    answered = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+    latency_ms_sum = Column(BigInteger, nullable=False, default=0)
+    latency_count = Column(Integer, nullable=False, default=0)
+
+class ScoreBucket(Base):
+    __tablename__ = 'score_histogram'
+
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    percentage_sum = Column(Float, nullable=False, default=0)
+
+class LeaderboardEntry(Base):
+    __tablename__ = 'leaderboard'
+
+    user_id = Column(Integer, primary_key=True)
+    username = Column(String, nullable=True)
+    correct = Column(Integer, nullable=False)
+    total = Column(Integer, nullable=False)
+    percentage = Column(Float, nullable=False)
+    achieved_at = Column(DateTime, nullable=False)
\ No newline at end of file
@@ -0,0 +1,207 @@
+import asyncio
+import collections
+import datetime
+import logging
+import resource
+import sys
+import threading
+import tracemalloc
+from pathlib import Path
+
+from lib.quiz_lib.quiz import QuizSingleton
+
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('cpu', 'mem', 'lag')
+
+
+def is_idle(code):
+    # The event loop waiting for I/O: its innermost Python frame is the selector's select().
+    return code.co_name == 'select' and code.co_filename.endswith('selectors.py')
+
+
+def frame_label(code):
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    # Samples one thread's Python stack from the outside; the sampled thread runs unmodified.
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.idle = 0
+        self._stopping = threading.Event()
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            if is_idle(frame.f_code):
+                self.idle += 1
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+
+    def stop(self):
+        self._stopping.set()
+        self.join()
+
+    def top(self, limit=10):
+        self_counts = collections.Counter()
+        total_counts = collections.Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+        return self_counts.most_common(limit), total_counts.most_common(limit)
+
+    def collapsed(self):
+        # One "frame;frame;frame count" line per stack, the input flamegraph tools expect.
+        return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+
+async def measure_loop_lag(seconds, interval=0.05):
+    # How late a sleep wakes up is how long something else kept the loop busy.
+    loop = asyncio.get_running_loop()
+    lags = []
+    deadline = loop.time() + seconds
+    while loop.time() < deadline:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - started - interval))
+    return lags
+
+
+class Profiler:
+    # Nothing here runs until an admin asks: no sampler thread, no tracemalloc, no lag probe in between.
+    def __init__(self, admins, max_seconds=60, sample_interval=0.005, top=10):
+        self.admins = {int(admin) for admin in admins}
+        self.max_seconds = max_seconds
+        self.sample_interval = sample_interval
+        self.top = top
+        self._task = None
+
+    @classmethod
+    def from_config(cls, bot_config: dict):
+        cfg = bot_config.get('profiling') or {}
+        if not cfg.get('enabled', False):
+            return None
+        admins = cfg.get('admins') or []
+        if not admins:
+            logger.warning("Profiling is enabled but no admins are configured; /profile will refuse everyone.")
+        return cls(admins, max_seconds=cfg.get('max_seconds', 60), sample_interval=cfg.get('sample_interval', 0.005),
+                   top=cfg.get('top', 10))
+
+    def is_admin(self, user_id):
+        return user_id in self.admins
+
+    @property
+    def busy(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self, kind, seconds, report):
+        # Runs in the background so the admin's own update (and, without concurrent updates, everyone
+        # else's) is not held for the whole window. report(text) is awaited with the summary.
+        seconds = max(1.0, min(float(seconds), self.max_seconds))
+        job = {'cpu': self.profile_cpu, 'mem': self.profile_memory, 'lag': self.profile_lag}[kind]
+        self._task = asyncio.create_task(self._run(kind, job, seconds, report))
+        return seconds
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self, kind, job, seconds, report):
+        try:
+            summary = await job(seconds)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error taking a {kind} profile: {e}", exc_info=True)
+            summary = f"The {kind} profile failed: {e}"
+        try:
+            await report(summary)
+        except Exception as e:
+            logger.error(f"Error sending the {kind} profile summary: {e}", exc_info=True)
+
+    async def profile_cpu(self, seconds):
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+
+        busy = sampler.samples - sampler.idle
+        by_self, by_total = sampler.top(self.top)
+        path = self._write('cpu', 'folded', sampler.collapsed())
+        lines = [f"CPU profile, {seconds:.0f}s of the event loop thread: {sampler.samples} samples, "
+                 f"{100.0 * busy / sampler.samples if sampler.samples else 0.0:.1f}% busy."]
+        lines.append("Top self:")
+        lines.extend(f"{100.0 * count / busy:5.1f}% {label}" for label, count in by_self)
+        lines.append("Top inclusive:")
+        lines.extend(f"{100.0 * count / busy:5.1f}% {label}" for label, count in by_total)
+        lines.append(f"Stacks: {path}")
+        return '\n'.join(lines)
+
+    async def profile_memory(self, seconds):
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(10)
+        try:
+            await asyncio.sleep(seconds)
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+
+        snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        statistics = snapshot.statistics('lineno')
+        path = self._write('mem', 'txt', '\n'.join(str(stat) for stat in statistics[:200]) + '\n')
+        # ru_maxrss is in kilobytes on Linux.
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        window = f"allocated in the last {seconds:.0f}s and" if started_here else "traced and"
+        lines = [f"Memory {window} still alive: {current / 1048576:.1f} MiB "
+                 f"(peak {peak / 1048576:.1f} MiB, process max RSS {max_rss:.0f} MiB)."]
+        for stat in statistics[:self.top]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size / 1024:8.1f} KiB {stat.count:7} blocks  {Path(frame.filename).name}:{frame.lineno}")
+        lines.append(f"Full list: {path}")
+        return '\n'.join(lines)
+
+    async def profile_lag(self, seconds):
+        lags = sorted(await measure_loop_lag(seconds))
+        if not lags:
+            return "Event loop lag: no samples."
+        quantile = lambda q: lags[min(len(lags) - 1, int(len(lags) * q))] * 1000
+        over = sum(1 for lag in lags if lag > 0.1)
+        text = (f"Event loop lag over {seconds:.0f}s ({len(lags)} probes): p50 {quantile(0.5):.1f}ms, "
+                f"p99 {quantile(0.99):.1f}ms, max {lags[-1] * 1000:.1f}ms, {over} probes over 100ms.")
+        path = self._write('lag', 'txt', '\n'.join(f"{lag * 1000:.3f}" for lag in lags) + '\n')
+        return f"{text}\nSamples (ms): {path}"
+
+    def _write(self, kind, extension, content):
+        config = QuizSingleton()
+        log_dir = Path(config.get_project_path(config.log_dir or 'log'))
+        log_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = log_dir / f"profile-{kind}-{stamp}.{extension}"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
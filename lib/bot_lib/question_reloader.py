@@ -0,0 +1,59 @@
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionReloader:
+    # Polls the question directory and swaps the next QuestionData snapshot into the handler dependencies.
+    # Each update works on the snapshot it started with (HandlerDependencies.for_update), so a swap never
+    # changes the bank under a handler that is halfway through.
+    def __init__(self, deps, interval=2.0):
+        self.deps = deps
+        self.interval = interval
+        # The last snapshot read from disk, served or not; the next reload diffs against it.
+        self._latest = deps.quiz_data
+        self._watch_task = None
+        self.reloads = 0
+
+    @classmethod
+    def from_config(cls, deps, bot_config: dict):
+        cfg = bot_config.get('question_reload') or {}
+        if not cfg.get('enabled', False):
+            return None
+        return cls(deps, interval=cfg.get('interval', 2.0))
+
+    async def start(self):
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch_loop())
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Error reloading questions: {e}", exc_info=True)
+
+    async def check(self) -> bool:
+        # Stats and parsing run off the event loop; only the swap itself happens here, as a single assignment.
+        snapshot = await asyncio.to_thread(self._latest.reload)
+        if snapshot is None:
+            return False
+        self._latest = snapshot
+        if not snapshot.collection:
+            logger.error("Question directory has no questions after the change, keeping the previous bank.")
+            return False
+        self.deps.quiz_data = snapshot
+        self.reloads += 1
+        return True
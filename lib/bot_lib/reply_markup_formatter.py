@@ -1,9 +1,57 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
-def format_answers_as_inline_keyboard(question):
+def layout_tag(permutation):
+    return ''.join(chr(ord('a') + index) for index in permutation)
+
+
+def answer_callback_data(char, question_id, permutation):
+    # The question id and answer layout let the callback handler reject taps on an outdated keyboard.
+    return f"answer:{char}:{question_id}:{layout_tag(permutation)}"
+
+
+def parse_answer_callback(callback_data):
+    # (char, question_id, layout); the short "answer:<char>" form from older messages carries no ids.
+    if not callback_data or not callback_data.startswith('answer:'):
+        return None
+    parts = callback_data.split(':')
+    if len(parts) == 2 and parts[1]:
+        return parts[1], None, None
+    if len(parts) == 4 and parts[1]:
+        return parts[1], parts[2], parts[3]
+    return None
+
+
+def format_answers_as_inline_keyboard(question, answers=None, permutation=None):
+    answers = answers if answers is not None else question.question_answers
+    permutation = permutation if permutation is not None else question.permutation(0)
     keyboard = []
-    for char, answer_text in question.question_answers.items():
-        callback_data = f"answer:{char}"
+    for char, answer_text in answers.items():
+        callback_data = answer_callback_data(char, question.question_id, permutation)
         keyboard.append([InlineKeyboardButton(f"{char}. {answer_text}", callback_data=callback_data)])
 
-    return InlineKeyboardMarkup(keyboard)
\ No newline at end of file
+    return InlineKeyboardMarkup(keyboard)
+
+
+def format_question_text(question, question_index, total_questions):
+    return f"{question_index + 1}/{total_questions}. {question.question_body}\n\n"
+
+
+def render_question(question_data, question_index, answer_seed=None):
+    # Keyed by the answer permutation rather than the seed: at most n! entries per question.
+    question = question_data.collection[question_index]
+    permutation = question.permutation(answer_seed or 0)
+    key = (question_index, permutation)
+    rendered = question_data.render_cache.get(key)
+    if rendered is None:
+        answers, _ = question.arrange(permutation)
+        rendered = (
+            format_question_text(question, question_index, len(question_data.collection)),
+            format_answers_as_inline_keyboard(question, answers, permutation),
+        )
+        question_data.render_cache[key] = rendered
+    return rendered
+
+
+def warm_render_cache(question_data):
+    for question_index in range(len(question_data.collection)):
+        render_question(question_data, question_index)
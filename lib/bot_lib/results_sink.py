@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+from lib.quiz_lib.file_writer import FileWriter
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ResultsSink:
+    # Duck-types the FileWriter interface (write) so Statistics can report straight into it.
+    def __init__(self, writer: FileWriter, flush_interval=1.0, batch_size=1000):
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+
+    @classmethod
+    def from_config(cls, bot_config: dict, worker_index=None):
+        cfg = bot_config.get('results') or {}
+        filename = cfg.get('filename', 'results.jsonl')
+        if worker_index is not None:
+            # Cluster workers each append to and rotate their own file.
+            stem, dot, suffix = filename.rpartition('.')
+            filename = f"{stem}.w{worker_index}.{suffix}" if dot else f"{filename}.w{worker_index}"
+        writer = FileWriter(
+            'a', filename,
+            max_bytes=cfg.get('max_bytes', 64 * 1024 * 1024),
+            rotate_interval=cfg.get('rotate_interval', 86400),
+            compress=cfg.get('compress', True),
+        )
+        return cls(writer, flush_interval=cfg.get('flush_interval', 1.0), batch_size=cfg.get('batch_size', 1000))
+
+    def write(self, message):
+        # Safe to call from the event loop: never touches the file.
+        self.submitted += 1
+        self._queue.put(message)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="results-sink", daemon=True)
+            self._thread.start()
+
+    async def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+        logger.info(f"Results sink stopped, {self.written} results written to {self.writer.filepath}"
+                    f"{f', {self.failed} failed' if self.failed else ''}.")
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            batch = []
+            stopping = item is _STOP
+            if item is not None and not stopping:
+                batch.append(item)
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+            try:
+                if batch:
+                    if self.writer.write_lines(batch):
+                        self.written += len(batch)
+                    else:
+                        self.failed += len(batch)
+                if stopping or time.monotonic() - last_flush >= self.flush_interval:
+                    self.writer.flush()
+                    last_flush = time.monotonic()
+                if self.writer.file and self.writer.should_rotate():
+                    self.writer.rotate()
+            except Exception as e:
+                logger.error(f"Error writing quiz results: {e}", exc_info=True)
+
+            if stopping:
+                self.writer.close()
+                return
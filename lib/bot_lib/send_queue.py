@@ -0,0 +1,379 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import logging
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+from .metrics import LatencyHistogram
+
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_QUESTION = 0
+PRIORITY_INFO = 1
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+def can_resend_edit(error):
+    # The message is gone or too old to edit; resending is right. "Not modified" means it already shows the text.
+    return isinstance(error, BadRequest) and 'not modified' not in str(error).lower()
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now):
+        # Seconds until a token is available; a rate of 0 means unlimited.
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        if self.rate:
+            self._refill(now)
+            self.tokens -= 1
+
+    def is_full(self, now):
+        if not self.rate:
+            return True
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class SendMetrics:
+    def __init__(self):
+        self.enqueued = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+        self.queue_latency = LatencyHistogram()
+        self.send_latency = LatencyHistogram()
+
+    def snapshot(self):
+        return {
+            'enqueued': self.enqueued,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retried': self.retried,
+            'failed': self.failed,
+            'backpressure_waits': self.backpressure_waits,
+            'queue_latency': self.queue_latency.to_h(),
+            'send_latency': self.send_latency.to_h(),
+        }
+
+
+class OutboundMessage:
+    __slots__ = ('chat_id', 'message_id', 'text', 'reply_markup', 'priority', 'enqueued_at', 'futures', 'attempts',
+                 'failure_hooks')
+
+    def __init__(self, chat_id, text, reply_markup, priority, message_id=None, on_failed=None):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = text
+        self.reply_markup = reply_markup
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.futures = []
+        self.attempts = 0
+        # Coroutine functions called with the error once the message is given up on; the sender has long returned.
+        self.failure_hooks = [on_failed] if on_failed else []
+
+    def can_absorb(self, other):
+        # Only new plain-text messages can be extended: a keyboard must stay attached to the text it
+        # was sent with, and an edit replaces a specific message.
+        return (self.reply_markup is None and not self.attempts and self.message_id is None and other.message_id is None
+                and len(self.text) + len(other.text) + 2 <= MAX_MESSAGE_LENGTH)
+
+    def absorb(self, other):
+        self.text = f"{self.text}\n\n{other.text}"
+        self.reply_markup = other.reply_markup
+        self.priority = min(self.priority, other.priority)
+        self.futures.extend(other.futures)
+        self.failure_hooks.extend(other.failure_hooks)
+
+
+class ChatQueue:
+    __slots__ = ('chat_id', 'messages', 'bucket', 'blocked_until', 'generation', 'scheduled', 'in_flight', 'idle_since')
+
+    def __init__(self, chat_id, bucket):
+        self.chat_id = chat_id
+        self.messages = collections.deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.generation = 0
+        self.scheduled = False
+        self.in_flight = False
+        self.idle_since = None
+
+
+class SendScheduler:
+    # Handlers enqueue and return; one dispatcher task sends in priority order within the global
+    # and per-chat token buckets. A chat has at most one message in flight, so its order is kept.
+    def __init__(self, global_rate=30, chat_rate=1, chat_burst=3, coalesce_window=0.05, max_pending=10000,
+                 max_in_flight=32, max_retries=3):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.coalesce_window = coalesce_window
+        self.max_pending = max_pending
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.metrics = SendMetrics()
+        self.bot = None
+        self._global = TokenBucket(global_rate, max(1, global_rate))
+        self._chats = {}
+        # Heaps of (priority, seq, generation, chat) and (ready_at, seq, generation, chat); entries
+        # whose generation no longer matches the chat's are stale and skipped.
+        self._ready = []
+        self._delayed = []
+        self._seq = itertools.count()
+        self._pending = 0
+        self._sending = 0
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._tasks = set()
+        self._dispatcher = None
+        self._closing = False
+        self._last_prune = 0.0
+
+    @classmethod
+    def from_config(cls, bot_config: dict, worker_index=None):
+        cfg = bot_config.get('send_queue') or {}
+        if not cfg.get('enabled', True):
+            return None
+        global_rate = cfg.get('global_rate', 30)
+        if worker_index is not None:
+            # The API limit applies to the bot token, so cluster workers split it between them.
+            global_rate = global_rate / max(1, (bot_config.get('cluster') or {}).get('workers', 1))
+        return cls(
+            global_rate=global_rate,
+            chat_rate=cfg.get('chat_rate', 1),
+            chat_burst=cfg.get('chat_burst', 3),
+            coalesce_window=cfg.get('coalesce_window', 0.05),
+            max_pending=cfg.get('max_pending', 10000),
+            max_in_flight=cfg.get('max_in_flight', 32),
+            max_retries=cfg.get('max_retries', 3),
+        )
+
+    @property
+    def pending(self):
+        return self._pending
+
+    async def send_message(self, chat_id, text, reply_markup=None, priority=PRIORITY_INFO, wait=False, on_failed=None):
+        return await self._submit(OutboundMessage(chat_id, text, reply_markup, priority, on_failed=on_failed), wait)
+
+    async def edit_message_text(self, chat_id, message_id, text, reply_markup=None, priority=PRIORITY_QUESTION, wait=False,
+                                on_failed=None):
+        # Edits count against the same limits and keep their place in the chat's order.
+        return await self._submit(OutboundMessage(chat_id, text, reply_markup, priority, message_id=message_id,
+                                                  on_failed=on_failed), wait)
+
+    async def _submit(self, message, wait):
+        if self._dispatcher is None:
+            if self.bot is None:
+                raise RuntimeError("Send scheduler is not started.")
+            # Draining or stopped: nothing is dispatching any more, so send directly.
+            return await self._deliver(message)
+
+        while self._pending >= self.max_pending:
+            self.metrics.backpressure_waits += 1
+            self._space.clear()
+            await self._space.wait()
+
+        future = asyncio.get_running_loop().create_future() if wait else None
+        if future is not None:
+            message.futures.append(future)
+        self._enqueue(message)
+        if future is not None:
+            return await future
+        return None
+
+    def _deliver(self, message):
+        if message.message_id is not None:
+            return self.bot.edit_message_text(chat_id=message.chat_id, message_id=message.message_id, text=message.text,
+                                              reply_markup=message.reply_markup)
+        return self.bot.send_message(chat_id=message.chat_id, text=message.text, reply_markup=message.reply_markup)
+
+    def _enqueue(self, message):
+        self.metrics.enqueued += 1
+        chat = self._chats.get(message.chat_id)
+        if chat is None:
+            chat = self._chats[message.chat_id] = ChatQueue(message.chat_id, TokenBucket(self.chat_rate, self.chat_burst))
+        chat.idle_since = None
+
+        if chat.messages and chat.messages[-1].can_absorb(message):
+            chat.messages[-1].absorb(message)
+            self.metrics.coalesced += 1
+        else:
+            chat.messages.append(message)
+            self._pending += 1
+        if not chat.in_flight:
+            self._schedule(chat)
+
+    def _schedule(self, chat):
+        now = time.monotonic()
+        head = chat.messages[0]
+        ready_at = max(now + chat.bucket.delay(now), chat.blocked_until)
+        if head.reply_markup is None and head.message_id is None and not head.attempts:
+            # Plain text waits briefly so a follow-up (usually the next question) can be merged into it.
+            ready_at = max(ready_at, head.enqueued_at + self.coalesce_window)
+
+        chat.generation += 1
+        chat.scheduled = True
+        if ready_at <= now:
+            priority = min(message.priority for message in chat.messages)
+            heapq.heappush(self._ready, (priority, next(self._seq), chat.generation, chat))
+        else:
+            heapq.heappush(self._delayed, (ready_at, next(self._seq), chat.generation, chat))
+        self._wakeup.set()
+
+    def _promote(self, now):
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, generation, chat = heapq.heappop(self._delayed)
+            if generation == chat.generation and chat.scheduled:
+                self._schedule(chat)
+
+    def _prune(self, now):
+        # Idle chats with a full bucket carry no state worth keeping.
+        self._last_prune = now
+        for chat_id in [chat_id for chat_id, chat in self._chats.items()
+                        if chat.idle_since is not None and chat.bucket.is_full(now) and now >= chat.blocked_until]:
+            del self._chats[chat_id]
+
+    def start(self, bot):
+        self.bot = bot
+        if self._dispatcher is None:
+            self._closing = False
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        # Drains everything already queued; new messages are sent directly from here on.
+        if self._dispatcher is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        await self._dispatcher
+        self._dispatcher = None
+        if self._tasks:
+            # Failure hooks still running; what they send now goes out directly.
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        logger.info(f"Send scheduler stopped: {self.metrics.snapshot()}")
+
+    async def _dispatch_loop(self):
+        while True:
+            now = time.monotonic()
+            self._promote(now)
+            if now - self._last_prune >= 10:
+                self._prune(now)
+
+            if not self._ready or self._sending >= self.max_in_flight:
+                if self._closing and not self._pending and not self._sending:
+                    return
+                timeout = None
+                if self._delayed and self._sending < self.max_in_flight:
+                    timeout = max(0.0, self._delayed[0][0] - now)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = self._global.delay(now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, generation, chat = heapq.heappop(self._ready)
+            if generation != chat.generation or not chat.scheduled:
+                continue
+            chat.scheduled = False
+            chat.in_flight = True
+            message = chat.messages.popleft()
+            self._global.take(now)
+            chat.bucket.take(now)
+            self._sending += 1
+            task = asyncio.create_task(self._send(chat, message))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, chat, message):
+        started = time.monotonic()
+        self.metrics.queue_latency.observe(started - message.enqueued_at)
+        done = True
+        try:
+            sent = await self._deliver(message)
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else float(e.retry_after)
+            message.attempts += 1
+            self.metrics.retried += 1
+            if message.attempts <= self.max_retries:
+                # Back to the head of its chat queue; only this chat waits out the flood limit.
+                chat.messages.appendleft(message)
+                chat.blocked_until = time.monotonic() + retry_after
+                done = False
+            else:
+                self._fail(message, e)
+        except BadRequest as e:
+            if message.message_id is not None and can_resend_edit(e):
+                logger.warning(f"Could not edit message {message.message_id} in chat {chat.chat_id}, sending a new one: {e}")
+                message.message_id = None
+                chat.messages.appendleft(message)
+                done = False
+            else:
+                self._fail(message, e)
+        except Exception as e:
+            self._fail(message, e)
+        else:
+            self.metrics.sent += 1
+            self.metrics.send_latency.observe(time.monotonic() - started)
+            for future in message.futures:
+                if not future.done():
+                    future.set_result(sent)
+        finally:
+            chat.in_flight = False
+            self._sending -= 1
+            if done:
+                self._pending -= 1
+                self._space.set()
+            if chat.messages:
+                self._schedule(chat)
+            else:
+                chat.idle_since = time.monotonic()
+            self._wakeup.set()
+
+    def _fail(self, message, error):
+        self.metrics.failed += 1
+        logger.error(f"Error sending message to chat {message.chat_id} after {message.attempts} retries: {error}")
+        for future in message.futures:
+            if not future.done():
+                future.set_exception(error)
+        for hook in message.failure_hooks:
+            task = asyncio.create_task(self._run_failure_hook(hook, message, error))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_failure_hook(self, hook, message, error):
+        try:
+            await hook(error)
+        except Exception as e:
+            logger.error(f"Error in send failure hook for chat {message.chat_id}: {e}", exc_info=True)
@@ -0,0 +1,262 @@
+import asyncio
+import datetime
+import logging
+import time
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from .db_connector import DatabaseConnector
+from .models import QuizSession
+
+
+logger = logging.getLogger(__name__)
+
+
+def find_active_session(session: Session, user_id: int) -> QuizSession | None:
+    return session.query(QuizSession).filter_by(user_id=user_id, status='active').first()
+
+
+class StaleSessionError(Exception):
+    pass
+
+
+_sessions_table = QuizSession.__table__
+
+# Optimistic concurrency: a row is only written if nobody else bumped its version since we read it.
+_versioned_update = (
+    update(_sessions_table)
+    .where(_sessions_table.c.id == bindparam('b_id'), _sessions_table.c.version == bindparam('b_version'))
+    .values(
+        current_question_index=bindparam('current_question_index'),
+        correct_answers_count=bindparam('correct_answers_count'),
+        current_question_id=bindparam('current_question_id'),
+        end_time=bindparam('end_time'),
+        status=bindparam('status'),
+        version=_sessions_table.c.version + 1,
+    )
+)
+
+
+def write_session_rows(session: Session, rows: list[dict], extra=None) -> list[int]:
+    # One statement per row (rowcount is per statement), all inside one transaction.
+    # extra(session) joins that transaction unless a row turned out to be stale.
+    connection = session.connection()
+    conflicts = []
+    for row in rows:
+        params = {key: value for key, value in row.items() if key not in ('id', 'version')}
+        params.update(b_id=row['id'], b_version=row['version'])
+        if connection.execute(_versioned_update, params).rowcount != 1:
+            conflicts.append(row['id'])
+    if extra is not None and not conflicts:
+        extra(session)
+    session.commit()
+    return conflicts
+
+
+class CachedQuizSession:
+    __slots__ = ('id', 'user_id', 'current_question_index', 'correct_answers_count', 'current_question_id',
+                 'answer_seed', 'start_time', 'end_time', 'status', 'version', 'last_access', 'asked_at')
+
+    FIELDS = ('id', 'user_id', 'current_question_index', 'correct_answers_count', 'current_question_id',
+              'answer_seed', 'start_time', 'end_time', 'status', 'version')
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field))
+        self.last_access = time.monotonic()
+        # Wall time the current question was sent by this process, for answer latency; never persisted.
+        self.asked_at = None
+
+    @classmethod
+    def from_model(cls, quiz_session: QuizSession):
+        return cls(**{field: getattr(quiz_session, field) for field in cls.FIELDS})
+
+    def to_row(self):
+        return {
+            'id': self.id,
+            'current_question_index': self.current_question_index,
+            'correct_answers_count': self.correct_answers_count,
+            'current_question_id': self.current_question_id,
+            'end_time': self.end_time,
+            'status': self.status,
+            'version': self.version,
+        }
+
+    def __repr__(self):
+        return f"CachedQuizSession(id={self.id}, user_id={self.user_id}, index={self.current_question_index}, status='{self.status}')"
+
+
+class ActiveSessionCache:
+    def __init__(self, db_connector: DatabaseConnector, max_size=10000, idle_ttl=1800, flush_interval=5):
+        self.db = db_connector
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self._entries = OrderedDict()
+        self._dirty = set()
+        # Dirty sessions that were evicted or closed but not yet written; they stay visible to get().
+        self._pending = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._closing = asyncio.Event()
+
+    @classmethod
+    def from_config(cls, db_connector: DatabaseConnector):
+        cfg = (db_connector.config or {}).get('session_cache') or {}
+        return cls(
+            db_connector,
+            max_size=cfg.get('max_size', 10000),
+            idle_ttl=cfg.get('idle_ttl', 1800),
+            flush_interval=cfg.get('flush_interval', 5),
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def dirty_count(self):
+        return len(self._dirty) + len(self._pending)
+
+    async def get(self, user_id: int) -> CachedQuizSession | None:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+            entry.last_access = time.monotonic()
+            return entry
+
+        entry = self._pending.get(user_id)
+        if entry is not None:
+            if entry.status != 'active':
+                return None
+            del self._pending[user_id]
+            self._store(entry)
+            self._dirty.add(user_id)
+            return entry
+
+        quiz_session = await self.db.run_in_session(find_active_session, user_id)
+        if quiz_session is None:
+            return None
+
+        # A concurrent get() for the same user may have filled the slot while we were loading.
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = CachedQuizSession.from_model(quiz_session)
+            self._store(entry)
+        return entry
+
+    def put(self, quiz_session: QuizSession) -> CachedQuizSession:
+        entry = CachedQuizSession.from_model(quiz_session)
+        self._pending.pop(entry.user_id, None)
+        self._dirty.discard(entry.user_id)
+        self._store(entry)
+        return entry
+
+    async def save(self, entry: CachedQuizSession):
+        entry.last_access = time.monotonic()
+        if self._entries.get(entry.user_id) is entry:
+            self._dirty.add(entry.user_id)
+        else:
+            self._pending[entry.user_id] = entry
+        if not self.flush_interval:
+            await self.flush()
+
+    async def close(self, entry: CachedQuizSession, status: str, extra=None):
+        # Lifecycle changes are written through so a later DB lookup never sees the session as active.
+        async with self._flush_lock:
+            entry.status = status
+            entry.end_time = datetime.datetime.now()
+            if self._entries.get(entry.user_id) is entry:
+                del self._entries[entry.user_id]
+            self._dirty.discard(entry.user_id)
+            self._pending.pop(entry.user_id, None)
+            try:
+                conflicts = await self.db.run_in_session(write_session_rows, [entry.to_row()], extra)
+            except Exception:
+                self._pending.setdefault(entry.user_id, entry)
+                raise
+
+            if conflicts:
+                raise StaleSessionError(f"Quiz session {entry.id} was changed by another worker.")
+            entry.version += 1
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            self._expire_idle()
+            dirty, self._dirty = self._dirty, set()
+            pending, self._pending = self._pending, {}
+            entries = [self._entries[user_id] for user_id in dirty if user_id in self._entries]
+            entries.extend(pending.values())
+            if not entries:
+                return 0
+
+            rows = [entry.to_row() for entry in entries]
+            try:
+                conflicts = set(await self.db.run_in_session(write_session_rows, rows))
+            except Exception:
+                self._dirty |= {user_id for user_id in dirty if user_id in self._entries}
+                for user_id, entry in pending.items():
+                    self._pending.setdefault(user_id, entry)
+                raise
+
+            for entry, row in zip(entries, rows):
+                if entry.id in conflicts:
+                    # Another worker owns a newer state; drop ours so the next get() reloads it.
+                    logger.warning(f"Quiz session {entry.id} for user {entry.user_id} was changed elsewhere, discarding cached state.")
+                    if self._entries.get(entry.user_id) is entry:
+                        del self._entries[entry.user_id]
+                        self._dirty.discard(entry.user_id)
+                else:
+                    entry.version = row['version'] + 1
+
+            logger.debug(f"Flushed {len(rows)} quiz sessions in one transaction.")
+            return len(rows)
+
+    def _store(self, entry: CachedQuizSession):
+        self._entries[entry.user_id] = entry
+        self._entries.move_to_end(entry.user_id)
+        while len(self._entries) > self.max_size:
+            user_id, evicted = self._entries.popitem(last=False)
+            self._evict(user_id, evicted)
+
+    def _expire_idle(self):
+        if not self.idle_ttl:
+            return
+        deadline = time.monotonic() - self.idle_ttl
+        while self._entries:
+            user_id, entry = next(iter(self._entries.items()))
+            if entry.last_access > deadline:
+                break
+            del self._entries[user_id]
+            self._evict(user_id, entry)
+
+    def _evict(self, user_id, entry):
+        if user_id in self._dirty:
+            self._dirty.discard(user_id)
+            self._pending[user_id] = entry
+
+    async def start(self):
+        if self.flush_interval and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        # Let a running flush finish; cancelling it mid-write would lose the rows it already took.
+        self._closing.set()
+        if self._flush_task:
+            await self._flush_task
+            self._flush_task = None
+        flushed = await self.flush()
+        logger.info(f"Session cache stopped, {flushed} dirty sessions flushed.")
+
+    async def _flush_loop(self):
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(), timeout=self.flush_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing session cache: {e}", exc_info=True)
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import signal
+
+import httpx
+from telegram import Bot, Update
+
+from .webhook_server import WebhookServer, SECRET_HEADER
+from lib.quiz_lib.quiz import QuizSingleton
+
+
+logger = logging.getLogger(__name__)
+
+
+def update_shard_key(data: dict):
+    # Works on the raw JSON so the router never has to build Update objects.
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        for field in ('from', 'user'):
+            if isinstance(value.get(field), dict) and 'id' in value[field]:
+                return value[field]['id']
+        if isinstance(value.get('chat'), dict) and 'id' in value['chat']:
+            return value['chat']['id']
+    return None
+
+
+def shard_for(key, workers: int) -> int:
+    return key % workers if key is not None else 0
+
+
+class ShardRouter(WebhookServer):
+    def __init__(self, worker_urls, listen='127.0.0.1', port=8443, url_path='telegram',
+                 secret_token=None, max_body_size=1048576, ssl_context=None):
+        super().__init__(None, listen=listen, port=port, url_path=url_path, secret_token=secret_token,
+                         max_body_size=max_body_size, ssl_context=ssl_context)
+        self.worker_urls = worker_urls
+        self.forwarded = [0] * len(worker_urls)
+        self.client = None
+
+    async def start(self):
+        self.client = httpx.AsyncClient(timeout=10.0, limits=httpx.Limits(max_connections=256, max_keepalive_connections=256))
+        await super().start()
+
+    async def stop(self):
+        await super().stop()
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    async def _enqueue(self, body):
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            logger.warning(f"Rejected malformed webhook payload: {e}")
+            return 400
+        if not isinstance(data, dict):
+            return 400
+
+        shard = shard_for(update_shard_key(data), len(self.worker_urls))
+        headers = {'Content-Type': 'application/json'}
+        if self.secret_token:
+            headers[SECRET_HEADER] = self.secret_token
+        try:
+            # Answer only after the worker queued the update, so a user's updates reach it in order.
+            response = await self.client.post(self.worker_urls[shard], content=body, headers=headers)
+        except httpx.HTTPError as e:
+            logger.error(f"Error forwarding update to worker {shard}: {e}")
+            return 502
+
+        if response.status_code != 200:
+            return 502
+        self.received += 1
+        self.forwarded[shard] += 1
+        return 200
+
+
+def run_worker(config_paths, worker_index, quiz_settings, request_factory=None):
+    # Entry point of a worker process (spawned, so the QuizSingleton has to be configured again).
+    from .bot_engine import BotEngine
+
+    quiz_config = QuizSingleton()
+    for name, value in quiz_settings.items():
+        setattr(quiz_config, name, value)
+
+    request = request_factory() if request_factory else None
+    engine = BotEngine(config_paths, request=request, worker_index=worker_index)
+    engine.run()
+
+
+class ClusterSupervisor:
+    def __init__(self, config_paths, bot_config, token, secret_token, request_factory=None):
+        self.config_paths = config_paths
+        self.token = token
+        self.secret_token = secret_token
+        self.request_factory = request_factory
+        cluster_cfg = bot_config.get('cluster') or {}
+        self.webhook_cfg = bot_config.get('webhook') or {}
+        self.workers = cluster_cfg.get('workers', 2)
+        self.base_port = cluster_cfg.get('base_port', 9001)
+        self.processes = []
+        self.router = None
+
+    def worker_urls(self):
+        url_path = self.webhook_cfg.get('url_path', 'telegram').strip('/')
+        return [f"http://127.0.0.1:{self.base_port + index}/{url_path}" for index in range(self.workers)]
+
+    def start_workers(self):
+        quiz_config = QuizSingleton()
+        quiz_settings = {name: getattr(quiz_config, name) for name in
+                         ('yaml_dir', 'answers_dir', 'in_ext', 'log_dir', 'cache_dir', 'loader', 'libyaml')}
+        context = multiprocessing.get_context('spawn')
+        for index in range(self.workers):
+            process = context.Process(
+                target=run_worker,
+                args=(self.config_paths, index, quiz_settings, self.request_factory),
+                name=f"bot-worker-{index}",
+            )
+            process.start()
+            self.processes.append(process)
+        logger.info(f"Started {self.workers} bot workers on ports {self.base_port}-{self.base_port + self.workers - 1}.")
+
+    async def wait_for_workers(self, timeout=60):
+        deadline = asyncio.get_running_loop().time() + timeout
+        for index in range(self.workers):
+            while True:
+                try:
+                    _, writer = await asyncio.open_connection('127.0.0.1', self.base_port + index)
+                    writer.close()
+                    break
+                except OSError:
+                    if asyncio.get_running_loop().time() > deadline:
+                        raise RuntimeError(f"Worker {index} did not start listening in time.")
+                    await asyncio.sleep(0.1)
+
+    def stop_workers(self, timeout=30):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join(timeout)
+        self.processes = []
+        logger.info("Bot workers stopped.")
+
+    async def start_router(self):
+        await self.wait_for_workers()
+        self.router = ShardRouter(
+            self.worker_urls(),
+            listen=self.webhook_cfg.get('listen', '127.0.0.1'),
+            port=self.webhook_cfg.get('port', 8443),
+            url_path=self.webhook_cfg.get('url_path', 'telegram'),
+            secret_token=self.secret_token,
+            max_body_size=self.webhook_cfg.get('max_body_size', 1048576),
+        )
+        await self.router.start()
+
+        public_url = self.webhook_cfg.get('public_url')
+        if public_url:
+            async with Bot(self.token) as bot:
+                await bot.set_webhook(
+                    url=public_url,
+                    secret_token=self.secret_token,
+                    allowed_updates=Update.ALL_TYPES,
+                    max_connections=self.webhook_cfg.get('max_connections', 40),
+                )
+            logger.info(f"Webhook registered with Telegram at {public_url}")
+
+    async def serve(self):
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                pass
+
+        await self.start_router()
+        try:
+            await stop_event.wait()
+        finally:
+            await self.router.stop()
+
+    def run(self):
+        self.start_workers()
+        try:
+            asyncio.run(self.serve())
+        finally:
+            self.stop_workers()
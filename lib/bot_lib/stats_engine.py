@@ -0,0 +1,270 @@
+import asyncio
+import bisect
+import datetime
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .db_connector import DatabaseConnector
+from .models import LeaderboardEntry, QuestionStat, ScoreBucket
+
+
+logger = logging.getLogger(__name__)
+
+PERFECT_BUCKET = 10
+
+
+def score_bucket(correct, total):
+    # Ten 10% buckets plus one for perfect scores; the migration backfill uses the same formula.
+    if correct >= total:
+        return PERFECT_BUCKET
+    return (correct * 10) // total
+
+
+class QuizResult:
+    __slots__ = ('user_id', 'username', 'correct', 'total', 'percentage', 'achieved_at')
+
+    def __init__(self, user_id, username, correct, total, achieved_at=None):
+        self.user_id = user_id
+        self.username = username
+        self.correct = correct
+        self.total = total
+        self.percentage = 100.0 * correct / total if total else 0.0
+        self.achieved_at = achieved_at or datetime.datetime.now()
+
+    @property
+    def bucket(self):
+        return score_bucket(self.correct, self.total)
+
+    def rank_key(self):
+        return (-self.percentage, -self.correct, self.achieved_at, self.user_id)
+
+    def beats(self, other):
+        return (self.percentage, self.correct) > (other.percentage, other.correct)
+
+    def to_h(self):
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'correct': self.correct,
+            'total': self.total,
+            'percentage': round(self.percentage, 2),
+            'achieved_at': self.achieved_at.isoformat(),
+        }
+
+
+def _insert_for(session: Session, model):
+    dialect = session.get_bind().dialect.name
+    return (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(model)
+
+
+def question_deltas(rows):
+    deltas = {}
+    for row in rows:
+        delta = deltas.setdefault(row['question_id'], [0, 0, 0, 0])
+        delta[0] += 1
+        delta[1] += 1 if row['is_correct'] else 0
+        if row.get('latency_ms') is not None:
+            delta[2] += row['latency_ms']
+            delta[3] += 1
+    return deltas
+
+
+def apply_question_deltas(session: Session, deltas):
+    # Runs in the transaction that inserts the answer events, so the aggregates can never drift from them.
+    if not deltas:
+        return
+    statement = _insert_for(session, QuestionStat)
+    statement = statement.on_conflict_do_update(
+        index_elements=['question_id'],
+        set_={
+            'answered': QuestionStat.answered + statement.excluded.answered,
+            'correct': QuestionStat.correct + statement.excluded.correct,
+            'latency_ms_sum': QuestionStat.latency_ms_sum + statement.excluded.latency_ms_sum,
+            'latency_count': QuestionStat.latency_count + statement.excluded.latency_count,
+        },
+    )
+    session.execute(statement, [
+        {'question_id': question_id, 'answered': answered, 'correct': correct,
+         'latency_ms_sum': latency_sum, 'latency_count': latency_count}
+        for question_id, (answered, correct, latency_sum, latency_count) in deltas.items()
+    ])
+
+
+def record_result(result: QuizResult, session: Session):
+    # Runs in the transaction that marks the session finished (see ActiveSessionCache.close).
+    histogram = _insert_for(session, ScoreBucket)
+    session.execute(histogram.on_conflict_do_update(
+        index_elements=['bucket'],
+        set_={'count': ScoreBucket.count + 1, 'percentage_sum': ScoreBucket.percentage_sum + histogram.excluded.percentage_sum},
+    ), {'bucket': result.bucket, 'count': 1, 'percentage_sum': result.percentage})
+
+    leaderboard = _insert_for(session, LeaderboardEntry)
+    excluded = leaderboard.excluded
+    session.execute(leaderboard.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={'username': excluded.username, 'correct': excluded.correct, 'total': excluded.total,
+              'percentage': excluded.percentage, 'achieved_at': excluded.achieved_at},
+        # Only a better score replaces the stored best one.
+        where=(excluded.percentage > LeaderboardEntry.percentage)
+              | ((excluded.percentage == LeaderboardEntry.percentage) & (excluded.correct > LeaderboardEntry.correct)),
+    ), {'user_id': result.user_id, 'username': result.username, 'correct': result.correct, 'total': result.total,
+        'percentage': result.percentage, 'achieved_at': result.achieved_at})
+
+
+def load_stats(session: Session):
+    questions = {row.question_id: [row.answered, row.correct, row.latency_ms_sum, row.latency_count]
+                 for row in session.execute(select(QuestionStat.__table__))}
+    histogram = {row.bucket: [row.count, row.percentage_sum] for row in session.execute(select(ScoreBucket.__table__))}
+    leaders = [QuizResult(row.user_id, row.username, row.correct, row.total, row.achieved_at)
+               for row in session.execute(select(LeaderboardEntry.__table__))]
+    return questions, histogram, leaders
+
+
+class StatsEngine:
+    def __init__(self, db_connector: DatabaseConnector, leaderboard_size=10, min_answers=5, refresh_interval=0):
+        self.db = db_connector
+        self.leaderboard_size = leaderboard_size
+        self.min_answers = min_answers
+        self.refresh_interval = refresh_interval
+        self._questions = {}
+        # (correct rate, question id) of every question with at least min_answers, kept sorted like _ranking.
+        self._difficulty = []
+        self._histogram = [[0, 0.0] for _ in range(PERFECT_BUCKET + 1)]
+        self._finished = 0
+        self._percentage_sum = 0.0
+        # Best result per user plus the same results as sorted rank keys, for O(log n) rank lookups.
+        self._best = {}
+        self._ranking = []
+        self._refresh_task = None
+
+    @classmethod
+    def from_config(cls, db_connector: DatabaseConnector, bot_config: dict):
+        cfg = bot_config.get('stats') or {}
+        return cls(
+            db_connector,
+            leaderboard_size=cfg.get('leaderboard_size', 10),
+            min_answers=cfg.get('min_answers', 5),
+            refresh_interval=cfg.get('refresh_interval', 0),
+        )
+
+    async def load(self):
+        questions, histogram, leaders = await self.db.run_in_session(load_stats)
+        self._questions = questions
+        self._difficulty = sorted(filter(None, (self._difficulty_key(question_id, stats) for question_id, stats in questions.items())))
+        self._histogram = [[0, 0.0] for _ in range(PERFECT_BUCKET + 1)]
+        for bucket, (count, percentage_sum) in histogram.items():
+            self._histogram[bucket] = [count, percentage_sum]
+        self._finished = sum(count for count, _ in self._histogram)
+        self._percentage_sum = sum(percentage_sum for _, percentage_sum in self._histogram)
+        self._best = {result.user_id: result for result in leaders}
+        self._ranking = sorted(result.rank_key() for result in leaders)
+        logger.info(f"Statistics loaded: {len(self._questions)} questions, {self._finished} finished quizzes, {len(self._best)} ranked users.")
+
+    async def start(self):
+        await self.load()
+        if self.refresh_interval and self._refresh_task is None:
+            # Other workers write the same tables; reloading is how their updates become visible here.
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error(f"Error reloading statistics: {e}", exc_info=True)
+
+    def _difficulty_key(self, question_id, stats):
+        if stats[0] < self.min_answers:
+            return None
+        return (stats[1] / stats[0], question_id)
+
+    def apply_answers(self, rows):
+        # Called once the answer events and their question_stats deltas are committed.
+        for question_id, delta in question_deltas(rows).items():
+            stats = self._questions.setdefault(question_id, [0, 0, 0, 0])
+            previous = self._difficulty_key(question_id, stats)
+            for position, value in enumerate(delta):
+                stats[position] += value
+            current = self._difficulty_key(question_id, stats)
+            if previous is not None:
+                del self._difficulty[bisect.bisect_left(self._difficulty, previous)]
+            if current is not None:
+                bisect.insort(self._difficulty, current)
+
+    def apply_result(self, result: QuizResult):
+        bucket = self._histogram[result.bucket]
+        bucket[0] += 1
+        bucket[1] += result.percentage
+        self._finished += 1
+        self._percentage_sum += result.percentage
+
+        previous = self._best.get(result.user_id)
+        if previous is not None:
+            if not result.beats(previous):
+                return
+            position = bisect.bisect_left(self._ranking, previous.rank_key())
+            del self._ranking[position]
+        self._best[result.user_id] = result
+        bisect.insort(self._ranking, result.rank_key())
+
+    @property
+    def finished_count(self):
+        return self._finished
+
+    def average_score(self):
+        return self._percentage_sum / self._finished if self._finished else 0.0
+
+    def histogram(self):
+        return [count for count, _ in self._histogram]
+
+    def question_stats(self, question_id):
+        stats = self._questions.get(question_id)
+        if not stats:
+            return None
+        answered, correct, latency_sum, latency_count = stats
+        return {
+            'question_id': question_id,
+            'answered': answered,
+            'correct': correct,
+            'correct_rate': correct / answered if answered else 0.0,
+            'avg_latency_ms': latency_sum / latency_count if latency_count else None,
+        }
+
+    def hardest_questions(self, limit=3):
+        return [self.question_stats(question_id) for _, question_id in self._difficulty[:limit]]
+
+    def top(self, limit=None):
+        limit = limit or self.leaderboard_size
+        return [self._best[key[3]] for key in self._ranking[:limit]]
+
+    def rank(self, user_id):
+        result = self._best.get(user_id)
+        if result is None:
+            return None
+        return bisect.bisect_left(self._ranking, result.rank_key()) + 1
+
+    def best_result(self, user_id):
+        return self._best.get(user_id)
+
+    def snapshot(self, limit=None):
+        return {
+            'finished': self._finished,
+            'average_score': round(self.average_score(), 2),
+            'histogram': self.histogram(),
+            'leaderboard': [dict(result.to_h(), rank=position) for position, result in enumerate(self.top(limit), 1)],
+            'hardest_questions': self.hardest_questions(),
+            'ranked_users': len(self._best),
+        }
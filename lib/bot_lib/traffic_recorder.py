@@ -0,0 +1,201 @@
+import asyncio
+import datetime
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from lib.quiz_lib.quiz import QuizSingleton
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Names of any kind (first_name, sender_user_name, file_name, ...) end in _name; these go too.
+NAME_FIELDS = frozenset(('username', 'usernames', 'active_usernames', 'title', 'bio', 'phone_number'))
+# Message content nobody needs to replay the quiz flow.
+CONTENT_FIELDS = frozenset(('caption', 'caption_entities', 'contact', 'location', 'venue', 'photo', 'document',
+                            'voice', 'video', 'video_note', 'audio', 'sticker', 'animation', 'poll', 'reply_to_message',
+                            'external_reply', 'quote', 'pinned_message'))
+
+
+def is_identity(value):
+    # A User has is_bot, a Chat has type and id; that holds wherever one is nested (forward origins, service
+    # messages, reactions, chat member updates), so nothing depends on the name of the key it sits under.
+    return 'id' in value and ('is_bot' in value or 'type' in value)
+
+
+def is_id_key(key):
+    return key in ('user_id', 'chat_id') or key.endswith('_user_id') or key.endswith('_chat_id')
+
+
+def is_name_key(key):
+    return key in NAME_FIELDS or key.endswith('_name')
+
+
+class UpdateAnonymizer:
+    # A keyed hash maps each id to the same stand-in for the whole capture, so a user's private chat and the
+    # user still match and the ordering per user survives. The key is random and never written anywhere.
+    def __init__(self, key=None):
+        self._key = key or os.urandom(32)
+
+    def anonymize_id(self, value):
+        digest = hmac.new(self._key, str(value).encode('ascii'), hashlib.sha256).digest()
+        # 48 bits: fits in a Telegram id and in a JSON number; zero is never a real id.
+        return int.from_bytes(digest[:6], 'big') or 1
+
+    def scrub(self, payload):
+        # Bot commands and callback data are what replay needs; free text a user typed is not kept.
+        for kind in ('message', 'edited_message'):
+            message = payload.get(kind)
+            if message and not str(message.get('text', '')).startswith('/'):
+                message.pop('text', None)
+                message.pop('entities', None)
+        return self._scrub(payload)
+
+    def _scrub(self, value):
+        if isinstance(value, dict):
+            identity = is_identity(value)
+            result = {}
+            for key, item in value.items():
+                if is_name_key(key) or key in CONTENT_FIELDS:
+                    continue
+                if (identity and key == 'id') or (is_id_key(key) and isinstance(item, int)):
+                    item = self.anonymize_id(item)
+                elif key == 'chat_instance':
+                    item = str(self.anonymize_id(item))
+                result[key] = self._scrub(item)
+            if 'is_bot' in value:
+                # The Bot API's User requires a first_name.
+                result['first_name'] = 'User'
+            return result
+        if isinstance(value, list):
+            return [self._scrub(item) for item in value]
+        return value
+
+
+class TrafficRecorder:
+    # Captures incoming updates with their arrival time for benchmarks/traffic_replay.py. The event loop only
+    # serializes the update and queues it; anonymizing, JSON and gzip happen on the writer thread.
+    def __init__(self, path, flush_interval=1.0, max_updates=None, anonymizer=None, worker_index=None):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.max_updates = max_updates
+        self.anonymizer = anonymizer or UpdateAnonymizer()
+        self.worker_index = worker_index
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._started = None
+        self.recorded = 0
+        self.written = 0
+
+    @classmethod
+    def from_config(cls, bot_config: dict, worker_index=None):
+        cfg = bot_config.get('traffic_recording') or {}
+        if not cfg.get('enabled', False):
+            return None
+        config = QuizSingleton()
+        directory = Path(cfg.get('directory') or config.get_project_path(config.log_dir or 'log'))
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        suffix = f".w{worker_index}" if worker_index is not None else ''
+        path = directory / f"traffic-{stamp}{suffix}.jsonl.gz"
+        return cls(path, flush_interval=cfg.get('flush_interval', 1.0), max_updates=cfg.get('max_updates'),
+                   worker_index=worker_index)
+
+    def record(self, update):
+        # Called as each update is admitted, before it waits for its user's earlier updates.
+        if self._started is None or (self.max_updates and self.recorded >= self.max_updates):
+            return
+        try:
+            payload = update.to_dict()
+        except Exception as e:
+            logger.error(f"Error capturing update: {e}", exc_info=True)
+            return
+        self.recorded += 1
+        self._queue.put((time.monotonic() - self._started, payload))
+        if self.max_updates and self.recorded == self.max_updates:
+            logger.warning(f"Traffic recording reached {self.max_updates} updates, recording no more.")
+
+    async def on_update(self, update, context):
+        self.record(update)
+
+    def start(self):
+        if self._thread is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._started = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="traffic-recorder", daemon=True)
+            self._thread.start()
+            logger.info(f"Recording incoming updates to {self.path}")
+
+    async def stop(self):
+        if self._thread is None:
+            return
+        self._started = None
+        self._queue.put(_STOP)
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+        logger.info(f"Traffic recorder stopped, {self.written} updates written to {self.path}.")
+
+    def _run(self):
+        header = {
+            'capture': 1,
+            'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'worker': self.worker_index,
+        }
+        try:
+            out = gzip.open(self.path, 'wt', encoding='utf-8')
+            out.write(json.dumps(header) + '\n')
+        except Exception as e:
+            logger.error(f"Could not open traffic capture {self.path}: {e}", exc_info=True)
+            out = None
+
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if out is None:
+                continue
+            try:
+                if item is not None:
+                    offset, payload = item
+                    line = {'t': round(offset, 6), 'update': self.anonymizer.scrub(payload)}
+                    out.write(json.dumps(line, ensure_ascii=False, separators=(',', ':')) + '\n')
+                    self.written += 1
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    # A sync flush: if the process dies, everything up to here still decompresses.
+                    out.flush()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error writing traffic capture: {e}", exc_info=True)
+
+        if out is not None:
+            try:
+                out.close()
+            except Exception as e:
+                logger.error(f"Error closing traffic capture: {e}", exc_info=True)
+
+
+def read_capture(path):
+    # Yields (offset_seconds, update_payload) in recorded order; a capture cut off mid-write ends at its last full line.
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if 'update' in entry:
+                    yield entry['t'], entry['update']
+        except (EOFError, OSError) as e:
+            logger.warning(f"Traffic capture {path} ends early: {e}")
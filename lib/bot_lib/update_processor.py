@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+logger = logging.getLogger(__name__)
+
+
+class _UserSlot:
+    __slots__ = ('lock', 'refs')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.refs = 0
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    # The base class semaphore (acquired before do_process_update) only bounds how many updates are
+    # admitted; the real concurrency limit is taken after the per-user lock, so a user with a backlog
+    # waits on its own lock without holding slots other users could run in.
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = 4096, wait_samples: int = 2048):
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self._workers = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._slots = {}
+        self.waiting = 0
+        self.running = 0
+        self.peak_waiting = 0
+        self.processed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._recent_waits = deque(maxlen=wait_samples)
+        # Called with each update as it is admitted; the traffic recorder hangs off here to see arrival order.
+        self.on_admit = None
+
+    @staticmethod
+    def ordering_key(update):
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        if self.on_admit is not None:
+            self.on_admit(update)
+        key = self.ordering_key(update)
+        slot = self._claim_slot(key)
+        admitted = time.perf_counter()
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+
+        try:
+            if slot is not None:
+                await slot.lock.acquire()
+            try:
+                await self._workers.acquire()
+            except BaseException:
+                if slot is not None:
+                    slot.lock.release()
+                raise
+        except BaseException:
+            self.waiting -= 1
+            self._release_slot(key, slot)
+            coroutine.close()
+            raise
+
+        waited = time.perf_counter() - admitted
+        self.waiting -= 1
+        self.running += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self._recent_waits.append(waited)
+        try:
+            await coroutine
+        finally:
+            self.running -= 1
+            self.processed += 1
+            self._workers.release()
+            if slot is not None:
+                slot.lock.release()
+            self._release_slot(key, slot)
+
+    def _claim_slot(self, key):
+        if key is None:
+            return None
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _UserSlot()
+        slot.refs += 1
+        return slot
+
+    def _release_slot(self, key, slot):
+        if slot is not None:
+            slot.refs -= 1
+            if not slot.refs:
+                del self._slots[key]
+
+    def stats(self):
+        recent = sorted(self._recent_waits)
+        p99 = recent[min(len(recent) - 1, int(len(recent) * 0.99))] if recent else 0.0
+        return {
+            'queue_depth': self.waiting,
+            'peak_queue_depth': self.peak_waiting,
+            'running': self.running,
+            'active_users': len(self._slots),
+            'processed': self.processed,
+            'wait_avg_ms': (self.wait_total / self.processed * 1000) if self.processed else 0.0,
+            'wait_p99_ms': p99 * 1000,
+            'wait_max_ms': self.wait_max * 1000,
+        }
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        logger.info(f"Update processor stats: {self.stats()}")
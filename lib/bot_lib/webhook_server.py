@@ -0,0 +1,140 @@
+import asyncio
+import hmac
+import json
+import logging
+
+from telegram import Update
+from telegram.ext import Application
+
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    502: 'Bad Gateway',
+}
+
+
+class WebhookServer:
+    def __init__(self, application: Application, listen='127.0.0.1', port=8443, url_path='telegram',
+                 secret_token=None, max_body_size=1048576, ssl_context=None):
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.url_path = '/' + url_path.strip('/')
+        self.secret_token = secret_token
+        self.max_body_size = max_body_size
+        self.ssl_context = ssl_context
+        self.server = None
+        self.received = 0
+        self.rejected = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.listen, self.port, ssl=self.ssl_context)
+        if not self.port:
+            self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"Webhook server listening on {self.listen}:{self.port}{self.url_path}")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+            logger.info("Webhook server stopped.")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # HTTP/1.1 keep-alive: Telegram (and the load harness) reuse connections between updates.
+            while True:
+                keep_alive = await self._handle_request(reader, writer)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Error in webhook connection: {e}", exc_info=True)
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        request_line = await reader.readline()
+        if not request_line:
+            return False
+
+        try:
+            method, path, version = request_line.decode('latin-1').split()
+        except ValueError:
+            await self._respond(writer, 400, keep_alive=False)
+            return False
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            await self._respond(writer, 400, keep_alive=False)
+            return False
+
+        if length > self.max_body_size:
+            await self._respond(writer, 413, keep_alive=False)
+            return False
+
+        body = await reader.readexactly(length) if length else b''
+
+        status = self._validate(method, path, headers)
+        if status == 200:
+            status = await self._enqueue(body)
+        if status != 200:
+            self.rejected += 1
+
+        await self._respond(writer, status, keep_alive)
+        return keep_alive
+
+    def _validate(self, method, path, headers):
+        if path.split('?', 1)[0] != self.url_path:
+            return 404
+        if method != 'POST':
+            return 405
+        if self.secret_token and not hmac.compare_digest(headers.get(SECRET_HEADER, ''), self.secret_token):
+            logger.warning("Rejected webhook request with an invalid secret token.")
+            return 403
+        return 200
+
+    async def _enqueue(self, body):
+        try:
+            data = json.loads(body)
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logger.warning(f"Rejected malformed webhook payload: {e}")
+            return 400
+
+        if update is None:
+            return 400
+
+        self.received += 1
+        await self.application.update_queue.put(update)
+        return 200
+
+    async def _respond(self, writer: asyncio.StreamWriter, status, keep_alive):
+        connection = 'keep-alive' if keep_alive else 'close'
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Length: 0\r\n"
+            f"Connection: {connection}\r\n\r\n".encode('latin-1')
+        )
+        await writer.drain()
@@ -1,22 +1,112 @@
-# не юзається
+import gzip
+import logging
+import os
+import shutil
+import time
 from pathlib import Path
 from .quiz import QuizSingleton
 
+
+logger = logging.getLogger(__name__)
+
 class FileWriter:
-    def __init__(self, mode, filename):
+    def __init__(self, mode, filename, max_bytes=None, rotate_interval=None, compress=False):
         config = QuizSingleton()
         self.answers_dir = config.answers_dir
-        Path(self.answers_dir).mkdir(parents=True, exist_ok=True)
+        Path(self.prepare_filename('')).mkdir(parents=True, exist_ok=True)
         self.filename = filename
         self.mode = mode
         self.filepath = self.prepare_filename(filename)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.compress = compress
+        self.file = None
+        self.opened_at = None
+        self.size = 0
+        self.rotated = []
 
     def write(self, message):
+        return self.write_lines([message])
+
+    def write_lines(self, messages):
+        # The file stays open between calls; one buffered write per batch instead of open/close per line.
+        # Returns False when the batch did not make it to the file.
+        try:
+            if self.file is None:
+                self.open()
+            if self.size and self.should_rotate():
+                self.rotate()
+                self.open()
+            data = ''.join(message + "\n" for message in messages)
+            self.file.write(data)
+            self.size += len(data.encode("utf-8"))
+        except Exception as e:
+            logger.error(f"Error writing {len(messages)} lines to {self.filepath}: {e}", exc_info=True)
+            self._discard_file()
+            return False
+
         try:
-            with open(self.filepath, self.mode, encoding="utf-8") as f:
-                f.write(message + "\n")
+            if self.should_rotate():
+                self.rotate()
         except Exception as e:
-            print(f"Error writing to file {self.filename}: {e}")
+            logger.error(f"Error rotating {self.filepath}: {e}", exc_info=True)
+            self._discard_file()
+        return True
+
+    def _discard_file(self):
+        # Reopened by the next write, in case the handle itself is what broke.
+        try:
+            self.close()
+        except Exception:
+            self.file = None
+
+    def open(self):
+        self.file = open(self.filepath, self.mode, encoding="utf-8")
+        stat = self.filepath.stat()
+        self.size = stat.st_size
+        # A file carried over from before a restart is as old as its last write, not as this process.
+        self.opened_at = stat.st_mtime if self.size else time.time()
+
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def should_rotate(self):
+        if self.max_bytes and self.size >= self.max_bytes:
+            return True
+        # Time rotation is on rotate_interval boundaries: every file holds one period, so the period the file
+        # belongs to is that of its last write, whichever process made it.
+        if not self.rotate_interval or self.opened_at is None:
+            return False
+        return time.time() // self.rotate_interval != self.opened_at // self.rotate_interval
+
+    def rotate(self):
+        self.close()
+        if not self.filepath.exists() or self.filepath.stat().st_size == 0:
+            return None
+
+        stem, suffix = self.filepath.stem, self.filepath.suffix
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        target = self.filepath.with_name(f"{stem}-{stamp}{suffix}")
+        counter = 1
+        while target.exists() or Path(f"{target}.gz").exists():
+            target = self.filepath.with_name(f"{stem}-{stamp}.{counter}{suffix}")
+            counter += 1
+        os.replace(self.filepath, target)
+
+        if self.compress:
+            with open(target, "rb") as src, gzip.open(f"{target}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            target.unlink()
+            target = Path(f"{target}.gz")
+
+        self.rotated.append(target)
+        return target
 
     def prepare_filename(self, filename):
         project_root = Path(__file__).parent.parent.parent
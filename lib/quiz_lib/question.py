@@ -1,24 +1,43 @@
+import hashlib
 import json
 import yaml
 import random
 
+def make_question_id(raw_text, raw_answers):
+    payload = json.dumps([raw_text, list(raw_answers)], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
 class Question:
     def __init__(self, raw_text, raw_answers):
         self.question_body = raw_text
+        self.raw_answers = list(raw_answers)
+        self.question_id = make_question_id(raw_text, self.raw_answers)
         self.question_answers = {}
         self.question_correct_answer = None
+        self._arrangements = {}
         self.load_answers(raw_answers)
 
     def load_answers(self, raw_answers):
-        answers_list = list(raw_answers)
-        random.shuffle(answers_list)
-        chars = [chr(i) for i in range(ord('A'), ord('A') + len(answers_list))]
-        self.question_answers = {char: answer for char, answer in zip(chars, answers_list)}
-        original_correct_answer = raw_answers[0]
-        for char, answer in self.question_answers.items():
-            if answer == original_correct_answer:
-                self.question_correct_answer = char
-                break
+        # Default arrangement, derived from the content only so it is the same on every restart.
+        self.question_answers, self.question_correct_answer = self.arrange(self.permutation(0))
+
+    def permutation(self, seed):
+        order = list(range(len(self.raw_answers)))
+        random.Random(f"{seed}:{self.question_id}").shuffle(order)
+        return tuple(order)
+
+    def arrange(self, permutation):
+        arrangement = self._arrangements.get(permutation)
+        if arrangement is None:
+            chars = [chr(i) for i in range(ord('A'), ord('A') + len(permutation))]
+            answers = {char: self.raw_answers[index] for char, index in zip(chars, permutation)}
+            # raw_answers[0] is the correct one in the question files.
+            arrangement = (answers, chars[permutation.index(0)])
+            self._arrangements[permutation] = arrangement
+        return arrangement
+
+    def answers_for_seed(self, seed):
+        return self.arrange(self.permutation(seed or 0))
 
     def display_answers(self):
         return [f"{char}. {answer}" for char, answer in self.question_answers.items()]
@@ -28,6 +47,7 @@ class Question:
 
     def to_h(self):
         return {
+            "question_id": self.question_id,
             "question_body": self.question_body,
             "question_correct_answer": self.question_correct_answer,
             "question_answers": self.question_answers
@@ -39,5 +59,5 @@ class Question:
     def to_yaml(self):
         return yaml.dump(self.to_h())
 
-    def find_answer_by_char(self, char):
-        return self.question_answers.get(char)
\ No newline at end of file
+    def find_answer_by_char(self, char, answers=None):
+        return (answers or self.question_answers).get(char)
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(filename):
+    with open(filename, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class QuestionCache:
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.entries = data.get("files", {})
+            else:
+                logger.info(f"Question cache {self.path} has an old format, rebuilding.")
+        except FileNotFoundError:
+            pass
+        except (ValueError, OSError) as e:
+            logger.warning(f"Ignoring unreadable question cache {self.path}: {e}")
+        return self
+
+    def lookup(self, filename):
+        entry = self.entries.get(str(filename))
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            self.hits += 1
+            return entry["items"]
+
+        # Touched but possibly unchanged (checkout, copy): the content hash decides.
+        if entry["sha256"] == file_digest(filename):
+            entry["mtime_ns"] = stat.st_mtime_ns
+            entry["size"] = stat.st_size
+            self.dirty = True
+            self.hits += 1
+            return entry["items"]
+
+        self.misses += 1
+        return None
+
+    def store(self, filename, items, digest, stat):
+        # stat and digest must describe the exact bytes the items were parsed from.
+        self.entries[str(filename)] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": digest,
+            "items": items,
+        }
+        self.dirty = True
+
+    def prune(self, filenames):
+        keep = {str(filename) for filename in filenames}
+        for filename in list(self.entries):
+            if filename not in keep:
+                del self.entries[filename]
+                self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "files": self.entries}, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            logger.error(f"Error saving question cache to {self.path}: {e}", exc_info=True)
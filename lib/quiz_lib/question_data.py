@@ -1,28 +1,66 @@
 
 import yaml
 import json
+import hashlib
 import os
 import sys
 import glob
 import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from .question import Question
+from .question_cache import QuestionCache, file_digest
 from .quiz import QuizSingleton
 import logging
 
 logger = logging.getLogger(__name__)
 
+class QuestionFile:
+    # One parsed question file. Snapshots share these for the files that did not change between reloads.
+    __slots__ = ('mtime_ns', 'size', 'sha256', 'questions')
+
+    def __init__(self, mtime_ns, size, sha256, questions):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.sha256 = sha256
+        self.questions = questions
+
+
+def make_questions(items):
+    return tuple(Question(question_text, answers) for question_text, answers in items)
+
+
+def failed_file(filename, questions=()):
+    # Remembers the stat of a file that did not parse, so it is retried only after it changes again.
+    try:
+        stat = os.stat(filename)
+        return QuestionFile(stat.st_mtime_ns, stat.st_size, None, questions)
+    except OSError:
+        return QuestionFile(None, None, None, questions)
+
+
 class QuestionData:
-    def __init__(self):
-        self.collection = []
+    # An immutable snapshot of the question bank; reload() returns a new one instead of changing this one.
+    def __init__(self, files=None, previous=None):
+        self.collection = ()
+        self.files = {}
+        # Rendered (text, markup) per question index, filled by bot_lib.reply_markup_formatter.render_question.
+        self.render_cache = {}
+        self.index_by_id = {}
         config = QuizSingleton()
         self.yaml_dir = config.yaml_dir
         self.in_ext = config.in_ext
         self.log_dir = config.log_dir
         self.answers_dir = config.answers_dir
         self._project_root = Path(__file__).parent.parent.parent
+        self.cache_path = self._project_root / config.cache_dir / "questions.cache.json" if config.cache_dir else None
+        self.loader = config.loader
+        self.libyaml = config.libyaml
         self.threads = []
-        self.load_data()
+        if files is None:
+            self.load_data()
+        else:
+            self._assemble(files, previous)
 
     def to_yaml(self):
         return yaml.dump([q.to_h() for q in self.collection], allow_unicode=True, default_flow_style=False)
@@ -72,39 +110,184 @@ class QuestionData:
 
     def load_data(self):
         logger.info(f"Loading questions from {self._project_root / self.yaml_dir} with extension .{self.in_ext}")
+        files = []
+        self.each_file(files.append)
+        files.sort()
+
+        cache = QuestionCache(self.cache_path).load() if self.cache_path else None
+        cached = {}
+        stale = []
+        for filename in files:
+            items = cache.lookup(filename) if cache else None
+            if items is None:
+                stale.append(filename)
+            else:
+                cached[filename] = items
+
+        parsed = self.parse_files(stale)
+
+        loaded = {}
+        for filename in files:
+            if filename in cached:
+                entry = cache.entries[str(filename)]
+                loaded[filename] = QuestionFile(entry["mtime_ns"], entry["size"], entry["sha256"], make_questions(cached[filename]))
+            elif parsed.get(filename):
+                items, digest, stat = parsed[filename]
+                if cache:
+                    cache.store(filename, items, digest, stat)
+                loaded[filename] = QuestionFile(stat.st_mtime_ns, stat.st_size, digest, make_questions(items))
+            else:
+                loaded[filename] = failed_file(filename)
+        self._assemble(loaded)
+
+        if cache:
+            cache.prune(files)
+            cache.save()
+            logger.info(f"Question cache: {cache.hits} files reused, {len(stale)} parsed.")
+        logger.info(f"Finished loading questions. Total loaded: {len(self.collection)}")
+
+
+    def reload(self):
+        # Builds the next snapshot from the files whose size or mtime changed; self is left untouched, so
+        # handlers still holding it keep a consistent bank. Returns None when nothing on disk changed.
+        filenames = []
+        self.each_file(filenames.append)
+        filenames.sort()
+
+        files = {}
+        changed = []
+        for filename in filenames:
+            current = self.files.get(filename)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            if current is not None and current.mtime_ns == stat.st_mtime_ns and current.size == stat.st_size:
+                files[filename] = current
+            elif current is not None and current.sha256 is not None and current.sha256 == file_digest(filename):
+                # Touched but not edited (checkout, copy): no need to parse.
+                files[filename] = QuestionFile(stat.st_mtime_ns, stat.st_size, current.sha256, current.questions)
+            else:
+                changed.append(filename)
+
+        if not changed and files.keys() == self.files.keys() and all(files[f] is self.files[f] for f in files):
+            return None
+
+        parsed = self.parse_files(changed)
+        for filename in changed:
+            previous = self.files.get(filename)
+            result = parsed.get(filename)
+            if result and not result[0] and previous is not None and previous.questions:
+                # An emptied or truncated file is as good as a broken one: most likely caught mid-write.
+                logger.warning(f"Question file {filename} has no questions now, keeping its previous {len(previous.questions)}.")
+                result = None
+            if result:
+                items, digest, stat = result
+                files[filename] = QuestionFile(stat.st_mtime_ns, stat.st_size, digest, make_questions(items))
+            else:
+                # Broken or half-written: keep serving the previous questions until the file changes again.
+                files[filename] = failed_file(filename, previous.questions if previous else ())
+
+        removed = [filename for filename in self.files if filename not in files]
+        snapshot = QuestionData(files=files, previous=self)
+        logger.info(f"Question bank reloaded: {len(changed)} files parsed, {len(removed)} removed. Total loaded: {len(snapshot.collection)}")
+        return snapshot
+
+
+    def _assemble(self, files, previous=None):
+        self.files = files
+        collection = []
+        for filename in sorted(files):
+            collection.extend(files[filename].questions)
+        self.collection = tuple(collection)
+
+        self.index_by_id = {}
+        for index, question in enumerate(self.collection):
+            self.index_by_id.setdefault(question.question_id, index)
+
+        self.render_cache = {}
+        if previous is not None and len(previous.collection) == len(self.collection):
+            # Rendered text embeds "n/total": an entry carries over only while the total and the question at its index are unchanged.
+            self.render_cache = {key: rendered for key, rendered in previous.render_cache.copy().items()
+                                 if previous.collection[key[0]] is self.collection[key[0]]}
+
+
+    def parse_files(self, filenames):
+        if self.loader == 'process' and len(filenames) > 1:
+            workers = min(len(filenames), os.cpu_count() or 1)
+            chunksize = max(1, len(filenames) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(parse_question_file, filenames, [self.libyaml] * len(filenames), chunksize=chunksize)
+                return dict(zip(filenames, results))
+
+        parsed = {}
+
         def load(filename):
             try:
-                self.load_from(filename)
+                parsed[filename] = self.parse_file(filename)
             except Exception as e:
                 logger.error(f"Error loading questions from {filename}: {e}", exc_info=True)
 
-        self.each_file(lambda filename: self.in_thread(lambda: load(filename)))
+        for filename in filenames:
+            self.in_thread(lambda filename=filename: load(filename))
 
         for thread in self.threads:
             thread.join()
 
         self.threads = []
-        logger.info(f"Finished loading questions. Total loaded: {len(self.collection)}")
+        return parsed
 
 
     def load_from(self, filename):
-        try:
-            with open(filename, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-                if isinstance(data, list):
-                    for item in data:
-                        if isinstance(item, dict) and "question" in item and "answers" in item:
-                            question = Question(item["question"], item["answers"])
-                            self.collection.append(question)
-                        else:
-                            logger.warning(f"Invalid data format for an item in {filename}. Expected dict with 'question' and 'answers'. Skipping entry: {item}")
+        result = self.parse_file(filename)
+        if result:
+            self.collection = self.collection + make_questions(result[0])
+
+
+    def parse_file(self, filename):
+        return parse_question_file(filename, self.libyaml)
+
+
+    def resolve_index(self, question_index, question_id):
+        # Sessions store the id of their current question; if the bank changed under them, follow the id.
+        if question_id is None:
+            return question_index
+        if 0 <= question_index < len(self.collection) and self.collection[question_index].question_id == question_id:
+            return question_index
+        return self.index_by_id.get(question_id, question_index)
+
+
+    def question_id_at(self, question_index):
+        if 0 <= question_index < len(self.collection):
+            return self.collection[question_index].question_id
+        return None
+
+
+def parse_question_file(filename, use_libyaml=True):
+    # Module level so ProcessPoolExecutor can pickle it.
+    loader = yaml.CSafeLoader if use_libyaml and yaml.__with_libyaml__ else yaml.SafeLoader
+    try:
+        stat = os.stat(filename)
+        with open(filename, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        data = yaml.load(raw, Loader=loader)
+        items = []
+        if isinstance(data, list):
+            for item in data:
+                if isinstance(item, dict) and "question" in item and "answers" in item:
+                    items.append([item["question"], list(item["answers"])])
                 else:
-                    logger.warning(f"Invalid root data format in {filename}. Expected a list of questions. Skipping file.")
+                    logger.warning(f"Invalid data format for an item in {filename}. Expected dict with 'question' and 'answers'. Skipping entry: {item}")
+        else:
+            logger.warning(f"Invalid root data format in {filename}. Expected a list of questions. Skipping file.")
+        return items, digest, stat
 
 
-        except FileNotFoundError:
-            logger.error(f"File not found: {filename}")
-        except yaml.YAMLError as e:
-            logger.error(f"YAML error in {filename}: {e}", exc_info=True)
-        except Exception as e:
-            logger.error(f"An unexpected error occurred while loading {filename}: {e}", exc_info=True)
\ No newline at end of file
+    except FileNotFoundError:
+        logger.error(f"File not found: {filename}")
+    except yaml.YAMLError as e:
+        logger.error(f"YAML error in {filename}: {e}", exc_info=True)
+    except Exception as e:
+        logger.error(f"An unexpected error occurred while loading {filename}: {e}", exc_info=True)
+    return None
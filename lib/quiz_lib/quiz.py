@@ -14,6 +14,9 @@ class QuizSingleton:
                     cls._instance.answers_dir = None
                     cls._instance.in_ext = None
                     cls._instance.log_dir = None
+                    cls._instance.cache_dir = None
+                    cls._instance.loader = 'thread'
+                    cls._instance.libyaml = True
         return cls._instance
 
     def get_project_path(self, relative_path):
@@ -27,4 +30,4 @@ class QuizSingleton:
                self.log_dir is not None
 
     def __repr__(self):
-        return f"QuizSingleton(yaml_dir='{self.yaml_dir}', answers_dir='{self.answers_dir}', in_ext='{self.in_ext}', log_dir='{self.log_dir}')"
\ No newline at end of file
+        return f"QuizSingleton(yaml_dir='{self.yaml_dir}', answers_dir='{self.answers_dir}', in_ext='{self.in_ext}',  log_dir='{self.log_dir}', cache_dir='{self.cache_dir}')"
\ No newline at end of file
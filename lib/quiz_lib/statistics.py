@@ -1,8 +1,9 @@
-# не юзається
+import json
+
 class Statistics:
-    def __init__(self, writer):
-        self.correct_answers = 0
-        self.incorrect_answers = 0
+    def __init__(self, writer, correct_answers=0, incorrect_answers=0):
+        self.correct_answers = correct_answers
+        self.incorrect_answers = incorrect_answers
         self.writer = writer
 
     def correct_answer(self):
@@ -11,8 +12,11 @@ class Statistics:
     def incorrect_answer(self):
         self.incorrect_answers += 1
 
+    def percentage(self, total_questions):
+        return (self.correct_answers / total_questions) * 100 if total_questions > 0 else 0
+
     def print_report(self, total_questions):
-        correct_percentage = (self.correct_answers / total_questions) * 100 if total_questions > 0 else 0
+        correct_percentage = self.percentage(total_questions)
         report = (
             f"--- Test Results ---\n"
             f"Correct Answers: {self.correct_answers}\n"
@@ -20,4 +24,20 @@ class Statistics:
             f"Correct Percentage: {correct_percentage:.2f}%\n"
         )
         print(report)
-        self.writer.write(report)
\ No newline at end of file
+        self.writer.write(report)
+
+    def to_record(self, total_questions, **details):
+        record = dict(details)
+        record.update(
+            correct_answers=self.correct_answers,
+            incorrect_answers=self.incorrect_answers,
+            total_questions=total_questions,
+            percentage=round(self.percentage(total_questions), 2),
+        )
+        return record
+
+    def write_record(self, total_questions, **details):
+        # One JSON object per line, so result files can be appended to, concatenated and rotated freely.
+        record = self.to_record(total_questions, **details)
+        self.writer.write(json.dumps(record, ensure_ascii=False, default=str))
+        return record
\ No newline at end of file
@@ -21,9 +21,11 @@ if __name__ == "__main__":
         'database': 'config/database.yml',
         'locales': 'config/locales.yml',
         'secrets': 'config/secrets.yml',
+        'bot': 'config/bot.yml',
         'questions_dir': 'config/questions',
         'log_dir': 'log',
         'answers_dir': 'quiz_answers',
+        'cache_dir': 'cache',
     }
 
     try:
@@ -61,6 +63,9 @@ if __name__ == "__main__":
         quiz_singleton_cfg.yaml_dir = config_files['questions_dir']
         quiz_singleton_cfg.answers_dir = config_files['answers_dir']
         quiz_singleton_cfg.log_dir = config_files['log_dir']
+        quiz_singleton_cfg.cache_dir = config_files.get('cache_dir')
+        quiz_singleton_cfg.loader = config_files.get('questions_loader', 'thread')
+        quiz_singleton_cfg.libyaml = config_files.get('questions_libyaml', True)
         quiz_singleton_cfg.in_ext = config_files.get('questions_ext', 'yml')
 
         if not quiz_singleton_cfg.is_configured():
@@ -0,0 +1,53 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from sqlalchemy import func, select
+
+from benchmarks.support import make_connector
+from lib.bot_lib.answer_events import AnswerEventRecorder
+from lib.bot_lib.models import AnswerEvent
+
+
+class AnswerEventRecorderTest(unittest.TestCase):
+    def test_partly_failed_flush_replays_only_what_was_left(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            connector = make_connector(workdir)
+            recorder = AnswerEventRecorder(connector, batch_size=2, flush_interval=60, max_buffer=3,
+                                           spill_file=str(Path(workdir) / "spill.jsonl"))
+            real_insert, real_spill = connector.run_in_session, recorder._spill
+            calls = {'insert': 0, 'spill': 0}
+
+            async def flaky_insert(func, *args):
+                calls['insert'] += 1
+                if calls['insert'] == 2:
+                    raise RuntimeError("database down")
+                return await real_insert(func, *args)
+
+            def flaky_spill(rows):
+                calls['spill'] += 1
+                if calls['spill'] == 2:
+                    raise OSError("disk full")
+                return real_spill(rows)
+
+            async def scenario():
+                await recorder.start()
+                # Three buffered, three in overflow: the overflow spills, one batch commits, the rest fails.
+                for index in range(6):
+                    recorder.record(1, 1, 'q1', index, 'a', True)
+                connector.run_in_session, recorder._spill = flaky_insert, flaky_spill
+                with self.assertRaises(OSError):
+                    await recorder.flush()
+                connector.run_in_session, recorder._spill = real_insert, real_spill
+                await recorder.replay_spill()
+                await recorder.stop()
+
+            asyncio.run(scenario())
+            with connector.get_session() as session:
+                self.assertEqual(session.execute(select(func.count()).select_from(AnswerEvent)).scalar(), 6)
+            connector.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
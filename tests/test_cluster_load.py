@@ -0,0 +1,17 @@
+import argparse
+import asyncio
+import unittest
+
+from benchmarks.cluster_load import run
+
+
+class ClusterLoadSmokeTest(unittest.TestCase):
+    def test_two_workers_finish_every_quiz(self):
+        args = argparse.Namespace(users=4, questions=3, connections=2, concurrent_updates=8, send_latency=0.0,
+                                  base_port=29101)
+        # Raises if a worker fails to start or a quiz never finishes.
+        asyncio.run(run(args, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
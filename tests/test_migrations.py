@@ -0,0 +1,49 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import yaml
+
+from lib.bot_lib.db_connector import DatabaseConnector
+from lib.bot_lib.migrations import Migrator, current_version, head_version
+
+
+def make_connector(workdir):
+    config_path = Path(workdir) / "database.yml"
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump({'adapter': 'sqlite3', 'database': str(Path(workdir) / "test.db")}, f)
+    return DatabaseConnector(config_path=str(config_path), secrets_path=str(Path(workdir) / "secrets.yml"))
+
+
+class MigratorTest(unittest.TestCase):
+    def test_concurrent_upgrades_of_a_fresh_database(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            connectors = [make_connector(workdir) for _ in range(4)]
+            barrier = threading.Barrier(len(connectors))
+            applied, errors = [], []
+
+            def upgrade(connector):
+                migrator = Migrator(connector, out=lambda message: None)
+                barrier.wait()
+                try:
+                    applied.append(len(migrator.upgrade()))
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=upgrade, args=(connector,)) for connector in connectors]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(errors, [])
+            # One process applies every migration, the others find the schema already up to date.
+            self.assertEqual(sorted(applied), [0] * (len(connectors) - 1) + [len(Migrator(connectors[0]).migrations)])
+            self.assertEqual(current_version(connectors[0].engine), head_version())
+            for connector in connectors:
+                connector.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
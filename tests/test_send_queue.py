@@ -0,0 +1,40 @@
+import asyncio
+import unittest
+
+from telegram.error import NetworkError
+
+from benchmarks.support import FakeBot
+from lib.bot_lib.send_queue import SendScheduler
+
+
+class FailingKeyboards(FakeBot):
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        if reply_markup is not None:
+            raise NetworkError("connection reset")
+        return await super().send_message(chat_id, text, reply_markup, **kwargs)
+
+
+class SendSchedulerTest(unittest.TestCase):
+    def test_failed_send_calls_its_hook(self):
+        bot = FailingKeyboards()
+        failures = []
+
+        async def on_failed(error):
+            failures.append(error)
+            await scheduler.send_message(1, "fallback")
+
+        async def scenario():
+            scheduler.start(bot)
+            # Returns once queued; the failure only happens later on the dispatcher.
+            self.assertIsNone(await scheduler.send_message(1, "question", reply_markup=object(), on_failed=on_failed))
+            await scheduler.stop()
+
+        scheduler = SendScheduler(global_rate=0, chat_rate=0)
+        asyncio.run(scenario())
+        self.assertEqual([type(error) for error in failures], [NetworkError])
+        self.assertEqual(bot.last_message[1][0], "fallback")
+        self.assertEqual(scheduler.metrics.failed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
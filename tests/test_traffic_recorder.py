@@ -0,0 +1,120 @@
+import json
+import unittest
+
+from telegram import Update
+
+from lib.bot_lib.traffic_recorder import UpdateAnonymizer
+
+
+ORIGINAL_IDS = (700000001, 700000002, 700000003, 700000004, 700000005, 700000006, 700000007, -100700000008)
+NAMES = ('Alice', 'Bob', 'Carol', 'Dave', 'Erin', 'Frank', 'Grace', 'Heidi', 'alice_handle', 'bob_handle', 'Team chat')
+
+
+def user(user_id, first_name, username=None):
+    data = {'id': user_id, 'is_bot': False, 'first_name': first_name, 'last_name': 'Surname'}
+    if username:
+        data['username'] = username
+    return data
+
+
+def group_chat():
+    return {'id': -100700000008, 'type': 'supergroup', 'title': 'Team chat'}
+
+
+def message_fixture():
+    return {
+        'update_id': 1,
+        'message': {
+            'message_id': 10,
+            'date': 1700000000,
+            'chat': {'id': 700000001, 'type': 'private', 'first_name': 'Alice', 'username': 'alice_handle'},
+            'from': user(700000001, 'Alice', 'alice_handle'),
+            'text': '/start',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+            'forward_origin': {'type': 'user', 'date': 1699999999, 'sender_user': user(700000002, 'Bob', 'bob_handle')},
+            'new_chat_members': [user(700000003, 'Carol'), user(700000004, 'Dave')],
+            'left_chat_member': user(700000005, 'Erin'),
+            'users_shared': {'request_id': 1, 'users': [{'user_id': 700000006, 'first_name': 'Frank', 'username': 'frank'}]},
+        },
+    }
+
+
+def hidden_user_forward_fixture():
+    return {
+        'update_id': 2,
+        'message': {
+            'message_id': 11,
+            'date': 1700000000,
+            'chat': group_chat(),
+            'from': user(700000001, 'Alice'),
+            'forward_origin': {'type': 'hidden_user', 'date': 1699999999, 'sender_user_name': 'Heidi'},
+            'external_reply': {'origin': {'type': 'user', 'date': 1, 'sender_user': user(700000002, 'Bob')}},
+            'quote': {'text': 'Bob said something', 'position': 0},
+        },
+    }
+
+
+def reaction_fixture():
+    return {
+        'update_id': 3,
+        'message_reaction': {
+            'chat': group_chat(),
+            'message_id': 12,
+            'user': user(700000007, 'Grace'),
+            'date': 1700000000,
+            'old_reaction': [],
+            'new_reaction': [{'type': 'emoji', 'emoji': '👍'}],
+        },
+    }
+
+
+def chat_member_fixture():
+    return {
+        'update_id': 4,
+        'chat_member': {
+            'chat': group_chat(),
+            'from': user(700000001, 'Alice'),
+            'date': 1700000000,
+            'old_chat_member': {'status': 'left', 'user': user(700000003, 'Carol')},
+            'new_chat_member': {'status': 'member', 'user': user(700000003, 'Carol')},
+        },
+    }
+
+
+class UpdateAnonymizerTest(unittest.TestCase):
+    def setUp(self):
+        self.anonymizer = UpdateAnonymizer(key=b'test-key')
+
+    def assert_anonymous(self, scrubbed):
+        text = json.dumps(scrubbed, ensure_ascii=False)
+        for original in ORIGINAL_IDS:
+            self.assertNotIn(str(abs(original)), text)
+        for name in NAMES:
+            self.assertNotIn(name, text)
+
+    def test_no_original_id_or_name_survives(self):
+        for fixture in (message_fixture(), hidden_user_forward_fixture(), reaction_fixture(), chat_member_fixture()):
+            with self.subTest(update_id=fixture['update_id']):
+                self.assert_anonymous(self.anonymizer.scrub(fixture))
+
+    def test_same_user_maps_to_same_id(self):
+        scrubbed = self.anonymizer.scrub(message_fixture())['message']
+        self.assertEqual(scrubbed['from']['id'], scrubbed['chat']['id'])
+        self.assertNotEqual(scrubbed['from']['id'], scrubbed['forward_origin']['sender_user']['id'])
+        members = self.anonymizer.scrub(chat_member_fixture())['chat_member']
+        self.assertEqual(members['old_chat_member']['user']['id'], scrubbed['new_chat_members'][0]['id'])
+
+    def test_commands_stay_replayable(self):
+        scrubbed = self.anonymizer.scrub(message_fixture())
+        self.assertEqual(scrubbed['message']['text'], '/start')
+        update = Update.de_json(scrubbed, None)
+        self.assertEqual(update.effective_user.id, scrubbed['message']['from']['id'])
+
+    def test_free_text_is_dropped(self):
+        fixture = message_fixture()
+        fixture['message']['text'] = 'my phone is 555-0100'
+        self.assertNotIn('text', self.anonymizer.scrub(fixture)['message'])
+
+
+if __name__ == '__main__':
+    unittest.main()